@@ -0,0 +1,77 @@
+"""Insert latency of DataManager.add_sale against the size of sales.csv.
+
+With --async the sales are queued for the background writer, and the
+throughput includes the final flush() that makes them durable. Usage:
+
+    python benchmarks/bench_append.py [rows ...] [--inserts N] [--async]
+"""
+import argparse
+import os
+import sys
+import statistics
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.data_manager import DataManager
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+INSERTS = 50
+
+
+def write_sales(path, rows):
+    """Write a synthetic sales.csv with the given number of rows"""
+    rng = np.random.default_rng(0)
+    dates = pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 5 * 365 * 86400, rows), unit="s")
+    pd.DataFrame({
+        'date': dates.strftime("%Y-%m-%d %H:%M:%S"),
+        'customer_name': rng.choice(["John Smith", "Mary Johnson", "Peter Parker", "Tony Stark"], rows),
+        'phone': rng.integers(1_000_000_000, 9_999_999_999, rows).astype(str),
+        'item': rng.choice(["iPhone 13 Screen", "Samsung S21 Battery", "USB-C Cable"], rows),
+        'price': rng.integers(500, 50_000, rows) / 100,
+        'payment_method': rng.choice(["Cash", "Card", "Mobile Payment"], rows),
+    }).to_csv(path, index=False)
+
+
+def time_inserts(data_manager, inserts=INSERTS):
+    latencies = []
+    for i in range(inserts):
+        sale = {
+            'customer_name': f"Bench Customer {i}",
+            'phone': "5550000000",
+            'item': "USB-C Cable",
+            'price': 9.99,
+            'payment_method': "Cash",
+        }
+        start = time.perf_counter()
+        data_manager.add_sale(sale)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("rows", nargs="*", type=int, default=DEFAULT_SIZES)
+    parser.add_argument("--inserts", type=int, default=INSERTS)
+    parser.add_argument("--async", dest="async_writes", action="store_true")
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'median ms':>10} {'p95 ms':>10} {'inserts/s':>10}")
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as data_dir:
+            write_sales(os.path.join(data_dir, "sales.csv"), rows)
+            data_manager = DataManager(data_dir, async_writes=args.async_writes)
+            start = time.perf_counter()
+            latencies = sorted(time_inserts(data_manager, args.inserts))
+            data_manager.flush()
+            throughput = args.inserts / (time.perf_counter() - start)
+            p95 = latencies[int(len(latencies) * 0.95) - 1]
+            print(f"{rows:>10} {statistics.median(latencies) * 1000:>10.3f} {p95 * 1000:>10.3f} {throughput:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Peak memory and time of exporting every sale, streamed against built in memory.
+
+Generates synthetic sales (benchmarks/synthetic.py) and exports all of them
+with DataManager.export in each format, next to reading the table and
+calling to_csv as the reports page used to. Memory is the peak traced by
+tracemalloc, with every cache emptied first so the table isn't loaded
+already; time is that of a second, untraced run. Each streamed export is
+checked to hold the same rows as a full read. Usage:
+
+    python benchmarks/bench_export.py [sales ...] [--backend csv] [--formats csv csv.gz xlsx]
+"""
+import argparse
+import gzip
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.bench_suite import reset_caches
+from benchmarks.synthetic import generate
+from utils.data_manager import DataManager
+from utils.export import export_formats
+
+DEFAULT_SIZES = [100_000, 1_000_000]
+
+
+def measure(operation):
+    """Result, seconds taken and peak traced MiB of a call, each from a cold cache
+
+    Tracing slows Python code down several times, so the time comes from a
+    second, untraced call.
+    """
+    reset_caches()
+    tracemalloc.start()
+    result = operation()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    reset_caches()
+    start = time.perf_counter()
+    again = operation()
+    seconds = time.perf_counter() - start
+    if hasattr(again, "close"):
+        again.close()
+    return result, seconds, peak / 2**20
+
+
+def read_back(f, file_format):
+    if file_format == "xlsx":
+        return pd.concat(pd.read_excel(f, sheet_name=None, dtype=object).values(), ignore_index=True)
+    data = f.read()
+    if file_format == "csv.gz":
+        data = gzip.decompress(data)
+    return pd.read_csv(io.BytesIO(data), dtype=str)
+
+
+def comparable(df):
+    """Numbers as numbers and everything else as text, however the format stored them"""
+    df = df.astype(object).where(df.notna(), "")
+    for column in df:
+        try:
+            df[column] = pd.to_numeric(df[column])
+        except (ValueError, TypeError):
+            df[column] = df[column].astype(str)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("sales", nargs="*", type=int, default=DEFAULT_SIZES)
+    parser.add_argument("--backend", default=os.environ.get("GSMLAB_BACKEND", "csv"))
+    parser.add_argument("--formats", nargs="*", default=export_formats())
+    args = parser.parse_args()
+
+    print(f"{'sales':>10} {'export':<16} {'seconds':>8} {'peak MiB':>9} {'file MiB':>9}")
+    for sales in args.sales:
+        with tempfile.TemporaryDirectory() as data_dir:
+            generate(data_dir, sales=sales, photos=0)
+            data_manager = DataManager(data_dir, args.backend)
+
+            csv, seconds, peak = measure(lambda: data_manager.get_sales().to_csv(index=False))
+            print(f"{sales:>10} {'to_csv':<16} {seconds:>8.2f} {peak:>9.1f} {len(csv) / 2**20:>9.1f}")
+            expected = pd.read_csv(io.StringIO(csv), dtype=str)
+            del csv
+
+            for file_format in args.formats:
+                f, seconds, peak = measure(lambda: data_manager.export("sales", file_format=file_format))
+                with f:
+                    size = f.seek(0, os.SEEK_END)
+                    print(f"{sales:>10} {'export ' + file_format:<16} {seconds:>8.2f} {peak:>9.1f} {size / 2**20:>9.1f}")
+                    f.seek(0)
+                    exported = read_back(f, file_format)
+                pd.testing.assert_frame_equal(
+                    comparable(exported), comparable(expected), check_dtype=False, obj=f"{file_format} export",
+                )
+
+
+if __name__ == "__main__":
+    main()
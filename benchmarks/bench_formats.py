@@ -0,0 +1,49 @@
+"""Load time and memory of the sales table stored as CSV and as typed Parquet.
+
+Times a cold full-table load for each backend and, for Parquet, a load of just
+the 'date' and 'price' columns the dashboard needs. Usage:
+
+    python benchmarks/bench_formats.py [rows ...]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_append import write_sales
+from utils.cache import frames
+from utils.storage import open_storage
+
+DEFAULT_SIZES = [100_000, 1_000_000]
+
+
+def timed_load(storage, columns=None):
+    frames.invalidate()
+    start = time.perf_counter()
+    df = storage.read("sales", columns=columns)
+    return time.perf_counter() - start, df.memory_usage(deep=True).sum()
+
+
+def main(sizes):
+    print(f"{'rows':>10} {'load':>22} {'seconds':>8} {'MB':>8}")
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as data_dir:
+            write_sales(os.path.join(data_dir, "sales.csv"), rows)
+            csv = open_storage(data_dir, "csv")
+            csv.ensure_table("sales", [])
+            parquet = open_storage(data_dir, "parquet")
+            parquet.ensure_table("sales", [])
+
+            for label, storage, columns in (
+                ("csv, all columns", csv, None),
+                ("parquet, all columns", parquet, None),
+                ("parquet, date+price", parquet, ['date', 'price']),
+            ):
+                seconds, size = timed_load(storage, columns)
+                print(f"{rows:>10} {label:>22} {seconds:>8.3f} {size / 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,76 @@
+"""Board and status-update times against the lifetime number of repair tickets.
+
+Generates synthetic data (benchmarks/synthetic.py) with a growing number of
+repairs, most of them long completed, and times what the repairs page does:
+loading the open tickets for the board with every cache emptied (as after a
+restart) and again warm, moving a ticket along the board, and completing
+one. The first start of a data directory, which also splits off the
+completed tickets, is timed as "open". Usage:
+
+    python benchmarks/bench_hot_repairs.py [repairs ...] [--backend csv] [--runs 5]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.bench_suite import reset_caches
+from benchmarks.synthetic import generate
+from utils.data_manager import DataManager
+from utils.repair_board import BOARD_STATUSES
+
+DEFAULT_SIZES = [100_000, 1_000_000]
+RUNS = 5
+
+
+def median_ms(operation, runs):
+    times = []
+    for run in range(runs):
+        start = time.perf_counter()
+        operation(run)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("repairs", nargs="*", type=int, default=DEFAULT_SIZES)
+    parser.add_argument("--backend", default=os.environ.get("GSMLAB_BACKEND", "csv"))
+    parser.add_argument("--runs", type=int, default=RUNS)
+    args = parser.parse_args()
+
+    print(f"{'repairs':>10} {'open':>7} {'first open s':>12} {'board cold ms':>13} {'board warm ms':>13} "
+          f"{'move ms':>8} {'complete ms':>11}")
+    for repairs in args.repairs:
+        with tempfile.TemporaryDirectory() as data_dir:
+            generate(data_dir, sales=1000, repairs=repairs, photos=0)
+            reset_caches()
+            start = time.perf_counter()
+            data_manager = DataManager(data_dir, args.backend)
+            opened = time.perf_counter() - start
+
+            def board(run):
+                return data_manager.get_repairs(status=BOARD_STATUSES)
+
+            def board_cold(run):
+                reset_caches()
+                board(run)
+
+            open_ids = board(0).sort_values('date')['id'].tolist()
+            cold = median_ms(board_cold, args.runs)
+            warm = median_ms(board, args.runs)
+            move = median_ms(lambda run: data_manager.update_repair_status(
+                open_ids[run], BOARD_STATUSES[run % len(BOARD_STATUSES)]), args.runs)
+            complete = median_ms(lambda run: data_manager.update_repair_status(
+                open_ids[-1 - run], "Completed"), args.runs)
+            print(f"{repairs:>10} {len(open_ids):>7} {opened:>12.2f} {cold:>13.1f} {warm:>13.1f} "
+                  f"{move:>8.1f} {complete:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
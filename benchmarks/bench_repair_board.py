@@ -0,0 +1,78 @@
+"""Time to build the Active Repairs board for a growing number of open tickets.
+
+Compares the paginated board (utils.repair_board) with building every card
+row by row as the page used to. Usage:
+
+    python benchmarks/bench_repair_board.py [tickets ...] [--page-size N]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.repair_board import BOARD_STATUSES, REPAIR_CATEGORIES, board_columns
+
+DEFAULT_TICKETS = [10, 100, 1000]
+ROUNDS = 20
+
+
+def active_repairs(tickets):
+    """Synthetic open tickets spread over the board columns"""
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'id': [f"{i:016x}" for i in range(tickets)],
+        'date': pd.date_range("2024-01-01", periods=tickets, freq="min").strftime("%Y-%m-%d %H:%M:%S"),
+        'customer_name': rng.choice(["John Smith", "Mary Johnson", "Peter Parker", "Tony Stark"], tickets),
+        'phone': rng.integers(1_000_000_000, 9_999_999_999, tickets).astype(str),
+        'device': rng.choice(["iPhone 12", "Samsung S22", "Pixel 7"], tickets),
+        'category': rng.choice(list(REPAIR_CATEGORIES), tickets),
+        'issue': rng.choice(["Broken Screen", "Battery Issue", "Water damage <urgent>"], tickets),
+        'status': rng.choice(BOARD_STATUSES, tickets),
+        'estimated_cost': rng.integers(2_000, 40_000, tickets) / 100,
+        'photo_path': None,
+    }).sort_values('date', ascending=False)
+
+
+def row_by_row(repairs):
+    """The card loop the board used before pagination, without Streamlit"""
+    cards = []
+    for status in BOARD_STATUSES:
+        for _, repair in repairs[repairs['status'] == status].iterrows():
+            category = repair.get('category', 'Other') if pd.notna(repair.get('category')) else 'Other'
+            cards.append(
+                f"<h4>{REPAIR_CATEGORIES[category]['icon']} {repair['customer_name']}</h4>"
+                f"<p>{repair['device']}</p><p>{repair['phone']}</p><p>{repair['issue']}</p>"
+                f"<p>${float(repair['estimated_cost']):.2f}</p>"
+            )
+    return cards
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        func(*args)
+    return (time.perf_counter() - start) / ROUNDS * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("tickets", nargs="*", type=int, default=DEFAULT_TICKETS)
+    parser.add_argument("--page-size", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'tickets':>8} {'cards shown':>12} {'paginated ms':>13} {'row by row ms':>14}")
+    for tickets in args.tickets:
+        repairs = active_repairs(tickets)
+        columns = board_columns(repairs, {}, args.page_size)
+        shown = sum(len(column['cards']) for column in columns.values())
+        paginated = timed(board_columns, repairs, {}, args.page_size)
+        print(f"{tickets:>8} {shown:>12} {paginated:>13.2f} {timed(row_by_row, repairs):>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
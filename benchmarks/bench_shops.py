@@ -0,0 +1,88 @@
+"""Time the all-shops report against reporting on each shop one after another.
+
+Generates a main shop and --shops - 1 branches (benchmarks/synthetic.py),
+each with a year of sales of a different size, and times a yearly report:
+shop by shop in this process with every cache emptied, then across all shops
+through the worker pool (utils/report_server.py) the first time, when the pool starts
+and builds every rollup from the tables, after a sale in every shop, when
+the workers build them again, and once more with nothing changed. Saved
+rollups are deleted before each cold run, so every shop reads its tables.
+The parallel runs can only beat the sum of the shops with more than one CPU
+(GSMLAB_REPORT_WORKERS overrides the pool size). Usage:
+
+    python benchmarks/bench_shops.py [--shops 10] [--sales 20000] [--backend csv]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.bench_suite import reset_caches
+from benchmarks.synthetic import generate
+from utils.data_manager import ROLLUP_FILE, DataManager
+from utils.shops import SHOPS_DIR, cross_shop_report, report_workers, shop_dirs
+
+
+def forget_rollups(shops):
+    for data_dir in shops.values():
+        path = os.path.join(data_dir, ROLLUP_FILE)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def timed(operation):
+    start = time.perf_counter()
+    operation()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shops", type=int, default=10)
+    parser.add_argument("--sales", type=int, default=20_000, help="sales of the largest shop")
+    parser.add_argument("--backend", default=os.environ.get("GSMLAB_BACKEND", "csv"))
+    args = parser.parse_args()
+
+    end = datetime.now().date()
+    start = end - timedelta(days=365)
+    with tempfile.TemporaryDirectory() as root:
+        for number in range(args.shops):
+            data_dir = root if number == 0 else os.path.join(root, SHOPS_DIR, f"Branch {number}")
+            # The main shop is the largest, the branches a spread of smaller ones
+            generate(data_dir, sales=args.sales * (args.shops - number) // args.shops, photos=0, years=1, seed=number)
+        shops = shop_dirs(root)
+        for data_dir in shops.values():
+            # Moves the completed repairs out of the way before anything is timed
+            DataManager(data_dir, args.backend)
+
+        def report_shop(data_dir):
+            DataManager(data_dir, args.backend).get_daily_report(start, end)
+
+        shop_seconds = []
+        forget_rollups(shops)
+        for data_dir in shops.values():
+            reset_caches()
+            shop_seconds.append(timed(lambda: report_shop(data_dir)))
+
+        forget_rollups(shops)
+        first = timed(lambda: cross_shop_report(shops, start, end, args.backend))
+        forget_rollups(shops)
+        for data_dir in shops.values():
+            DataManager(data_dir, args.backend).add_sale({'customer_name': "Bench", 'item': "Cable", 'price': 1.0})
+        changed = timed(lambda: cross_shop_report(shops, start, end, args.backend))
+        unchanged = timed(lambda: cross_shop_report(shops, start, end, args.backend))
+
+        print(f"{len(shops)} shops, {report_workers()} report workers, backend {args.backend}")
+        print(f"  one shop after another   {sum(shop_seconds):7.2f} s (slowest shop {max(shop_seconds):.2f} s)")
+        print(f"  all shops, pool starting {first:7.2f} s")
+        print(f"  all shops, after a sale  {changed:7.2f} s")
+        print(f"  all shops, unchanged     {unchanged:7.2f} s")
+
+
+if __name__ == "__main__":
+    main()
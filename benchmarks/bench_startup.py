@@ -0,0 +1,78 @@
+"""Time to first dashboard paint of a freshly started server process.
+
+Runs main.py once in a new Python process per measurement, against a data
+directory with the given number of sales, and reports how long importing the
+app and rendering the dashboard took. "first start" has no saved rollup, as
+after a fresh install; "restart" reuses the one the first start saved, as
+after a deploy. Usage:
+
+    python benchmarks/bench_startup.py [rows ...]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+
+def paint():
+    """Render the dashboard once in this process and print the timings as JSON"""
+    start = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(os.path.join(ROOT, "main.py"), default_timeout=600)
+    imported = time.perf_counter()
+    app.run()
+    painted = time.perf_counter()
+    if app.exception:
+        raise SystemExit(app.exception[0].value)
+    print(json.dumps({
+        'import': imported - start,
+        'paint': painted - imported,
+        'plotly_loaded': "plotly.express" in sys.modules,
+    }))
+
+
+def measure(data_dir):
+    env = dict(os.environ, GSMLAB_DATA_DIR=data_dir)
+    # Run next to the data directory, where the app looks by default
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--paint"],
+        cwd=os.path.dirname(data_dir), env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(sizes):
+    from benchmarks.bench_append import write_sales
+    from utils.data_manager import ROLLUP_FILE, DataManager
+
+    print(f"{'rows':>10} {'start':>12} {'import s':>9} {'paint s':>8} {'plotly':>7}")
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as work_dir:
+            data_dir = os.path.join(work_dir, "data")
+            os.makedirs(data_dir)
+            write_sales(os.path.join(data_dir, "sales.csv"), rows)
+            # Give the rows IDs up front, as any install older than this one has
+            DataManager(data_dir)
+            rollup_path = os.path.join(data_dir, ROLLUP_FILE)
+            if os.path.exists(rollup_path):
+                os.remove(rollup_path)
+
+            for label in ("first start", "restart"):
+                timings = measure(data_dir)
+                print(f"{rows:>10} {label:>12} {timings['import']:>9.3f} {timings['paint']:>8.3f} "
+                      f"{'yes' if timings['plotly_loaded'] else 'no':>7}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--paint"]:
+        paint()
+    else:
+        main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
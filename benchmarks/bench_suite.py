@@ -0,0 +1,261 @@
+"""Time every DataManager operation and page computation on synthetic data of growing size.
+
+For each scale it generates a data directory (benchmarks/synthetic.py) and
+times the table reads, the writes, photo loading and the data work behind the
+dashboard, repairs, customers and reports pages, as done outside Streamlit.
+Reads are timed cold (every process-wide cache emptied, as after a restart)
+and warm. Results are written as JSON; --compare prints each median next to
+the one in an earlier results file and exits with status 1 if any got slower
+than --threshold times. Usage:
+
+    python benchmarks/bench_suite.py [sales ...] [--backend csv] [--runs 5] [--output results.json]
+                                     [--compare baseline.json] [--threshold 1.25]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic import generate
+from utils.cache import derived, frames, renders
+from utils.data_manager import DataManager
+from utils.photos import photo_cache
+from utils.repair_board import BOARD_STATUSES, board_columns
+
+DEFAULT_SIZES = [10_000, 100_000]
+RUNS = 5
+
+
+def reset_caches():
+    """Forget everything loaded or built in this process, as a restarted server would"""
+    frames.invalidate()
+    derived.invalidate()
+    renders.invalidate()
+    photo_cache.clear()
+
+
+def timed(operation, runs, cold=True):
+    """Time `operation`, once after emptying the caches and `runs` times warm"""
+    result = {}
+    if cold:
+        reset_caches()
+        start = time.perf_counter()
+        operation(0)
+        result['cold_s'] = time.perf_counter() - start
+    times = []
+    for run in range(runs):
+        start = time.perf_counter()
+        operation(run + 1)
+        times.append(time.perf_counter() - start)
+    result.update(median_s=statistics.median(times), min_s=min(times), max_s=max(times), runs=runs)
+    return result
+
+
+def page_operations(data_manager):
+    """The data work of each page, as main.py and pages/*.py do it"""
+    today = datetime.now().date()
+
+    def dashboard(run):
+        statuses = data_manager.repair_status_counts()
+        return (
+            data_manager.sales_total(today, today),
+            sum(statuses.values()) - statuses.get('Completed', 0),
+            data_manager.low_stock_count(),
+        )
+
+    def repair_board(run, search_term=""):
+        repairs = data_manager.get_repairs(status=BOARD_STATUSES)
+        if search_term:
+            repairs = data_manager.filter_search("repairs", repairs, search_term)
+        return board_columns(repairs.sort_values('date', ascending=False), {}, 10)
+
+    def customers_recent(run):
+        columns = ['customer_name', 'phone', 'date']
+        return pd.concat([
+            data_manager.recent("repairs", 5, columns), data_manager.recent("sales", 5, columns),
+        ]).drop_duplicates().sort_values('date', ascending=False).head(5)
+
+    def customers_search(run):
+        found = data_manager.search_customers("john", limit=50)
+        return [data_manager.get_customer_history(customer) for customer in found[:5]]
+
+    def reports(run):
+        import plotly.express as px
+
+        report = data_manager.get_daily_report(today - timedelta(days=30), today)
+        daily = report['daily']
+        return [
+            px.line(daily, x='date', y='sales_total'),
+            px.pie(values=report['statuses'].values, names=report['statuses'].index),
+            px.bar(daily, x='date', y='repairs_opened'),
+            px.pie(values=report['payment_methods'].values, names=report['payment_methods'].index),
+        ]
+
+    def sales_history(run):
+        sales = data_manager.get_sales(today, today)
+        return data_manager.filter_search("sales", sales, "cable")
+
+    return {
+        'page.dashboard': dashboard,
+        'page.repair_board': repair_board,
+        'page.repair_board_search': lambda run: repair_board(run, "screen"),
+        'page.customers_recent': customers_recent,
+        'page.customers_search': customers_search,
+        'page.reports': reports,
+        'page.sales_history': sales_history,
+    }
+
+
+def read_operations(data_manager):
+    today = datetime.now().date()
+    some_repairs = data_manager.recent("repairs", 20, ['id'])['id'].tolist()
+    photos = data_manager.get_repairs(columns=['photo_path'])['photo_path'].dropna()
+    photos = [path for path in photos.unique()[:20] if path]
+    return {
+        'get_sales': lambda run: data_manager.get_sales(),
+        'get_sales.today': lambda run: data_manager.get_sales(today, today),
+        'get_repairs': lambda run: data_manager.get_repairs(),
+        'get_repairs.open': lambda run: data_manager.get_repairs(status=BOARD_STATUSES),
+        'get_repair': lambda run: [data_manager.get_repair(repair_id) for repair_id in some_repairs],
+        'get_inventory': lambda run: data_manager.get_inventory(),
+        'get_photo_as_base64': lambda run: [data_manager.get_photo_as_base64(path) for path in photos],
+        'get_photo_as_base64.full': lambda run: [data_manager.get_photo_as_base64(path, False) for path in photos],
+    }
+
+
+def write_operations(data_manager):
+    repair_ids = data_manager.recent("repairs", 50, ['id'])['id'].tolist()
+    statuses = ["In Progress", "Waiting for Parts", "Ready for Pickup", "Completed"]
+    item = data_manager.get_inventory()['item_name'].iloc[0]
+
+    def add_sale(run):
+        data_manager.add_sale({
+            'customer_name': f"Bench Customer {run}", 'phone': "5550000000", 'item': item,
+            'price': 9.99, 'payment_method': "Cash",
+        })
+
+    def add_repair(run):
+        data_manager.add_repair({
+            'customer_name': f"Bench Customer {run}", 'phone': "5550000000", 'device': "iPhone 13",
+            'category': "Screen Repair", 'issue': "Cracked screen", 'status': "Pending", 'estimated_cost': 120.0,
+        })
+
+    def update_repair_status(run):
+        data_manager.update_repair_status(repair_ids[run % len(repair_ids)], statuses[run % len(statuses)])
+
+    def update_inventory(run):
+        inventory = data_manager.get_inventory()
+        inventory.loc[0, 'quantity'] = run
+        data_manager.update_inventory(inventory)
+
+    return {
+        'add_sale': add_sale,
+        'add_repair': add_repair,
+        'update_repair_status': update_repair_status,
+        'update_inventory': update_inventory,
+        'adjust_quantity': lambda run: data_manager.adjust_quantity(item, 1),
+    }
+
+
+def run_scale(sales, backend, runs, photos, years):
+    with tempfile.TemporaryDirectory() as data_dir:
+        start = time.perf_counter()
+        sizes = generate(data_dir, sales=sales, photos=photos, years=years)
+        generated = time.perf_counter() - start
+
+        reset_caches()
+        start = time.perf_counter()
+        data_manager = DataManager(data_dir, backend)
+        results = {'DataManager': {'cold_s': time.perf_counter() - start}}
+
+        for name, operation in read_operations(data_manager).items():
+            results[name] = timed(operation, runs)
+        for name, operation in page_operations(data_manager).items():
+            results[name] = timed(operation, runs)
+        # Writes go last: they change the data the reads above are timed on
+        for name, operation in write_operations(data_manager).items():
+            results[name] = timed(operation, runs, cold=False)
+        data_manager.flush()
+    return {'sizes': sizes, 'generate_s': generated, 'results': results}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline, threshold):
+    """Print every median next to the baseline's and return the operations that got slower"""
+    slower = []
+    old_scales = {scale['sizes']['sales']: scale['results'] for scale in baseline['scales']}
+    print(f"{'sales':>10} {'operation':<28} {'before ms':>10} {'after ms':>10} {'ratio':>7}")
+    for scale in report['scales']:
+        old = old_scales.get(scale['sizes']['sales'], {})
+        for name, result in scale['results'].items():
+            if 'median_s' not in result or 'median_s' not in old.get(name, {}):
+                continue
+            before, after = old[name]['median_s'], result['median_s']
+            ratio = after / before if before else float("inf")
+            flag = "  slower" if ratio > threshold else ""
+            print(f"{scale['sizes']['sales']:>10} {name:<28} {before * 1000:>10.2f} {after * 1000:>10.2f} {ratio:>7.2f}{flag}")
+            if ratio > threshold:
+                slower.append((scale['sizes']['sales'], name))
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("sales", nargs="*", type=int, default=DEFAULT_SIZES)
+    parser.add_argument("--backend", default=os.environ.get("GSMLAB_BACKEND", "csv"))
+    parser.add_argument("--runs", type=int, default=RUNS)
+    parser.add_argument("--photos", type=int, default=50)
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--output", help="write the JSON here instead of to stdout")
+    parser.add_argument("--compare", help="results file of an earlier version")
+    parser.add_argument("--threshold", type=float, default=1.25)
+    args = parser.parse_args()
+
+    report = {
+        'commit': git_commit(),
+        'created': datetime.now().isoformat(timespec="seconds"),
+        'backend': args.backend,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'scales': [],
+    }
+    for sales in args.sales:
+        report['scales'].append(run_scale(sales, args.backend, args.runs, args.photos, args.years))
+        print(f"{sales} sales done", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    elif not args.compare:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            slower = compare(report, json.load(f), args.threshold)
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
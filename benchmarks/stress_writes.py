@@ -0,0 +1,107 @@
+"""Stress test for concurrent writers: no sale may be lost.
+
+Starts several processes, each recording sales from several threads at once,
+while another process keeps rewriting the whole sales table (as compaction
+does). Afterwards every sale must be in the table exactly once. It exits with
+status 1 if any is missing or duplicated, and prints the throughput next to
+that of the old read-concat-rewrite add_sale. Usage:
+
+    python benchmarks/stress_writes.py [--processes 4] [--threads 5] [--sales 5] [--backend csv]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.data_manager import DataManager
+
+
+def record_sales(data_dir, backend, worker, threads, sales):
+    """Record threads * sales sales from one process, returning their IDs"""
+    data_manager = DataManager(data_dir, backend)
+
+    def record(thread):
+        ids = []
+        for i in range(sales):
+            ids.append(data_manager.add_sale({
+                'id': f"w{worker}t{thread}s{i}",
+                'customer_name': f"Stress {worker}-{thread}",
+                'phone': "5550000000",
+                'item': "USB-C Cable",
+                'price': 9.99,
+                'payment_method': "Cash",
+            }))
+        return ids
+
+    with ThreadPoolExecutor(threads) as pool:
+        return [sale_id for ids in pool.map(record, range(threads)) for sale_id in ids]
+
+
+def rewrite_table(data_dir, backend, stop):
+    """Keep replacing the sales table with its own contents until told to stop"""
+    data_manager = DataManager(data_dir, backend)
+    rewrites = 0
+    while not stop.is_set():
+        data_manager.write(["sales"], lambda: data_manager.storage.write("sales", data_manager.storage.read("sales")))
+        rewrites += 1
+    return rewrites
+
+
+def old_add_sale(path, sale):
+    """add_sale as it used to be: read the table, concat one row, rewrite it"""
+    df = pd.read_csv(path)
+    df = pd.concat([df, pd.DataFrame([sale])], ignore_index=True)
+    df.to_csv(path, index=False)
+
+
+def main(processes, threads, sales, backend):
+    expected = processes * threads * sales
+    with tempfile.TemporaryDirectory() as data_dir:
+        DataManager(data_dir, backend)
+        with multiprocessing.Manager() as manager, multiprocessing.Pool(processes + 1) as pool:
+            stop = manager.Event()
+            rewriter = pool.apply_async(rewrite_table, (data_dir, backend, stop))
+            start = time.perf_counter()
+            workers = [
+                pool.apply_async(record_sales, (data_dir, backend, worker, threads, sales))
+                for worker in range(processes)
+            ]
+            recorded = [sale_id for worker in workers for sale_id in worker.get()]
+            elapsed = time.perf_counter() - start
+            stop.set()
+            rewrites = rewriter.get()
+
+        stored = DataManager(data_dir, backend).get_sales()['id']
+        missing = set(recorded) - set(stored)
+        duplicated = stored[stored.duplicated()].tolist()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        path = os.path.join(data_dir, "sales.csv")
+        pd.DataFrame(columns=['date', 'customer_name', 'phone', 'item', 'price', 'payment_method']).to_csv(path, index=False)
+        old_start = time.perf_counter()
+        for i in range(expected):
+            old_add_sale(path, {'date': "2024-01-01 00:00:00", 'customer_name': f"Old {i}", 'phone': "5550000000",
+                                'item': "USB-C Cable", 'price': 9.99, 'payment_method': "Cash"})
+        old_elapsed = time.perf_counter() - old_start
+
+    print(f"{expected} sales from {processes} processes x {threads} threads, {rewrites} concurrent table rewrites")
+    print(f"recorded {len(recorded)}, stored {len(stored)}, missing {len(missing)}, duplicated {len(duplicated)}")
+    print(f"throughput {expected / elapsed:.0f} sales/s (old serialized rewrites: {expected / old_elapsed:.0f} sales/s)")
+    return 0 if len(recorded) == expected and not missing and not duplicated else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=5)
+    parser.add_argument("--sales", type=int, default=5, help="sales per thread")
+    parser.add_argument("--backend", default="csv")
+    args = parser.parse_args()
+    sys.exit(main(args.processes, args.threads, args.sales, args.backend))
@@ -0,0 +1,178 @@
+"""Generate a realistic synthetic data directory for benchmarks.
+
+Writes sales.csv, repairs.csv and inventory.csv with IDs, dated over the
+given number of years up to now and in the order they would have been
+recorded, plus a set of customer photos that some repairs point at. Rows are
+written in chunks, so tens of millions of them fit in memory. Point the app
+at the result with GSMLAB_DATA_DIR. Usage:
+
+    python benchmarks/synthetic.py DATA_DIR [--sales N] [--repairs N] [--items N] [--photos N] [--years N]
+"""
+import argparse
+import io
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.repair_board import REPAIR_CATEGORIES, STATUS_COLORS
+from utils.storage import DATE_FORMAT, TABLES
+
+CHUNK_ROWS = 1_000_000
+
+FIRST_NAMES = ["John", "Mary", "Peter", "Tony", "Sarah", "Ahmed", "Fatima", "Carlos", "Yuki", "Olga", "Priya", "Liam"]
+LAST_NAMES = ["Smith", "Johnson", "Parker", "Stark", "Garcia", "Khan", "Silva", "Tanaka", "Ivanova", "Patel", "Murphy"]
+ITEMS = ["iPhone 13 Screen", "Samsung S21 Battery", "USB-C Cable", "Lightning Cable", "Tempered Glass",
+         "Phone Case", "Wall Charger", "Pixel 6 Screen", "Earbuds", "Power Bank"]
+DEVICES = ["iPhone 11", "iPhone 13", "iPhone 15", "Galaxy S21", "Galaxy A52", "Pixel 6", "Redmi Note 10", "Moto G"]
+ISSUES = ["Cracked screen", "Battery drains fast", "Won't charge", "Dropped in water", "No sound from speaker",
+          "Camera blurry", "Touch not responding", "Stuck on boot logo"]
+PAYMENT_METHODS = ["Cash", "Card", "Mobile Payment"]
+PAYMENT_WEIGHTS = [0.35, 0.5, 0.15]
+
+# Repairs older than this are almost all completed; newer ones are spread over the board
+OPEN_REPAIR_DAYS = 30
+
+
+def customers(rng, count):
+    """A pool of (name, phone) pairs that transactions draw from, some far more often than others"""
+    names = rng.choice(FIRST_NAMES, count).astype(object) + " " + rng.choice(LAST_NAMES, count).astype(object)
+    phones = rng.integers(1_000_000_000, 9_999_999_999, count).astype(str)
+    return names, phones
+
+
+def pick_customers(rng, pool, rows):
+    # Regulars come back: Zipf-like weights over the customer pool
+    names, phones = pool
+    picked = np.minimum(rng.zipf(1.3, rows) - 1, len(names) - 1)
+    return names[picked], phones[picked]
+
+
+def dates(rng, rows, years):
+    """Now and the age in seconds of each row, oldest first, spread over `years`"""
+    now = pd.Timestamp.now().floor("s")
+    offsets = np.sort(rng.integers(0, max(1, int(years * 365 * 86400)), rows))[::-1]
+    return now, offsets
+
+
+def write_chunks(path, columns, rows, make_chunk):
+    """Write a CSV of `rows` rows built CHUNK_ROWS at a time by make_chunk(start, stop)"""
+    pd.DataFrame(columns=columns).to_csv(path, index=False)
+    for start in range(0, rows, CHUNK_ROWS):
+        make_chunk(start, min(rows, start + CHUNK_ROWS))[columns].to_csv(path, mode="a", header=False, index=False)
+
+
+def write_sales(data_dir, rows, years, pool, rng):
+    now, offsets = dates(rng, rows, years)
+
+    def chunk(start, stop):
+        size = stop - start
+        names, phones = pick_customers(rng, pool, size)
+        return pd.DataFrame({
+            'id': [f"s{i:015x}" for i in range(start, stop)],
+            'date': (now - pd.to_timedelta(offsets[start:stop], unit="s")).strftime(DATE_FORMAT),
+            'customer_name': names,
+            'phone': phones,
+            'item': rng.choice(ITEMS, size),
+            'price': rng.integers(500, 50_000, size) / 100,
+            'payment_method': rng.choice(PAYMENT_METHODS, size, p=PAYMENT_WEIGHTS),
+        })
+
+    write_chunks(os.path.join(data_dir, "sales.csv"), TABLES["sales"], rows, chunk)
+
+
+def write_repairs(data_dir, rows, years, pool, photo_paths, rng):
+    now, offsets = dates(rng, rows, years)
+    statuses = list(STATUS_COLORS)
+    open_statuses = [status for status in statuses if status != "Completed"]
+
+    def chunk(start, stop):
+        size = stop - start
+        names, phones = pick_customers(rng, pool, size)
+        age = offsets[start:stop]
+        opened = now - pd.to_timedelta(age, unit="s")
+        recent = age < OPEN_REPAIR_DAYS * 86400
+        completed = np.where(recent, rng.random(size) < 0.4, rng.random(size) < 0.98)
+        status = np.where(completed, "Completed", rng.choice(open_statuses, size))
+        finished = opened + pd.to_timedelta(rng.integers(3600, 10 * 86400, size), unit="s")
+        finished = finished.where(finished <= now, now)
+        completion = pd.Series(finished.strftime(DATE_FORMAT)).where(completed, "")
+        photo = np.full(size, "", dtype=object)
+        if photo_paths:
+            with_photo = rng.random(size) < 0.2
+            photo[with_photo] = rng.choice(photo_paths, int(with_photo.sum()))
+        return pd.DataFrame({
+            'id': [f"r{i:015x}" for i in range(start, stop)],
+            'date': opened.strftime(DATE_FORMAT),
+            'customer_name': names,
+            'phone': phones,
+            'device': rng.choice(DEVICES, size),
+            'category': rng.choice(list(REPAIR_CATEGORIES), size),
+            'issue': rng.choice(ISSUES, size),
+            'status': status,
+            'estimated_cost': rng.integers(2_000, 40_000, size) / 100,
+            'completion_date': completion.to_numpy(),
+            'photo_path': photo,
+        })
+
+    write_chunks(os.path.join(data_dir, "repairs.csv"), TABLES["repairs"], rows, chunk)
+
+
+def write_inventory(data_dir, items, rng):
+    names = [f"{ITEMS[i % len(ITEMS)]} #{i // len(ITEMS) + 1}" for i in range(items)]
+    pd.DataFrame({
+        'item_name': names,
+        'quantity': rng.integers(0, 100, items),
+        'price': rng.integers(100, 30_000, items) / 100,
+        'threshold': rng.integers(0, 10, items),
+    }).to_csv(os.path.join(data_dir, "inventory.csv"), index=False)
+
+
+def write_photos(data_dir, count, rng, size=(1600, 1200)):
+    """Save `count` phone-camera sized JPEGs and return their paths"""
+    if not count:
+        return []
+    from PIL import Image
+
+    photos_dir = os.path.join(data_dir, "customer_photos")
+    os.makedirs(photos_dir, exist_ok=True)
+    # Noise doesn't compress, so the files are as big as real photos
+    pixels = rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+    encoded = io.BytesIO()
+    Image.fromarray(pixels).save(encoded, "JPEG", quality=85)
+    paths = []
+    for i in range(count):
+        path = os.path.join(photos_dir, f"Customer{i}_20240101_{i:06d}.jpg")
+        with open(path, "wb") as f:
+            f.write(encoded.getvalue())
+        paths.append(path)
+    return paths
+
+
+def generate(data_dir, sales=10_000, repairs=None, items=500, photos=50, years=3, seed=0):
+    """Fill `data_dir` with synthetic tables and photos, returning the sizes written"""
+    repairs = sales // 3 if repairs is None else repairs
+    rng = np.random.default_rng(seed)
+    os.makedirs(data_dir, exist_ok=True)
+    pool = customers(rng, max(100, (sales + repairs) // 20))
+    photo_paths = write_photos(data_dir, photos, rng)
+    write_sales(data_dir, sales, years, pool, rng)
+    write_repairs(data_dir, repairs, years, pool, photo_paths, rng)
+    write_inventory(data_dir, items, rng)
+    return {'sales': sales, 'repairs': repairs, 'items': items, 'photos': photos, 'years': years}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("data_dir")
+    parser.add_argument("--sales", type=int, default=10_000)
+    parser.add_argument("--repairs", type=int, help="default: a third of the sales")
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--photos", type=int, default=50)
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(generate(args.data_dir, args.sales, args.repairs, args.items, args.photos, args.years, args.seed))
@@ -1,5 +1,7 @@
 import streamlit as st
-from utils.data_manager import DataManager
+from utils.data_manager import get_data_manager
+from utils.metrics import metrics
+from utils.shops import shop_dirs, shop_of
 from datetime import datetime
 
 st.set_page_config(
@@ -8,9 +10,17 @@ st.set_page_config(
     layout="wide"
 )
 
-# Initialize data manager
+# Every session uses the process's data manager
 if 'data_manager' not in st.session_state:
-    st.session_state.data_manager = DataManager()
+    st.session_state.data_manager = get_data_manager()
+
+# Each shop has its own data; the session works on the one picked here
+shops = shop_dirs()
+if len(shops) > 1:
+    current = shop_of(st.session_state.data_manager, shops) or next(iter(shops))
+    shop = st.sidebar.selectbox("Shop", list(shops), index=list(shops).index(current))
+    if shop != current:
+        st.session_state.data_manager = get_data_manager(shops[shop])
 
 # Main page header
 st.title("📱 GSM-Lab Management System")
@@ -21,27 +31,38 @@ st.header("Dashboard Overview")
 # Create three columns for key metrics
 col1, col2, col3 = st.columns(3)
 
-# Get data for metrics
-sales_df = st.session_state.data_manager.get_sales()
-repairs_df = st.session_state.data_manager.get_repairs()
-inventory_df = st.session_state.data_manager.get_inventory()
+def dashboard_metrics(today):
+    """Dashboard numbers, from the running totals rather than the tables"""
+    data_manager = st.session_state.data_manager
+    statuses = data_manager.repair_status_counts()
+    return {
+        'todays_sales': data_manager.sales_total(today, today),
+        'active_repairs': sum(statuses.values()) - statuses.get('Completed', 0),
+        'low_stock': data_manager.low_stock_count(),
+    }
+
+
+# Recomputed only after a write (or once the cache entry expires)
+today = datetime.now().date()
+with metrics.span("page.main.metrics"):
+    dashboard = st.session_state.data_manager.cached("dashboard", (today,), lambda: dashboard_metrics(today))
 
 with col1:
     st.metric(
         label="Today's Sales",
-        value=f"${sales_df[sales_df['date'].str.contains(datetime.now().strftime('%Y-%m-%d'))]['price'].sum():.2f}"
+        value=f"${dashboard['todays_sales']:.2f}"
     )
 
 with col2:
     st.metric(
         label="Active Repairs",
-        value=len(repairs_df[repairs_df['status'] != 'Completed'])
+        value=dashboard['active_repairs']
     )
 
 with col3:
     st.metric(
         label="Low Stock Items",
-        value=len(inventory_df[inventory_df['quantity'] <= inventory_df['threshold']])
+        value=dashboard['low_stock']
     )
 
 # Quick Links
@@ -56,4 +77,8 @@ st.write("""
 # Footer
 st.markdown("---")
 st.markdown("### GSM-Lab Management System v1.0")
-st.markdown("For support, contact system administrator")
\ No newline at end of file
+st.markdown("For support, contact system administrator")
+
+# Build the indexes the other pages use in the background, now that the
+# dashboard is drawn and no longer competes with it
+st.session_state.data_manager.start_warm_up()
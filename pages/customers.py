@@ -1,75 +1,48 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime
 
-st.title("👥 Customer Management")
+from utils.data_manager import session_data_manager
+from utils.metrics import metrics
+
+session_data_manager(st.session_state)
 
-# Get data
-sales_df = st.session_state.data_manager.get_sales()
-repairs_df = st.session_state.data_manager.get_repairs()
+st.title("👥 Customer Management")
 
 # Search bar for customers
 st.header("🔍 Find Customer")
 search_term = st.text_input("Search by name or phone number")
 
-# Combine and process customer data
-def get_customer_history(name=None, phone=None):
-    # Get all repairs for the customer
-    customer_repairs = repairs_df[
-        (repairs_df['customer_name'].str.contains(name, case=False, na=False) if name else True) |
-        (repairs_df['phone'].str.contains(phone, case=False, na=False) if phone else True)
-    ].copy()
-    
-    # Get all sales for the customer
-    customer_sales = sales_df[
-        (sales_df['customer_name'].str.contains(name, case=False, na=False) if name else True) |
-        (sales_df['phone'].str.contains(phone, case=False, na=False) if phone else True)
-    ].copy()
-    
-    return customer_repairs, customer_sales
+# Search results are capped so a one-letter search stays quick
+MAX_RESULTS = 50
 
 if search_term:
-    customer_repairs, customer_sales = get_customer_history(search_term, search_term)
+    with metrics.span("page.customers.search"):
+        customers = st.session_state.data_manager.search_customers(search_term, limit=MAX_RESULTS)
     
-    if not customer_repairs.empty or not customer_sales.empty:
-        # Get unique customers from both datasets
-        unique_customers = pd.concat([
-            customer_repairs[['customer_name', 'phone']],
-            customer_sales[['customer_name', 'phone']]
-        ]).drop_duplicates()
+    if customers:
+        if len(customers) == MAX_RESULTS:
+            st.caption(f"Showing the {MAX_RESULTS} most recent matches, refine the search to narrow them down")
         
-        for _, customer in unique_customers.iterrows():
+        for customer in customers:
             with st.expander(f"📋 {customer['customer_name']} - {customer['phone']}"):
+                with metrics.span("page.customers.history"):
+                    customer_repairs, customer_sales = st.session_state.data_manager.get_customer_history(customer)
+                
                 # Customer Statistics
                 col1, col2, col3 = st.columns(3)
                 
                 with col1:
-                    total_repairs = len(customer_repairs[
-                        (customer_repairs['customer_name'] == customer['customer_name']) &
-                        (customer_repairs['phone'] == customer['phone'])
-                    ])
-                    st.metric("Total Repairs", total_repairs)
+                    st.metric("Total Repairs", customer['total_repairs'])
                 
                 with col2:
-                    total_sales = len(customer_sales[
-                        (customer_sales['customer_name'] == customer['customer_name']) &
-                        (customer_sales['phone'] == customer['phone'])
-                    ])
-                    st.metric("Total Purchases", total_sales)
+                    st.metric("Total Purchases", customer['total_sales'])
                 
                 with col3:
-                    total_spent = customer_sales[
-                        (customer_sales['customer_name'] == customer['customer_name']) &
-                        (customer_sales['phone'] == customer['phone'])
-                    ]['price'].sum()
-                    st.metric("Total Spent", f"${total_spent:.2f}")
+                    st.metric("Total Spent", f"${customer['total_spent']:.2f}")
                 
                 # Repair History
                 st.subheader("🔧 Repair History")
-                customer_repair_history = customer_repairs[
-                    (customer_repairs['customer_name'] == customer['customer_name']) &
-                    (customer_repairs['phone'] == customer['phone'])
-                ].sort_values('date', ascending=False)
+                customer_repair_history = customer_repairs.sort_values('date', ascending=False)
                 
                 if not customer_repair_history.empty:
                     for _, repair in customer_repair_history.iterrows():
@@ -92,10 +65,7 @@ if search_term:
                 
                 # Purchase History
                 st.subheader("🛍️ Purchase History")
-                customer_purchase_history = customer_sales[
-                    (customer_sales['customer_name'] == customer['customer_name']) &
-                    (customer_sales['phone'] == customer['phone'])
-                ].sort_values('date', ascending=False)
+                customer_purchase_history = customer_sales.sort_values('date', ascending=False)
                 
                 if not customer_purchase_history.empty:
                     for _, sale in customer_purchase_history.iterrows():
@@ -119,18 +89,23 @@ if search_term:
                                     style="width: 150px; border-radius: 10px; margin: 10px 0;"
                                 />
                             """, unsafe_allow_html=True)
+                            # The full-size photo is only sent when asked for
+                            if st.checkbox("Show full-size photo", key=f"full_photo_{customer['customer_name']}_{customer['phone']}"):
+                                st.image(latest_photo)
     else:
         st.warning("No customers found matching your search")
 else:
     # Show recent customers
     st.subheader("Recent Customers")
-    recent_repairs = repairs_df.sort_values('date', ascending=False).head(5)
-    recent_sales = sales_df.sort_values('date', ascending=False).head(5)
+    with metrics.span("page.customers.recent"):
+        # Only the last few rows of each table are read
+        recent_repairs = st.session_state.data_manager.recent("repairs", 5, columns=['customer_name', 'phone', 'date'])
+        recent_sales = st.session_state.data_manager.recent("sales", 5, columns=['customer_name', 'phone', 'date'])
     
-    recent_customers = pd.concat([
-        recent_repairs[['customer_name', 'phone', 'date']],
-        recent_sales[['customer_name', 'phone', 'date']]
-    ]).drop_duplicates().sort_values('date', ascending=False).head(5)
+        recent_customers = pd.concat([
+            recent_repairs[['customer_name', 'phone', 'date']],
+            recent_sales[['customer_name', 'phone', 'date']]
+        ]).drop_duplicates().sort_values('date', ascending=False).head(5)
     
     for _, customer in recent_customers.iterrows():
         st.markdown(f"👤 **{customer['customer_name']}** - {customer['phone']}")
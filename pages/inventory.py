@@ -1,5 +1,9 @@
 import streamlit as st
-import pandas as pd
+
+from utils.data_manager import session_data_manager
+from utils.metrics import metrics
+
+session_data_manager(st.session_state)
 
 st.title("Inventory Management")
 
@@ -18,14 +22,13 @@ with st.expander("Add New Item"):
         
         if submit_button:
             if item_name and quantity >= 0 and price >= 0:
-                new_item = pd.DataFrame({
-                    'item_name': [item_name],
-                    'quantity': [quantity],
-                    'price': [price],
-                    'threshold': [threshold]
+                st.session_state.data_manager.upsert_item({
+                    'item_name': item_name,
+                    'quantity': quantity,
+                    'price': price,
+                    'threshold': threshold
                 })
-                inventory_df = pd.concat([inventory_df, new_item], ignore_index=True)
-                st.session_state.data_manager.update_inventory(inventory_df)
+                inventory_df = st.session_state.data_manager.get_inventory()
                 st.success("Item added successfully!")
             else:
                 st.error("Please fill all required fields!")
@@ -34,42 +37,53 @@ with st.expander("Add New Item"):
 st.header("Current Inventory")
 
 # Filter for low stock items
+low_stock_items = st.session_state.data_manager.low_stock_items()
 show_low_stock = st.checkbox("Show Low Stock Items Only")
 if show_low_stock:
-    inventory_df = inventory_df[inventory_df['quantity'] <= inventory_df['threshold']]
+    low_names = [item['item_name'] for item in low_stock_items]
+    inventory_df = inventory_df[inventory_df['item_name'].isin(low_names)]
+
+# The editor's changes are row positions in the table it was given, so it
+# starts over after a save and when the filter changes what it shows
+st.session_state.setdefault('inventory_saves', 0)
+editor_key = f"inventory_editor_{'low' if show_low_stock else 'all'}_{st.session_state.inventory_saves}"
 
 # Display inventory table with edit capabilities
-edited_df = st.data_editor(
-    inventory_df,
-    num_rows="dynamic",
-    use_container_width=True,
-    column_config={
-        "quantity": st.column_config.NumberColumn(
-            "Quantity",
-            min_value=0,
-            format="%d"
-        ),
-        "price": st.column_config.NumberColumn(
-            "Price",
-            min_value=0.0,
-            format="$%.2f"
-        ),
-        "threshold": st.column_config.NumberColumn(
-            "Low Stock Threshold",
-            min_value=0,
-            format="%d"
-        )
-    }
-)
+with metrics.span("page.inventory.editor"):
+    st.data_editor(
+        inventory_df,
+        key=editor_key,
+        num_rows="dynamic",
+        use_container_width=True,
+        column_config={
+            "quantity": st.column_config.NumberColumn(
+                "Quantity",
+                min_value=0,
+                format="%d"
+            ),
+            "price": st.column_config.NumberColumn(
+                "Price",
+                min_value=0.0,
+                format="$%.2f"
+            ),
+            "threshold": st.column_config.NumberColumn(
+                "Low Stock Threshold",
+                min_value=0,
+                format="%d"
+            )
+        }
+    )
 
-# Save changes button
+# Save changes button: only the rows changed in the editor are written, and
+# items hidden by the low stock filter are left alone
 if st.button("Save Changes"):
-    st.session_state.data_manager.update_inventory(edited_df)
-    st.success("Inventory updated successfully!")
+    st.session_state.data_manager.save_inventory_edits(inventory_df, st.session_state[editor_key])
+    st.session_state.inventory_saves += 1
+    st.toast("Inventory updated successfully!")
+    st.rerun()
 
 # Low stock alerts
-low_stock_items = inventory_df[inventory_df['quantity'] <= inventory_df['threshold']]
-if not low_stock_items.empty:
+if low_stock_items:
     st.warning("### Low Stock Alerts")
-    for _, item in low_stock_items.iterrows():
+    for item in low_stock_items:
         st.write(f"⚠️ **{item['item_name']}** is running low! ({item['quantity']} remaining)")
@@ -0,0 +1,108 @@
+import hmac
+import os
+from datetime import datetime
+
+import streamlit as st
+
+from utils.data_manager import session_data_manager
+from utils.metrics import metrics
+
+session_data_manager(st.session_state)
+
+st.title("⏱️ Performance")
+
+# Admins only: the page is off unless a password is configured for it
+admin_password = os.environ.get("GSMLAB_ADMIN_PASSWORD")
+if not admin_password:
+    st.info("Set GSMLAB_ADMIN_PASSWORD on the server to enable this page.")
+    st.stop()
+
+if not st.session_state.get('performance_admin'):
+    password = st.text_input("Admin password", type="password")
+    if password and hmac.compare_digest(password.encode(), admin_password.encode()):
+        st.session_state.performance_admin = True
+        st.rerun()
+    elif password:
+        st.error("Wrong password")
+    st.stop()
+
+if not metrics.enabled:
+    st.warning("Timings are not being recorded: GSMLAB_METRICS is set to 0.")
+
+col1, col2 = st.columns([3, 1])
+with col1:
+    refresh_seconds = st.select_slider("Refresh every (seconds)", [1, 2, 5, 10, 30], value=5)
+with col2:
+    if st.button("Clear timings"):
+        metrics.clear()
+
+
+@st.fragment(run_every=refresh_seconds)
+def live_timings():
+    # Reruns on its own, so the numbers stay live without redrawing the page
+    summary = metrics.summary()
+    st.subheader("Spans")
+    st.caption(f"Last {metrics.size} calls of each span, slowest p95 first")
+    st.dataframe(
+        summary,
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            "p50_ms": st.column_config.NumberColumn("p50 ms", format="%.2f"),
+            "p95_ms": st.column_config.NumberColumn("p95 ms", format="%.2f"),
+            "p99_ms": st.column_config.NumberColumn("p99 ms", format="%.2f"),
+            "max_ms": st.column_config.NumberColumn("max ms", format="%.2f"),
+            "total_s": st.column_config.NumberColumn("total s", format="%.3f"),
+        },
+    )
+
+    st.subheader("Latest calls")
+    latest = metrics.events()[-50:][::-1]
+    for event in latest:
+        event['time'] = datetime.fromtimestamp(event['time']).strftime("%H:%M:%S.%f")[:-3]
+        event['ms'] = round(event.pop('seconds') * 1000, 2)
+    st.dataframe(latest, hide_index=True, use_container_width=True)
+
+
+live_timings()
+
+# Background maintenance: compaction, archiving, index rebuilds and photo cleanup
+st.subheader("Maintenance")
+scheduler = st.session_state.data_manager.scheduler()
+# Only asks who leads: taking the lock here would make this process lead for good
+leader = scheduler.leader.holder()
+# "Run now" only reaches this process's scheduler, which runs nothing unless it leads
+runs_here = False
+if os.environ.get("GSMLAB_MAINTENANCE", "1") == "0":
+    st.caption("Scheduled runs are off: GSMLAB_MAINTENANCE is set to 0.")
+elif leader is None:
+    st.caption("No server process runs the jobs yet: the first to check for due jobs takes them.")
+    runs_here = True
+elif leader != os.getpid():
+    st.caption(
+        f"Another server process (PID {leader}) on this data directory runs the jobs: "
+        "run them from its Performance page."
+    )
+else:
+    runs_here = True
+st.dataframe(scheduler.status(), hide_index=True, use_container_width=True)
+col1, col2 = st.columns([3, 1])
+with col1:
+    job = st.selectbox("Job", list(scheduler.jobs), label_visibility="collapsed")
+with col2:
+    if st.button("Run now", disabled=not runs_here):
+        scheduler.start().run_soon(job)
+        st.toast(f"{job} will run in the background")
+
+# Export, to attach to a bug report
+st.subheader("Export")
+stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+col1, col2 = st.columns(2)
+with col1:
+    st.download_button(
+        "Download CSV", data=metrics.to_csv(), file_name=f"timings_{stamp}.csv", mime="text/csv"
+    )
+with col2:
+    st.download_button(
+        "Download JSON", data=metrics.to_json(), file_name=f"timings_{stamp}.json", mime="application/json"
+    )
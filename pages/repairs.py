@@ -1,11 +1,18 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime
 import os
 
+from utils.data_manager import session_data_manager
+from utils.metrics import metrics
+from utils.repair_board import (
+    BOARD_STATUSES, PAGE_SIZES, REPAIR_CATEGORIES, STATUS_COLORS, board_columns
+)
+
 # Set page configuration for better layout
 st.set_page_config(layout="wide")
 
+session_data_manager(st.session_state)
+
 # Custom CSS for better styling
 st.markdown("""
 <style>
@@ -66,26 +73,6 @@ st.markdown("""
 
 st.title("🔧 Repair Management")
 
-# Define repair categories with colors
-REPAIR_CATEGORIES = {
-    "Screen Repair": {"color": "#FF4B4B", "icon": "📱"},
-    "Battery Replacement": {"color": "#4BB543", "icon": "🔋"},
-    "Water Damage": {"color": "#1E90FF", "icon": "💧"},
-    "Charging Port": {"color": "#FFA500", "icon": "⚡"},
-    "Speaker/Audio": {"color": "#9370DB", "icon": "🔊"},
-    "Camera Issue": {"color": "#20B2AA", "icon": "📸"},
-    "Other": {"color": "#808080", "icon": "🔨"}
-}
-
-# Status configurations
-STATUS_COLORS = {
-    "Pending": "#FFA500",
-    "In Progress": "#1E90FF",
-    "Waiting for Parts": "#FF4B4B",
-    "Ready for Pickup": "#4BB543",
-    "Completed": "#808080"
-}
-
 # Tabs for different views
 tab1, tab2 = st.tabs(["📝 New Repair", "🔄 Active Repairs"])
 
@@ -164,12 +151,9 @@ with tab1:
                 st.error("❌ Please fill all required fields!")
 
 with tab2:
-    # Get repairs data
-    repairs_df = st.session_state.data_manager.get_repairs()
-
     # Filter controls
     with st.expander("🔍 Filter Options", expanded=True):
-        col1, col2, col3 = st.columns(3)
+        col1, col2, col3, col4 = st.columns(4)
         with col1:
             category_filter = st.multiselect(
                 "Filter by Category",
@@ -177,100 +161,116 @@ with tab2:
                 default=list(REPAIR_CATEGORIES.keys())
             )
         with col2:
-            search_term = st.text_input("🔍 Search by name or device")
+            search_term = st.text_input("🔍 Search by name, device, phone or issue")
         with col3:
             sort_by = st.selectbox(
                 "Sort by",
                 ["Date (Newest)", "Date (Oldest)", "Customer Name", "Status"]
             )
-
-    # Filter and sort repairs
-    active_repairs = repairs_df[repairs_df['status'] != 'Completed'].copy()
-
-    if category_filter:
-        active_repairs = active_repairs[active_repairs['category'].isin(category_filter)]
-
-    if search_term:
-        mask = (
-            active_repairs['customer_name'].str.contains(search_term, case=False, na=False) |
-            active_repairs['device'].str.contains(search_term, case=False, na=False)
-        )
-        active_repairs = active_repairs[mask]
-
-    # Sort repairs
-    if sort_by == "Date (Newest)":
-        active_repairs = active_repairs.sort_values('date', ascending=False)
-    elif sort_by == "Date (Oldest)":
-        active_repairs = active_repairs.sort_values('date')
-    elif sort_by == "Customer Name":
-        active_repairs = active_repairs.sort_values('customer_name')
-    elif sort_by == "Status":
-        status_order = ["Pending", "In Progress", "Waiting for Parts", "Ready for Pickup"]
-        active_repairs['status_order'] = active_repairs['status'].map({s: i for i, s in enumerate(status_order)})
-        active_repairs = active_repairs.sort_values('status_order')
+        with col4:
+            page_size = st.selectbox("Tickets per column", PAGE_SIZES, index=1)
+
+    @metrics.timed("page.repairs.filter")
+    def filter_repairs():
+        # Only open tickets are needed for the board
+        active_repairs = st.session_state.data_manager.get_repairs(status=BOARD_STATUSES)
+
+        if category_filter:
+            active_repairs = active_repairs[active_repairs['category'].isin(category_filter)]
+
+        if search_term:
+            active_repairs = st.session_state.data_manager.filter_search("repairs", active_repairs, search_term)
+
+        # Sort repairs
+        if sort_by == "Date (Newest)":
+            active_repairs = active_repairs.sort_values('date', ascending=False)
+        elif sort_by == "Date (Oldest)":
+            active_repairs = active_repairs.sort_values('date')
+        elif sort_by == "Customer Name":
+            active_repairs = active_repairs.sort_values('customer_name')
+        elif sort_by == "Status":
+            status_order = {s: i for i, s in enumerate(BOARD_STATUSES)}
+            active_repairs = active_repairs.sort_values('status', key=lambda statuses: statuses.map(status_order))
+        return active_repairs
+
+    # Filtered and sorted once per filter choice and data generation, so paging
+    # through the columns doesn't reread or resort the tickets
+    active_repairs = st.session_state.data_manager.cached(
+        "repair_board", (tuple(category_filter), search_term, sort_by), filter_repairs
+    )
+
+    # Each column remembers which page it is on
+    if 'board_pages' not in st.session_state:
+        st.session_state.board_pages = {}
+    with metrics.span("page.repairs.board"):
+        columns = board_columns(active_repairs, st.session_state.board_pages, page_size)
 
     # Create Kanban board layout
     st.markdown("<div class='repair-board'>", unsafe_allow_html=True)
 
-    for status in ["Pending", "In Progress", "Waiting for Parts", "Ready for Pickup"]:
-        status_repairs = active_repairs[active_repairs['status'] == status]
-
-        st.markdown(f"""
-            <div class='status-column'>
-                <h3>
-                    {status} 
-                    <span class='status-badge' style='background-color: {STATUS_COLORS[status]};'>
-                        {len(status_repairs)}
-                    </span>
-                </h3>
-        """, unsafe_allow_html=True)
-
-        for _, repair in status_repairs.iterrows():
-            category = repair.get('category', 'Other') if pd.notna(repair.get('category')) else 'Other'
+    with metrics.span("page.repairs.render"):
+        for status in BOARD_STATUSES:
+            column = columns[status]
 
-            # Repair card
             st.markdown(f"""
-                <div class='repair-card'>
-                    <div style='display: flex; align-items: center;'>
-                        <div style='flex: 1;'>
-                            <h4>{REPAIR_CATEGORIES[category]['icon']} {repair['customer_name']}</h4>
-                            <div class='category-tag' style='background-color: {REPAIR_CATEGORIES[category]["color"]}20; color: {REPAIR_CATEGORIES[category]["color"]};'>
-                                {category}
+                <div class='status-column'>
+                    <h3>
+                        {status} 
+                        <span class='status-badge' style='background-color: {STATUS_COLORS[status]};'>
+                            {column['total']}
+                        </span>
+                    </h3>
+            """, unsafe_allow_html=True)
+
+            for repair_id, photo_path, card in zip(
+                column['repairs']['id'], column['repairs']['photo_path'], column['cards']
+            ):
+                # Repair card
+                st.markdown(card, unsafe_allow_html=True)
+
+                # Display photo if available
+                if pd.notna(photo_path):
+                    photo_data = st.session_state.data_manager.get_photo_as_base64(photo_path)
+                    if photo_data:
+                        st.markdown(f"""
+                            <div class='photo-container'>
+                                <img src="data:image/jpeg;base64,{photo_data}" alt="Customer Photo"/>
                             </div>
-                        </div>
-                    </div>
-                    <p><strong>📱 Device:</strong> {repair['device']}</p>
-                    <p><strong>📞 Phone:</strong> {repair['phone']}</p>
-                    <p><strong>💬 Issue:</strong> {repair['issue']}</p>
-                    <p><strong>💰 Cost:</strong> ${float(repair['estimated_cost']):.2f}</p>
-                """, unsafe_allow_html=True)
-
-            # Display photo if available
-            if 'photo_path' in repair and pd.notna(repair['photo_path']):
-                photo_data = st.session_state.data_manager.get_photo_as_base64(repair['photo_path'])
-                if photo_data:
-                    st.markdown(f"""
-                        <div class='photo-container'>
-                            <img src="data:image/jpeg;base64,{photo_data}" alt="Customer Photo"/>
-                        </div>
-                    """, unsafe_allow_html=True)
-
-            # Add edit button
-            if st.button("✏️ Edit", key=f"edit_{repair.name}"):
-                st.session_state.editing_repair = repair.name
+                        """, unsafe_allow_html=True)
+
+                # Add edit button
+                if st.button("✏️ Edit", key=f"edit_{repair_id}"):
+                    st.session_state.editing_repair = repair_id
+
+            # Page through long columns
+            if column['pages'] > 1:
+                prev_col, page_col, next_col = st.columns([1, 2, 1])
+                with prev_col:
+                    if st.button("◀", key=f"prev_{status}", disabled=column['page'] == 0):
+                        st.session_state.board_pages[status] = column['page'] - 1
+                        st.rerun()
+                with page_col:
+                    st.caption(f"Page {column['page'] + 1} of {column['pages']}")
+                with next_col:
+                    if st.button("▶", key=f"next_{status}", disabled=column['page'] >= column['pages'] - 1):
+                        st.session_state.board_pages[status] = column['page'] + 1
+                        st.rerun()
 
             st.markdown("</div>", unsafe_allow_html=True)
 
-        st.markdown("</div>", unsafe_allow_html=True)
-
     st.markdown("</div>", unsafe_allow_html=True)
 
     # Edit modal (show when editing_repair is set)
+    repair = None
     if hasattr(st.session_state, 'editing_repair'):
-        idx = st.session_state.editing_repair
-        repair = repairs_df.loc[idx]
-
-        with st.form(key=f"edit_form_{idx}"):
+        repair_id = st.session_state.editing_repair
+        repair = st.session_state.data_manager.get_repair(repair_id)
+        if repair is None:
+            # The ticket no longer exists
+            del st.session_state.editing_repair
+
+    if repair is not None:
+        with st.form(key=f"edit_form_{repair_id}"):
             st.subheader(f"Edit Repair - {repair['customer_name']}")
 
             col1, col2 = st.columns(2)
@@ -292,6 +292,9 @@ with tab2:
 
             updated_issue = st.text_area("Issue Description", repair['issue'])
             updated_cost = st.number_input("Cost", min_value=0.0, value=float(repair['estimated_cost']), format="%.2f")
+            # The full-size photo is only loaded when a ticket is opened for editing
+            if pd.notna(repair['photo_path']) and os.path.exists(repair['photo_path']):
+                st.image(repair['photo_path'], caption="Current Photo", width=300)
             new_photo = st.camera_input("Update Photo")
 
             col1, col2 = st.columns(2)
@@ -305,21 +308,17 @@ with tab2:
                             updated_name
                         )
 
-                    # Update repairs DataFrame
-                    repairs_df.loc[idx, 'customer_name'] = updated_name
-                    repairs_df.loc[idx, 'phone'] = updated_phone
-                    repairs_df.loc[idx, 'device'] = updated_device
-                    repairs_df.loc[idx, 'category'] = updated_category
-                    repairs_df.loc[idx, 'issue'] = updated_issue
-                    repairs_df.loc[idx, 'estimated_cost'] = updated_cost
-                    repairs_df.loc[idx, 'status'] = updated_status
-                    repairs_df.loc[idx, 'photo_path'] = photo_path
-
-                    if updated_status == "Completed" and repair['status'] != "Completed":
-                        repairs_df.loc[idx, 'completion_date'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-                    # Save changes
-                    repairs_df.to_csv(f"{st.session_state.data_manager.data_dir}/repairs.csv", index=False)
+                    # Save changes to this ticket only
+                    st.session_state.data_manager.update_repair(repair_id, {
+                        'customer_name': updated_name,
+                        'phone': updated_phone,
+                        'device': updated_device,
+                        'category': updated_category,
+                        'issue': updated_issue,
+                        'estimated_cost': updated_cost,
+                        'status': updated_status,
+                        'photo_path': photo_path
+                    })
                     del st.session_state.editing_repair
                     st.success("✅ Changes saved successfully!")
                     st.rerun()
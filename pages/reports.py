@@ -1,13 +1,14 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
 from datetime import datetime, timedelta
 
-st.title("Reports and Analytics")
+from utils.data_manager import session_data_manager
+from utils.export import EXPORT_FORMATS, export_formats
+from utils.metrics import metrics
+from utils.shops import cross_shop_report, shop_dirs, shop_of
+
+session_data_manager(st.session_state)
 
-# Get data
-sales_df = st.session_state.data_manager.get_sales()
-repairs_df = st.session_state.data_manager.get_repairs()
+st.title("Reports and Analytics")
 
 # Date range selector
 col1, col2 = st.columns(2)
@@ -16,41 +17,112 @@ with col1:
 with col2:
     end_date = st.date_input("End Date", datetime.now())
 
-# Convert dates
-sales_df['date'] = pd.to_datetime(sales_df['date'])
-repairs_df['date'] = pd.to_datetime(repairs_df['date'])
+# Head office can add every shop's figures up instead of looking at this session's shop
+shops = shop_dirs()
+all_shops = len(shops) > 1 and st.toggle(
+    "All shops", help=f"Figures of all {len(shops)} shops added up, each shop computed in parallel"
+)
+if len(shops) > 1 and not all_shops:
+    st.caption(f"Shop: {shop_of(st.session_state.data_manager, shops) or st.session_state.data_manager.data_dir}")
+
+@metrics.timed("page.reports.build")
+def build_report(report):
+    """Totals and figures from a daily report, made from rollups rather than the transactions"""
+    # Plotly is slow to import, so only sessions that open the reports pay for it
+    import plotly.express as px
+
+    daily = report['daily']
+
+    daily_sales = daily[daily['sales_count'] > 0][['date', 'sales_total']].rename(columns={'sales_total': 'price'})
+    fig_sales = px.line(
+        daily_sales,
+        x='date',
+        y='price',
+        title='Daily Sales',
+        labels={'price': 'Sales ($)', 'date': 'Date'}
+    )
+
+    status_counts = report['statuses']
+    fig_status = px.pie(
+        values=status_counts.values,
+        names=status_counts.index,
+        title='Repair Status Distribution'
+    )
+
+    daily_repairs = daily[daily['repairs_opened'] > 0][['date', 'repairs_opened']]
+    daily_repairs.columns = ['date', 'count']
+    fig_repairs = px.bar(
+        daily_repairs,
+        x='date',
+        y='count',
+        title='Daily New Repair Jobs',
+        labels={'count': 'Number of Repairs', 'date': 'Date'}
+    )
+
+    payment_counts = report['payment_methods']
+    fig_payment = px.pie(
+        values=payment_counts.values,
+        names=payment_counts.index,
+        title='Payment Method Distribution'
+    )
+
+    return {
+        'total_sales': daily['sales_total'].sum(),
+        'number_of_sales': int(daily['sales_count'].sum()),
+        'fig_sales': fig_sales,
+        'fig_status': fig_status,
+        'fig_repairs': fig_repairs,
+        'fig_payment': fig_payment,
+        'shops': report.get('shops'),
+        'errors': report.get('errors', {}),
+    }
 
-# Filter data by date range
-sales_df = sales_df[
-    (sales_df['date'].dt.date >= start_date) &
-    (sales_df['date'].dt.date <= end_date)
-]
-repairs_df = repairs_df[
-    (repairs_df['date'].dt.date >= start_date) &
-    (repairs_df['date'].dt.date <= end_date)
-]
+
+# Built once per range and data generation, so reruns from other widgets reuse it.
+# Writes to the other shops don't bump this shop's generation: the cache's ttl
+# bounds how long the all-shops figures miss them
+if all_shops:
+    report = st.session_state.data_manager.cached(
+        "reports.all_shops", (start_date, end_date, tuple(shops.items())),
+        lambda: build_report(cross_shop_report(shops, start_date, end_date)),
+    )
+else:
+    report = st.session_state.data_manager.cached(
+        "reports", (start_date, end_date),
+        lambda: build_report(st.session_state.data_manager.get_daily_report(start_date, end_date)),
+    )
+for shop, error in report['errors'].items():
+    st.warning(f"{shop} is left out of these figures: {error}")
+total_sales = report['total_sales']
+number_of_sales = report['number_of_sales']
 
 # Sales Overview
 st.header("Sales Overview")
 col1, col2, col3 = st.columns(3)
 
 with col1:
-    st.metric("Total Sales", f"${sales_df['price'].sum():.2f}")
+    st.metric("Total Sales", f"${total_sales:.2f}")
 with col2:
-    st.metric("Average Sale", f"${sales_df['price'].mean():.2f}")
+    st.metric("Average Sale", f"${total_sales / number_of_sales if number_of_sales else 0:.2f}")
 with col3:
-    st.metric("Number of Sales", len(sales_df))
+    st.metric("Number of Sales", number_of_sales)
 
 # Daily Sales Chart
-daily_sales = sales_df.groupby(sales_df['date'].dt.date)['price'].sum().reset_index()
-fig_sales = px.line(
-    daily_sales,
-    x='date',
-    y='price',
-    title='Daily Sales',
-    labels={'price': 'Sales ($)', 'date': 'Date'}
-)
-st.plotly_chart(fig_sales, use_container_width=True)
+st.plotly_chart(report['fig_sales'], use_container_width=True)
+
+if all_shops:
+    st.header("Shops")
+    st.dataframe(
+        report['shops'],
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            "sales_total": st.column_config.NumberColumn("Sales ($)", format="%.2f"),
+            "sales_count": st.column_config.NumberColumn("Number of Sales"),
+            "repairs_opened": st.column_config.NumberColumn("Repairs Opened"),
+            "repairs_completed": st.column_config.NumberColumn("Repairs Completed"),
+        },
+    )
 
 # Repair Jobs Overview
 st.header("Repair Jobs Overview")
@@ -58,57 +130,47 @@ col1, col2 = st.columns(2)
 
 with col1:
     # Repair Status Distribution
-    status_counts = repairs_df['status'].value_counts()
-    fig_status = px.pie(
-        values=status_counts.values,
-        names=status_counts.index,
-        title='Repair Status Distribution'
-    )
-    st.plotly_chart(fig_status, use_container_width=True)
+    st.plotly_chart(report['fig_status'], use_container_width=True)
 
 with col2:
     # Daily New Repairs
-    daily_repairs = repairs_df.groupby(repairs_df['date'].dt.date).size().reset_index()
-    daily_repairs.columns = ['date', 'count']
-    fig_repairs = px.bar(
-        daily_repairs,
-        x='date',
-        y='count',
-        title='Daily New Repair Jobs',
-        labels={'count': 'Number of Repairs', 'date': 'Date'}
-    )
-    st.plotly_chart(fig_repairs, use_container_width=True)
+    st.plotly_chart(report['fig_repairs'], use_container_width=True)
 
 # Payment Method Analysis
 st.header("Payment Method Analysis")
-payment_counts = sales_df['payment_method'].value_counts()
-fig_payment = px.pie(
-    values=payment_counts.values,
-    names=payment_counts.index,
-    title='Payment Method Distribution'
-)
-st.plotly_chart(fig_payment, use_container_width=True)
+st.plotly_chart(report['fig_payment'], use_container_width=True)
 
 # Export Data
 st.header("Export Reports")
+if all_shops:
+    st.caption("Exports hold the data of this session's shop only.")
+export_format = st.radio("Format", export_formats(), horizontal=True, format_func=lambda name: f".{name}")
+extension, mime = EXPORT_FORMATS[export_format]
+stamp = datetime.now().strftime('%Y%m%d')
+data_manager = st.session_state.data_manager
+
+
+def export_of(table):
+    # Streamed to a file only when the button is clicked, on a thread of its own
+    return lambda: data_manager.export(table, start_date, end_date, export_format)
+
+
 col1, col2 = st.columns(2)
 
 with col1:
-    if st.button("Export Sales Data"):
-        csv = sales_df.to_csv(index=False)
-        st.download_button(
-            label="Download Sales CSV",
-            data=csv,
-            file_name=f"sales_report_{datetime.now().strftime('%Y%m%d')}.csv",
-            mime="text/csv"
-        )
+    st.download_button(
+        label="Export Sales Data",
+        data=export_of("sales"),
+        file_name=f"sales_report_{stamp}.{extension}",
+        mime=mime,
+        on_click="ignore"
+    )
 
 with col2:
-    if st.button("Export Repair Data"):
-        csv = repairs_df.to_csv(index=False)
-        st.download_button(
-            label="Download Repairs CSV",
-            data=csv,
-            file_name=f"repairs_report_{datetime.now().strftime('%Y%m%d')}.csv",
-            mime="text/csv"
-        )
+    st.download_button(
+        label="Export Repair Data",
+        data=export_of("repairs"),
+        file_name=f"repairs_report_{stamp}.{extension}",
+        mime=mime,
+        on_click="ignore"
+    )
@@ -1,6 +1,9 @@
 import streamlit as st
-import pandas as pd
-from datetime import datetime
+
+from utils.data_manager import session_data_manager
+from utils.metrics import metrics
+
+session_data_manager(st.session_state)
 
 st.title("Sales Management")
 
@@ -27,8 +30,11 @@ with tab1:
                     'price': price,
                     'payment_method': payment_method
                 }
+                in_stock = st.session_state.data_manager.in_stock(item)
                 st.session_state.data_manager.add_sale(sale_data)
                 st.success("Sale recorded successfully!")
+                if not in_stock:
+                    st.warning(f"**{item}** was out of stock; its quantity stays at 0. Check the inventory count.")
             else:
                 st.error("Please fill all required fields!")
 
@@ -36,21 +42,36 @@ with tab2:
     st.header("Sales History")
     
     # Filters
-    col1, col2 = st.columns(2)
+    col1, col2, col3 = st.columns(3)
     with col1:
         date_filter = st.date_input("Filter by Date")
     with col2:
         payment_filter = st.multiselect("Payment Method", ["Cash", "Card", "Mobile Payment"])
+    with col3:
+        search_term = st.text_input("🔍 Search by customer, phone or item")
     
-    sales_df = st.session_state.data_manager.get_sales()
+    @metrics.timed("page.sales.filter")
+    def filter_sales():
+        # The date filter is a range query, so it works on text and typed dates alike
+        if date_filter:
+            sales_df = st.session_state.data_manager.get_sales(date_filter, date_filter)
+        else:
+            sales_df = st.session_state.data_manager.get_sales()
+        
+        # Apply filters
+        if search_term:
+            sales_df = st.session_state.data_manager.filter_search("sales", sales_df, search_term)
+        if payment_filter:
+            sales_df = sales_df[sales_df['payment_method'].isin(payment_filter)]
+        return sales_df
     
-    # Apply filters
-    if date_filter:
-        sales_df = sales_df[sales_df['date'].str.contains(date_filter.strftime('%Y-%m-%d'))]
-    if payment_filter:
-        sales_df = sales_df[sales_df['payment_method'].isin(payment_filter)]
+    # Reused until a sale is recorded, so switching tabs or widgets doesn't reread the table
+    sales_df = st.session_state.data_manager.cached(
+        "sales_history", (date_filter, tuple(payment_filter), search_term), filter_sales
+    )
     
-    st.dataframe(sales_df)
+    with metrics.span("page.sales.table"):
+        st.dataframe(sales_df)
     
     # Summary statistics
     st.subheader("Summary")
@@ -0,0 +1,240 @@
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+
+def enable_copy_on_write():
+    """Make the shallow copies the caches hand out copy-on-write, on pandas 2
+
+    Cached frames are shared by every session, so a page converting a column
+    in place must only ever change its own copy. pandas 3 always copies on
+    write and deprecates the option; pandas 2 writes through a shallow copy
+    unless it is turned on, for the whole process.
+    """
+    if int(pd.__version__.split(".")[0]) < 3:
+        pd.set_option("mode.copy_on_write", True)
+
+
+class FrameCache:
+    """Process-wide cache of loaded tables, shared by all DataManager instances
+
+    Each entry is stored with the version token it was loaded at. A reader passes
+    the current token and gets the cached frame back if it still matches, so a
+    token must change whenever the underlying data does (file stat, database
+    counter, and the write generation bumped by DataManager's own writers).
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._generations = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def generation(self, key):
+        return self._generations.get(key, 0)
+
+    def bump(self, key):
+        """Record a write so the next read of `key` sees a new token"""
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+    def lookup(self, key, token, loader):
+        """Return (view of the frame, extra) for `key`, calling loader(previous) on a miss
+
+        `previous` is the stale (token, frame, extra) entry or None, so loaders
+        can refresh incrementally. A loader returns (frame, extra), where extra
+        is anything derived from the frame that should be cached alongside it.
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != token:
+            # One session parses the file while the others wait for its result
+            with self._key_lock(key):
+                entry = self._entries.get(key)
+                if entry is None or entry[0] != token:
+                    frame, extra = loader(entry)
+                    entry = (token, frame, extra)
+                    self._entries[key] = entry
+        return entry[1].copy(deep=False), entry[2]
+
+    def get(self, key, token, loader):
+        """Return a view of the frame for `key`, loading it on a miss"""
+        return self.lookup(key, token, loader)[0]
+
+    def put(self, key, token, frame, extra=None):
+        """Cache a frame known to be the data at `token`, such as one just written"""
+        with self._key_lock(key):
+            self._entries[key] = (token, frame, extra)
+
+    def peek(self, key, token):
+        """Return a view of the frame for `key` if it is cached at `token`, else None"""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != token:
+            return None
+        return entry[1].copy(deep=False)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+# The one cache every session in this Streamlit process shares
+frames = FrameCache()
+
+
+class DerivedCache:
+    """Process-wide structures derived from tables, such as search indexes
+
+    An entry is stored with the versions of the tables it was built from. It is
+    rebuilt when those versions change behind its back (another process wrote),
+    and DataManager's own writers keep it current by applying each change
+    incrementally through `update`.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, threading.RLock())
+
+    def get(self, key, versions, build):
+        """Return the structure for `key`, building it if the tables moved on
+
+        `versions` returns the current versions of the tables it is built
+        from. They are read again once it is built: a write committed
+        meanwhile may or may not be in it, and applying that write to it
+        again would count it twice, so it is returned but not kept.
+        """
+        with self._key_lock(key):
+            current = versions()
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == current:
+                return entry[1]
+            value = build()
+            if versions() == current:
+                self._entries[key] = (current, value)
+            else:
+                self._entries.pop(key, None)
+            return value
+
+    def replace(self, key, versions, build):
+        """Build the structure for `key` afresh and swap it in, returning it
+
+        Readers keep the old one while it is built. If a write was committed
+        meanwhile, the new one is dropped as `get` drops it, and so is the old
+        one if the write was applied to it.
+        """
+        current = versions()
+        value = build()
+        with self._key_lock(key):
+            entry = self._entries.get(key)
+            if versions() == current and (entry is None or entry[0] == current):
+                self._entries[key] = (current, value)
+        return value
+
+    def update(self, key, before, after, apply):
+        """Apply one write to the structure if it was current before the write"""
+        with self._key_lock(key):
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            if entry[0] != before:
+                # Missed someone else's write: leave it to be rebuilt on next use
+                del self._entries[key]
+                return
+            apply(entry[1])
+            self._entries[key] = (after, entry[1])
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+# Indexes and aggregates shared by every session in this process
+derived = DerivedCache()
+
+
+class RenderCache:
+    """Process-wide memo of what pages compute from the tables: filtered frames, totals, figures
+
+    Results are keyed on the page's parameters plus a generation counter of the
+    data directory, which DataManager bumps on every write, so a rerun caused
+    only by a widget reuses them without touching the disk. Writes made by
+    other processes don't bump it; `ttl` bounds how long those go unseen.
+    The least recently used entries are dropped beyond `max_entries`.
+    """
+
+    def __init__(self, max_entries=256, ttl=60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def generation(self, scope):
+        return self._generations.get(scope, 0)
+
+    def bump(self, scope):
+        """Record a write so results computed before it are no longer used"""
+        with self._lock:
+            self._generations[scope] = self._generations.get(scope, 0) + 1
+
+    def get(self, scope, key, compute, ttl=None):
+        """Return compute() for `key`, reusing it while the generation and ttl allow"""
+        full_key = (scope, self.generation(scope), key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(full_key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(full_key)
+                return self._view(entry[1])
+
+        value = compute()
+        with self._lock:
+            self._entries[full_key] = (now + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(full_key)
+            self._evict(now)
+        return self._view(value)
+
+    def _evict(self, now):
+        # Entries of an older generation can never be hit again
+        stale = [
+            key for key, (expires, _) in self._entries.items()
+            if expires <= now or key[1] != self._generations.get(key[0], 0)
+        ]
+        for key in stale:
+            del self._entries[key]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    @staticmethod
+    def _view(value):
+        # Like frames, hand out views so a page changing its result doesn't change the cache
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            return value.copy(deep=False)
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Results of page computations shared by every session in this process
+renders = RenderCache()
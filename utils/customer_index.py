@@ -0,0 +1,135 @@
+import re
+import threading
+
+import pandas as pd
+
+from utils.search import SortedKeys
+
+
+def normalize_phone(phone):
+    """Digits of a phone number as text, keeping leading zeros"""
+    if phone is None or (not isinstance(phone, str) and pd.isna(phone)):
+        return ""
+    if isinstance(phone, float) and phone.is_integer():
+        phone = int(phone)
+    return re.sub(r"\D", "", str(phone))
+
+
+def normalize_name(name):
+    if name is None or (not isinstance(name, str) and pd.isna(name)):
+        return ""
+    return " ".join(str(name).lower().split())
+
+
+def customer_key(name, phone):
+    return (normalize_phone(phone), normalize_name(name))
+
+
+class CustomerIndex:
+    """Every customer seen in sales or repairs, with their rows and totals
+
+    Customers are identified by normalized phone and name. Each one keeps the
+    IDs of its repairs and sales plus precomputed aggregates, and can be found
+    by the prefix of any word of the name or by the start or end of the phone
+    number, without scanning the transaction tables.
+    """
+
+    def __init__(self):
+        self.customers = {}
+        self._names = SortedKeys()
+        self._phones = SortedKeys()
+        # Reversed phone numbers, so "last four digits" searches are prefix lookups
+        self._phone_suffixes = SortedKeys()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, sales_df, repairs_df):
+        index = cls()
+        for table, df in (("sales", sales_df), ("repairs", repairs_df)):
+            for record in df[[c for c in ('id', 'date', 'customer_name', 'phone', 'price') if c in df]].to_dict("records"):
+                index._add(table, record)
+        return index
+
+    def _customer(self, name, phone):
+        key = customer_key(name, phone)
+        customer = self.customers.get(key)
+        if customer is None:
+            customer = self.customers[key] = {
+                'customer_name': name,
+                'phone': normalize_phone(phone),
+                'repair_ids': [],
+                'sale_ids': [],
+                'total_spent': 0.0,
+                'last_visit': None,
+            }
+            for token in key[1].split():
+                self._names.add(token, key)
+            self._phones.add(key[0], key)
+            self._phone_suffixes.add(key[0][::-1], key)
+        return customer
+
+    def _add(self, table, record):
+        customer = self._customer(record.get('customer_name'), record.get('phone'))
+        if table == "sales":
+            customer['sale_ids'].append(record.get('id'))
+            price = pd.to_numeric(record.get('price'), errors="coerce")
+            customer['total_spent'] += 0.0 if pd.isna(price) else float(price)
+        else:
+            customer['repair_ids'].append(record.get('id'))
+        date = record.get('date')
+        if date is not None and not pd.isna(date):
+            date = str(date)
+            if customer['last_visit'] is None or date > customer['last_visit']:
+                customer['last_visit'] = date
+                customer['customer_name'] = record.get('customer_name')
+
+    def add_sale(self, sale):
+        with self._lock:
+            self._add("sales", sale)
+
+    def add_repair(self, repair):
+        with self._lock:
+            self._add("repairs", repair)
+
+    def move_repair(self, old_repair, new_repair):
+        """Re-file a repair whose customer name or phone was edited"""
+        old_key = customer_key(old_repair.get('customer_name'), old_repair.get('phone'))
+        with self._lock:
+            customer = self.customers.get(old_key)
+            if customer and new_repair.get('id') in customer['repair_ids']:
+                customer['repair_ids'].remove(new_repair.get('id'))
+                if not customer['repair_ids'] and not customer['sale_ids']:
+                    self._remove(old_key)
+            self._add("repairs", new_repair)
+
+    def _remove(self, key):
+        del self.customers[key]
+        for token in key[1].split():
+            self._names.discard(token, key)
+        self._phones.discard(key[0], key)
+        self._phone_suffixes.discard(key[0][::-1], key)
+
+    def search(self, term, limit=None):
+        """Customers whose name words start with every word of `term`, or whose
+        phone starts or ends with its digits; most recent visitors first"""
+        words = normalize_name(term).split()
+        digits = normalize_phone(term)
+        with self._lock:
+            matches = set()
+            if words:
+                matches = set.intersection(*(self._names.with_prefix(word) for word in words))
+            if digits:
+                matches |= self._phones.with_prefix(digits) | self._phone_suffixes.with_prefix(digits[::-1])
+            found = [self.customers[key] for key in matches if key in self.customers]
+
+        found.sort(key=lambda customer: customer['last_visit'] or "", reverse=True)
+        return [
+            dict(
+                customer,
+                repair_ids=list(customer['repair_ids']),
+                sale_ids=list(customer['sale_ids']),
+                total_repairs=len(customer['repair_ids']),
+                total_sales=len(customer['sale_ids']),
+            )
+            for customer in found[:limit]
+        ]
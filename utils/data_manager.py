@@ -1,13 +1,204 @@
-import pandas as pd
+import atexit
 import os
-from datetime import datetime
-import base64
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timedelta
+from functools import partial
+from itertools import chain
+
+import pandas as pd
+
+from utils.cache import derived, enable_copy_on_write, renders
+from utils.customer_index import CustomerIndex
+from utils.export import export_rows
+from utils.locks import file_lock
+from utils.metrics import metrics
+from utils.search import SEARCH_FIELDS, TextIndex, filter_by_search
+from utils.photos import make_thumbnail, photo_cache, remove_unreferenced, start_thumbnail_backfill, thumbnail_path
+from utils.rollups import DailyRollup
+from utils.scheduler import Job, Scheduler
+from utils.stock import LowStockTracker
+from utils.storage import (
+    GENERATED_KEYS, KEYS, REPAIRS_ARCHIVE, TABLES, concat_rows, filter_frame, new_id, open_storage, project,
+    sync_written,
+)
+
+# Tables each shared index or aggregate is built from
+DERIVED_TABLES = {
+    "customers": ("sales", "repairs", REPAIRS_ARCHIVE),
+    "sales_search": ("sales",),
+    "repairs_search": ("repairs",),
+    "repairs_archive_search": (REPAIRS_ARCHIVE,),
+    "daily": ("sales", "repairs", REPAIRS_ARCHIVE),
+    "low_stock": ("inventory",),
+}
+
+# Status of a closed repair ticket
+COMPLETED = "Completed"
+# Repairs are kept in two tables, oldest first: the archive of completed
+# tickets, only ever appended to, and the open tickets the board shows
+REPAIR_PARTS = (REPAIRS_ARCHIVE, "repairs")
+
+# Low stock listeners of each storage, called when an item crosses its threshold
+_low_stock_listeners = {}
+
+# Saved copy of the daily rollup, reused by the next process if the tables haven't changed
+ROLLUP_FILE = "daily_totals.json"
+
+# Serialises this process's writes so shared indexes see them one at a time
+_write_lock = threading.RLock()
+
+# Writes waiting to be committed, per storage, by whichever thread holds the write lock
+_queues = {}
+_queues_lock = threading.Lock()
+
+# Lock file in the data directory that writers in every process take
+LOCK_FILE = ".write.lock"
+
+# In asynchronous mode, new sales and repairs are committed by a background
+# writer once this many are queued, or this often, whichever comes first
+ASYNC_BATCH_ROWS = 500
+ASYNC_FLUSH_SECONDS = 0.2
+
+# Background writer of each storage in asynchronous mode
+_writers = {}
+
+# Maintenance scheduler of each storage
+_schedulers = {}
+
+# Maintenance runs daily at this hour, server time, when the shop is closed;
+# $GSMLAB_MAINTENANCE_HOUR overrides it and $GSMLAB_MAINTENANCE=0 turns it off
+MAINTENANCE_HOUR = 3
+# Sales and repairs older than this many days are archived ($GSMLAB_ARCHIVE_DAYS)
+ARCHIVE_AFTER_DAYS = 90
+# Photos saved this recently are kept even if no repair points at them yet
+PHOTO_GRACE_SECONDS = 24 * 3600
+
+
+def concat_parts(pieces):
+    """Stack the rows read from each table a table is kept in"""
+    rows = concat_rows(pieces)
+    return rows if rows is not None else pieces[0]
+
+
+def to_time(values):
+    """Dates as timestamps, whether a backend loaded them as text or not"""
+    return pd.to_datetime(values, errors="coerce", format="ISO8601")
+
+
+class QueuedRecords:
+    """Records still waiting to be committed, added to what a read finds in storage
+
+    Taken before reading, so none can slip between the two. A record
+    committed since it was taken is in the rows read already: `seen` is given
+    every frame read from storage and `frame` leaves those records out.
+    """
+
+    def __init__(self, records, key):
+        self.records = records
+        self.key = key
+        self._pending = {record[key] for record in records}
+
+    def __bool__(self):
+        return bool(self.records)
+
+    def seen(self, df):
+        """Note rows read from storage, returning them"""
+        if self._pending:
+            self._pending.difference_update(df[self.key][df[self.key].isin(self._pending)])
+        return df
+
+    def frame(self):
+        """The records that weren't among the rows read"""
+        return pd.DataFrame([record for record in self.records if record[self.key] in self._pending])
+
+
+class BackgroundWriter:
+    """Thread committing the write queue of one storage on a size or time threshold"""
+
+    def __init__(self, data_manager):
+        self.data_manager = data_manager
+        self.error = None
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="gsmlab-writer", daemon=True)
+        self._thread.start()
+        # Don't lose queued records when the server shuts down
+        atexit.register(self.data_manager.commit_queued)
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(ASYNC_FLUSH_SECONDS)
+            self._wake.clear()
+            try:
+                batch = self.data_manager.commit_queued()
+            except Exception as error:
+                self.error = error
+                continue
+            for pending in batch:
+                if pending['error'] is not None:
+                    self.error = pending['error']
+
+
+# The DataManager of each data directory and backend, shared by every session
+_instances = {}
+_instances_lock = threading.Lock()
+# Data directories whose caches this process has started warming up
+_warmed_up = set()
+
+
+def get_data_manager(data_dir=None, backend=None):
+    """The DataManager of this process, created on first use
 
+    Sessions share it instead of each creating their own, so the data files
+    are checked once per server rather than once per browser tab.
+    """
+    data_dir = data_dir or os.environ.get("GSMLAB_DATA_DIR", "data")
+    key = (os.path.abspath(data_dir), backend or os.environ.get("GSMLAB_BACKEND"))
+    with _instances_lock:
+        if key not in _instances:
+            _instances[key] = DataManager(data_dir, backend)
+        return _instances[key]
+
+
+def session_data_manager(session_state):
+    """The DataManager of a Streamlit session, for the pages to start with
+
+    A tab reopened on a page after a server restart starts its session
+    there rather than in main.py, so it is set up and warmed up here.
+    """
+    if 'data_manager' not in session_state:
+        session_state.data_manager = get_data_manager()
+        session_state.data_manager.start_warm_up()
+    return session_state.data_manager
+
+
+@metrics.instrument("data_manager")
 class DataManager:
-    def __init__(self):
-        self.data_dir = "data"
+    def __init__(self, data_dir=None, backend=None, async_writes=None, migrate=True):
+        """Open a data directory, creating and upgrading its tables unless `migrate` is False
+
+        Without migrating the tables are read as they are, for a process that
+        only reports on a data directory another server looks after: nothing
+        is written to it, not even the saved copy of the daily rollup.
+        """
+        # Before any table is cached: every process reading data starts here
+        enable_copy_on_write()
+        self.data_dir = data_dir or os.environ.get("GSMLAB_DATA_DIR", "data")
+        if async_writes is None:
+            async_writes = os.environ.get("GSMLAB_ASYNC_WRITES") == "1"
+        self.async_writes = async_writes
+        self.migrate = migrate
         self.photos_dir = os.path.join(self.data_dir, "customer_photos")
-        self.ensure_data_files()
+        if migrate:
+            self.ensure_data_files()
+        self.storage = open_storage(self.data_dir, backend)
+        if migrate:
+            self.ensure_tables()
 
     def ensure_data_files(self):
         """Create data files and directories if they don't exist"""
@@ -17,24 +208,77 @@ class DataManager:
         if not os.path.exists(self.photos_dir):
             os.makedirs(self.photos_dir)
 
-        # Create sales.csv if it doesn't exist
-        if not os.path.exists(f"{self.data_dir}/sales.csv"):
-            pd.DataFrame(columns=[
-                'date', 'customer_name', 'phone', 'item', 'price', 'payment_method'
-            ]).to_csv(f"{self.data_dir}/sales.csv", index=False)
-
-        # Create repairs.csv if it doesn't exist
-        if not os.path.exists(f"{self.data_dir}/repairs.csv"):
-            pd.DataFrame(columns=[
-                'date', 'customer_name', 'phone', 'device', 'category', 'issue', 'status',
-                'estimated_cost', 'completion_date', 'photo_path'
-            ]).to_csv(f"{self.data_dir}/repairs.csv", index=False)
-
-        # Create inventory.csv if it doesn't exist
-        if not os.path.exists(f"{self.data_dir}/inventory.csv"):
-            pd.DataFrame(columns=[
-                'item_name', 'quantity', 'price', 'threshold'
-            ]).to_csv(f"{self.data_dir}/inventory.csv", index=False)
+    def ensure_tables(self):
+        """Create the sales, repairs and inventory tables if they don't exist"""
+        for table, columns in TABLES.items():
+            self.storage.ensure_table(table, columns)
+        self.split_repairs()
+
+    def split_repairs(self):
+        """Move completed tickets from the open repairs to the archive, returning how many moved
+
+        Data from before the split has every ticket in "repairs"; after that
+        this only finds a ticket left behind by a crash in the middle of
+        moving it. The archive is written in order of completion, as it is
+        when tickets close one at a time.
+        """
+        if self.storage.read("repairs", where={'status': COMPLETED}, columns=['id']).empty:
+            return 0
+        moved = {}
+
+        def move():
+            repairs = self.storage.read("repairs")
+            done = repairs['status'] == COMPLETED
+            completed = repairs[done]
+            # A ticket a crash left in both tables is in the archive already
+            archived = self.storage.get_rows(REPAIRS_ARCHIVE, completed['id'].tolist())
+            completed = completed[~completed['id'].isin(archived['id'])]
+            closed = to_time(completed['completion_date']).fillna(to_time(completed['date']))
+            completed = completed.loc[closed.sort_values(kind="stable", na_position="first").index]
+            if len(completed):
+                # Archived first, so a crash before the rewrite below loses nothing
+                archive = self.storage.read(REPAIRS_ARCHIVE)
+                self.storage.write(REPAIRS_ARCHIVE, concat_parts([archive, completed]))
+            self.storage.write("repairs", repairs[~done])
+            moved['rows'] = int(done.sum())
+
+        # Rows move without changing, so only the search indexes of the two tables are rebuilt
+        unchanged = {name: lambda index: None for name in ("customers", "daily")}
+        self.write(["repairs", REPAIRS_ARCHIVE], move, unchanged)
+        return moved['rows']
+
+    def start_warm_up(self):
+        """Run warm_up in a background thread, once per process and data directory"""
+        with _instances_lock:
+            if self.storage.identity in _warmed_up:
+                return
+            _warmed_up.add(self.storage.identity)
+        threading.Thread(target=self.warm_up, name="gsmlab-warm-up", daemon=True).start()
+        if os.environ.get("GSMLAB_MAINTENANCE", "1") != "0":
+            self.scheduler().start()
+
+    def warm_up(self):
+        """Load the tables and build the shared indexes before the first page asks for them
+
+        The dashboard only needs the rollup and stock tracker, so those come
+        first; parsing whole tables for the search indexes follows.
+        """
+        steps = [self.daily_rollup, self.low_stock_tracker]
+        if hasattr(self.storage, "backfill_keys"):
+            # Rows added by hand without an ID; finding them means reading each table in full
+            steps += [partial(self.write, [table], partial(self.storage.backfill_keys, table)) for table in GENERATED_KEYS]
+        steps += [
+            partial(self.search_index, "sales"),
+            partial(self.search_index, "repairs"),
+            self.customer_index,
+            partial(start_thumbnail_backfill, self.photos_dir),
+        ]
+        for step in steps:
+            try:
+                step()
+            except Exception:
+                # Whatever failed is built again by the first page that needs it
+                traceback.print_exc()
 
     def save_customer_photo(self, photo_bytes, customer_name):
         """Save customer photo and return the file path"""
@@ -46,46 +290,673 @@ class DataManager:
         with open(filepath, "wb") as f:
             f.write(photo_bytes)
 
+        try:
+            make_thumbnail(filepath)
+        except OSError:
+            pass  # Not a readable image; the full photo is shown instead
+
         return filepath
 
-    def get_photo_as_base64(self, photo_path):
-        """Convert photo to base64 for display"""
-        if photo_path and os.path.exists(photo_path):
-            with open(photo_path, "rb") as f:
-                return base64.b64encode(f.read()).decode()
-        return None
+    def get_photo_as_base64(self, photo_path, thumbnail=True):
+        """Convert photo (or by default its thumbnail) to base64 for display"""
+        if not photo_path or not os.path.exists(photo_path):
+            return None
+        if thumbnail:
+            small_path = thumbnail_path(photo_path)
+            if not os.path.exists(small_path):
+                try:
+                    make_thumbnail(photo_path)
+                except OSError:
+                    small_path = photo_path
+            photo_path = small_path
+        return photo_cache.get(photo_path)
+
+    def derived_key(self, name):
+        return (self.storage.identity, name)
+
+    def derived(self, name, build, rebuild=False):
+        """Return a shared index, building it from its tables on first use
+
+        With `rebuild` it is built again from scratch, while readers keep using
+        the current one.
+        """
+        def versions():
+            return tuple(self.storage.version(table) for table in DERIVED_TABLES[name])
+
+        if rebuild:
+            return derived.replace(self.derived_key(name), versions, build)
+        return derived.get(self.derived_key(name), versions, build)
+
+    def generation(self):
+        """Counter bumped by every write to this data directory from this process"""
+        return renders.generation(self.storage.identity)
+
+    def cached(self, name, params, compute, ttl=None):
+        """Return compute(), reused until the data is written or `ttl` seconds pass
+
+        For results pages derive from the tables (filtered frames, totals,
+        figures): `name` and the hashable `params` identify the result, so a
+        rerun with the same widget values reads nothing from disk.
+        """
+        return renders.get(self.storage.identity, (name, params), compute, ttl)
+
+    def queue(self):
+        """Writes of this storage waiting to be committed, oldest first"""
+        with _queues_lock:
+            return _queues.setdefault(self.storage.identity, deque())
+
+    def write(self, tables, write, changes=None, appended=None):
+        """Run a write under the data directory's lock and apply it to the shared indexes
+
+        `changes` maps index names to a function applying this write to that
+        index; an index built from a written table without one is rebuilt.
+
+        Writes that arrive while another is being committed queue up, and the
+        next thread to get the write lock commits all of them as one batch:
+        one cross-process file lock, one fsync per file appended to and one
+        pass over the indexes.
+
+        `appended` is the (table, record) a write adds. In asynchronous mode
+        such writes return as soon as they are queued and a background writer
+        commits them; reads see them in the meantime.
+        """
+        pending = {
+            'tables': tables, 'write': write, 'changes': changes or {}, 'appended': appended,
+            'done': False, 'error': None, 'result': None,
+        }
+        queue = self.queue()
+        queue.append(pending)
+        # Queued records are visible to reads, so cached results are stale already
+        renders.bump(self.storage.identity)
+        if appended is not None and self.async_writes:
+            writer = self.background_writer()
+            if len(queue) >= ASYNC_BATCH_ROWS:
+                writer.wake()
+            return None
+
+        # Everything queued before this write is committed with it, in order
+        self.commit_queued()
+        if pending['error'] is not None:
+            raise pending['error']
+        return pending['result']
+
+    def background_writer(self):
+        with _queues_lock:
+            if self.storage.identity not in _writers:
+                _writers[self.storage.identity] = BackgroundWriter(self)
+            return _writers[self.storage.identity]
+
+    def commit_queued(self):
+        """Commit every queued write now and return them"""
+        queue = self.queue()
+        with _write_lock:
+            # Entries stay queued until committed, so reads keep seeing their records
+            batch = [pending for pending in list(queue) if not pending['done']]
+            if batch:
+                try:
+                    self._commit(batch)
+                finally:
+                    # Results computed while the batch was being written may have missed it
+                    renders.bump(self.storage.identity)
+            while queue and queue[0]['done']:
+                queue.popleft()
+        return batch
+
+    def flush(self):
+        """Commit and fsync everything written so far, raising any background write error"""
+        self.commit_queued()
+        writer = _writers.get(self.storage.identity)
+        if writer is not None and writer.error is not None:
+            error, writer.error = writer.error, None
+            raise error
+
+    def queued_records(self, table):
+        """Records added to a table that are still waiting in the write queue"""
+        return [
+            pending['appended'][1] for pending in list(self.queue())
+            if pending['appended'] is not None and pending['appended'][0] == table and not pending['done']
+        ]
+
+    def queued(self, tables):
+        """The queued records of one table's parts, taken to add to a read of them
+
+        There are none unless writes are asynchronous.
+        """
+        records = [record for table in tables for record in self.queued_records(table)] if self.async_writes else []
+        return QueuedRecords(records, KEYS[tables[0]])
+
+    def parts(self, table, statuses=None):
+        """The tables a table's rows are kept in, oldest first
+
+        Repairs are split between the open tickets and the archive of
+        completed ones. Asking only for open `statuses` leaves the archive
+        unread, so the board costs the same however many tickets were closed.
+        """
+        if table != "repairs":
+            return [table]
+        if statuses is not None:
+            statuses = set(statuses) if pd.api.types.is_list_like(statuses) else {statuses}
+            if COMPLETED not in statuses:
+                return ["repairs"]
+            if statuses == {COMPLETED}:
+                return [REPAIRS_ARCHIVE]
+        return list(REPAIR_PARTS)
 
-    def get_sales(self):
-        return pd.read_csv(f"{self.data_dir}/sales.csv")
+    def part_of(self, repair):
+        """The table a repair ticket belongs in, going by its status"""
+        return REPAIRS_ARCHIVE if repair.get('status') == COMPLETED else "repairs"
+
+    def read(self, table, start=None, end=None, where=None, columns=None):
+        """Read a table, including records still waiting to be committed"""
+        parts = self.parts(table, (where or {}).get('status'))
+        return concat_parts([self._read(part, start, end, where, columns) for part in parts])
+
+    def committed(self, table):
+        """Read a whole table without the records still waiting to be committed
+
+        What shared indexes are built from: committing a record applies it to
+        them, which would count it twice if it were in already.
+        """
+        return concat_parts([self.storage.read(part) for part in self.parts(table)])
+
+    def _read(self, table, start=None, end=None, where=None, columns=None):
+        queued = self.queued([table])
+        if not queued:
+            return self.storage.read(table, start, end, where, columns)
+
+        key = KEYS[table]
+        needed = None if columns is None else list(dict.fromkeys([*columns, key]))
+        df = queued.seen(self.storage.read(table, start, end, where, needed))
+        rows = queued.frame()
+        if len(rows):
+            df = concat_parts([df, filter_frame(rows, start, end, where)])
+        return project(df, columns)
+
+    def get_row(self, table, key):
+        return self._find_row(table, key)[1]
+
+    def _find_row(self, table, key):
+        """(the table holding a row, the row), or (None, None); open tickets are looked at first"""
+        for part in reversed(self.parts(table)):
+            if self.async_writes:
+                for record in reversed(self.queued_records(part)):
+                    if record.get(KEYS[part]) == key:
+                        return part, pd.Series(record)
+            row = self.storage.get_row(part, key)
+            if row is not None:
+                return part, row
+        return None, None
+
+    def get_rows(self, table, keys):
+        """Look several rows up by key, skipping keys that no longer exist"""
+        keys = list(keys)
+        return concat_parts([self.storage.get_rows(part, keys) for part in self.parts(table)])
+
+    def _commit(self, batch):
+        tables = sorted({table for pending in batch for table in pending['tables']})
+        try:
+            with file_lock(os.path.join(self.data_dir, LOCK_FILE)):
+                before = {table: self.storage.version(table) for table in tables}
+                for pending in batch:
+                    try:
+                        pending['result'] = pending['write']()
+                    except Exception as error:
+                        pending['error'] = error
+                    pending['done'] = True
+                sync_written()
+                after = {table: self.storage.version(table) for table in tables}
+                self._update_derived(batch, tables, before, after)
+        except BaseException as error:
+            for pending in batch:
+                if not pending['done']:
+                    pending['error'] = error
+                    pending['done'] = True
+            raise
+
+    def _update_derived(self, batch, tables, before, after):
+        for name, sources in DERIVED_TABLES.items():
+            writes = [pending for pending in batch if set(pending['tables']) & set(sources)]
+            if not writes:
+                continue
+            if any(pending['error'] is not None or name not in pending['changes'] for pending in writes):
+                derived.invalidate(self.derived_key(name))
+                continue
+            # Tables this batch didn't touch keep whatever version they have now
+            current = {table: self.storage.version(table) for table in sources if table not in tables}
+            derived.update(
+                self.derived_key(name),
+                tuple(before.get(table, current.get(table)) for table in sources),
+                tuple(after.get(table, current.get(table)) for table in sources),
+                lambda index: [pending['changes'][name](index) for pending in writes],
+            )
+
+    def customer_index(self, rebuild=False):
+        return self.derived(
+            "customers", lambda: CustomerIndex.build(self.committed("sales"), self.committed("repairs")), rebuild
+        )
+
+    def search_customers(self, term, limit=None):
+        """Customers matching a name or phone search, most recent visitors first"""
+        return self.customer_index().search(term, limit)
+
+    def get_customer_history(self, customer):
+        """Return the repairs and sales of a customer found by search_customers"""
+        return (
+            self.get_rows("repairs", customer['repair_ids']),
+            self.get_rows("sales", customer['sale_ids']),
+        )
+
+    def search_index(self, table, rebuild=False):
+        return self.derived(
+            f"{table}_search", lambda: TextIndex.build(self.storage.read(table), SEARCH_FIELDS[table]), rebuild
+        )
+
+    def filter_search(self, table, df, term):
+        """Keep the rows of `df` (sales or repairs) that contain a search term"""
+        if not term or not term.strip():
+            return df
+        # Open tickets are searched without indexing the whole archive
+        parts = self.parts(table, df['status'].unique() if 'status' in df else None)
+        return filter_by_search(df, [self.search_index(part) for part in parts], term)
+
+    def daily_rollup(self, rebuild=False):
+        return self.derived("daily", partial(self._load_daily_rollup, rebuild), rebuild)
+
+    def _load_daily_rollup(self, rebuild=False):
+        path = os.path.join(self.data_dir, ROLLUP_FILE)
+        stamps = [self.storage.stamp(table) for table in DERIVED_TABLES["daily"]]
+        rollup = None if rebuild else DailyRollup.load(path, stamps)
+        if rollup is None:
+            rollup = DailyRollup.build(self.committed("sales"), self.committed("repairs"))
+            if self.migrate:
+                rollup.save(path, stamps)
+        return rollup
+
+    def get_daily_report(self, start, end):
+        """Per-day sales and repair totals for an inclusive date range, from the rollup"""
+        return self.daily_rollup().report(start, end)
+
+    def sales_total(self, start, end):
+        """Sum of the sales made from `start` to `end` inclusive, from the rollup"""
+        return float(self.get_daily_report(start, end)['daily']['sales_total'].sum())
+
+    def repair_status_counts(self):
+        """{status: number of repairs} over the whole table, from the rollup"""
+        return self.daily_rollup().status_counts()
+
+    def recent(self, table, n, columns=None):
+        """The `n` most recently added rows of sales or repairs, newest first
+
+        Rows are stamped with the time they are recorded, so the last ones
+        added are the latest by date. Only the end of the table is read. For
+        repairs that is the end of the open tickets and of the archive, back
+        to the tickets completed before the n-th newest one was added: a
+        ticket is only ever completed after it was added.
+        """
+        if table != "repairs":
+            return self._recent(table, n, columns)
+        needed = None if columns is None else list(dict.fromkeys([*columns, 'date', 'completion_date']))
+        latest = self._recent("repairs", n, needed)
+        taken = max(n, 1)
+        while True:
+            archived = self._recent(REPAIRS_ARCHIVE, taken, needed)
+            df = concat_parts([latest, archived]).reset_index(drop=True)
+            dates = to_time(df['date']).sort_values(ascending=False, kind="stable", na_position="last")
+            df = df.loc[dates.index[:n]].reset_index(drop=True)
+            if len(archived) < taken:
+                break  # The whole archive is in
+            oldest = archived.iloc[-1]
+            closed = to_time(pd.Series([oldest['completion_date'], oldest['date']])).dropna()
+            if len(df) == n and len(closed) and closed.iloc[0] <= dates.iloc[n - 1]:
+                break  # Anything archived before this was added before the n-th newest
+            taken *= 2
+        return project(df, columns)
+
+    def _recent(self, table, n, columns=None):
+        key = KEYS[table]
+        needed = None if columns is None else list(dict.fromkeys([*columns, key]))
+        queued = self.queued([table])
+        df = queued.seen(self.storage.tail(table, n, needed))
+        if queued:
+            df = concat_parts([df, project(queued.frame().tail(n), needed)])
+        return project(df.iloc[::-1].head(n).reset_index(drop=True), columns)
+
+    def export(self, table, start=None, end=None, file_format="csv"):
+        """Write a table's rows in a date range to a temporary file and return it, rewound
+
+        Rows are streamed from storage a chunk at a time, so exporting years of
+        history takes no more memory than one chunk. Records still waiting in
+        the write queue come last.
+        """
+        parts = self.parts(table)
+        queued = self.queued(parts)
+        columns = TABLES[table]
+
+        def chunks():
+            nonlocal columns
+            for chunk in chain.from_iterable(self.storage.chunks(part, start, end) for part in parts):
+                columns = list(chunk.columns)
+                yield queued.seen(chunk)
+            rows = queued.frame()
+            if len(rows):
+                yield filter_frame(rows, start, end).reindex(columns=columns)
+
+        return export_rows(chunks(), file_format, TABLES[table])
+
+    def get_sales(self, start=None, end=None, columns=None):
+        return self.read("sales", start, end, columns=columns)
+
+    def get_sale(self, sale_id):
+        """Return one sale as a Series, or None if it doesn't exist"""
+        return self.get_row("sales", sale_id)
 
     def add_sale(self, sale_data):
-        sales_df = self.get_sales()
+        """Record a sale and take its item out of stock, returning the sale's ID
+
+        A sale of an item with no stock left is still recorded, and its
+        quantity stays at 0; in_stock tells beforehand.
+        """
+        sale_data.setdefault('id', new_id())
         sale_data['date'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        # Convert sale_data dict to DataFrame and concatenate
-        new_sale_df = pd.DataFrame([sale_data])
-        sales_df = pd.concat([sales_df, new_sale_df], ignore_index=True)
-        sales_df.to_csv(f"{self.data_dir}/sales.csv", index=False)
+        stock = {}
+
+        def record():
+            self.storage.append("sales", sale_data)
+            # Take the item out of stock in the same commit
+            stock['item'] = self._adjust_quantity(sale_data.get('item'), -1)
 
-    def get_repairs(self):
-        return pd.read_csv(f"{self.data_dir}/repairs.csv")
+        self.write(
+            ["sales", "inventory"], record,
+            {
+                "customers": lambda index: index.add_sale(sale_data),
+                "sales_search": lambda index: index.add(sale_data),
+                "daily": lambda rollup: rollup.add_sale(sale_data),
+                "low_stock": lambda tracker: tracker.set_item(*stock['item']) if stock['item'] else None,
+            },
+            appended=("sales", sale_data),
+        )
+        return sale_data['id']
+
+    def get_repairs(self, start=None, end=None, status=None, columns=None):
+        where = {'status': status} if status is not None else None
+        return self.read("repairs", start, end, where, columns)
+
+    def get_repair(self, repair_id):
+        """Return one repair ticket as a Series, or None if it doesn't exist"""
+        return self.get_row("repairs", repair_id)
 
     def add_repair(self, repair_data):
-        repairs_df = self.get_repairs()
+        repair_data.setdefault('id', new_id())
         repair_data['date'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        # Convert repair_data dict to DataFrame and concatenate
-        new_repair_df = pd.DataFrame([repair_data])
-        repairs_df = pd.concat([repairs_df, new_repair_df], ignore_index=True)
-        repairs_df.to_csv(f"{self.data_dir}/repairs.csv", index=False)
-
-    def update_repair_status(self, index, status):
-        repairs_df = self.get_repairs()
-        repairs_df.loc[index, 'status'] = status
-        if status == "Completed":
-            repairs_df.loc[index, 'completion_date'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        repairs_df.to_csv(f"{self.data_dir}/repairs.csv", index=False)
+        part = self.part_of(repair_data)
+        self.write(
+            [part], lambda: self.storage.append(part, repair_data),
+            {
+                "customers": lambda index: index.add_repair(repair_data),
+                f"{part}_search": lambda index: index.add(repair_data),
+                "daily": lambda rollup: rollup.add_repair(repair_data),
+            },
+            appended=(part, repair_data),
+        )
+        return repair_data['id']
+
+    def update_repair(self, repair_id, changes):
+        """Change some fields of one repair ticket, persisting only that change
+
+        A ticket whose status changes to or from Completed moves between the
+        open tickets and the archive, and gets or loses its completion date.
+        The ticket is looked up under the write lock, so a move made meanwhile
+        by another process is followed; a ticket that no longer exists raises
+        KeyError.
+        """
+        found = {}
+
+        def update():
+            for part in reversed(REPAIR_PARTS):
+                row = self.storage.get_row(part, repair_id)
+                if row is not None:
+                    break
+            else:
+                raise KeyError(f"No repair ticket with ID {repair_id}")
+            old_repair = row.to_dict()
+            edits = dict(changes)
+            status = edits.get('status', old_repair['status'])
+            if status == COMPLETED and old_repair['status'] != COMPLETED:
+                edits['completion_date'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            elif status != COMPLETED and pd.notna(old_repair.get('completion_date')):
+                edits['completion_date'] = None
+            new_repair = {**old_repair, **edits}
+            target = self.part_of(new_repair)
+            found.update(old=old_repair, new=new_repair, part=part, target=target)
+            if target == part:
+                self.storage.update_row(part, repair_id, edits)
+            else:
+                # Added before it is removed: a crash in between leaves a copy, not a loss
+                self.storage.append(target, new_repair)
+                self.storage.delete_row(part, repair_id)
+
+        def search(index, part):
+            if found['part'] == found['target'] == part:
+                index.update(found['new'])
+            elif found['part'] == part:
+                index.remove(repair_id)
+            elif found['target'] == part:
+                index.add(found['new'])
+
+        self.write(
+            list(REPAIR_PARTS), update,
+            {
+                "customers": lambda index: index.move_repair(found['old'], found['new']),
+                "daily": lambda rollup: rollup.move_repair(found['old'], found['new']),
+                **{f"{part}_search": partial(search, part=part) for part in REPAIR_PARTS},
+            },
+        )
+
+    def update_repair_status(self, repair_id, status):
+        self.update_repair(repair_id, {'status': status})
+
+    def archive_transactions(self, before):
+        """Archive the sales and completed repairs of the months before `before`, on backends that partition them"""
+        if not hasattr(self.storage, "archive"):
+            return {}
+        # Open tickets stay unpacked however old they are, as they are still written to
+        tables = ["sales", REPAIRS_ARCHIVE]
+        # Archiving moves rows without changing them, so the shared indexes stay valid
+        unchanged = {name: lambda index: None for name in DERIVED_TABLES}
+        return self.write(tables, lambda: {table: self.storage.archive(table, before) for table in tables}, unchanged)
+
+    def compact_tables(self):
+        """Fold every table's update journal and pending rows back into its file"""
+        # Compaction rewrites rows without changing them, so the shared indexes stay valid
+        unchanged = {name: lambda index: None for name in DERIVED_TABLES}
+        self.write(list(TABLES), lambda: [self.storage.compact(table) for table in TABLES], unchanged)
+        return list(TABLES)
+
+    def rebuild_derived(self):
+        """Build every shared index and aggregate again from the tables, and save the rollup
+
+        They are kept current write by write; rebuilding them drops anything
+        that drifted, and the saved rollup lets the next start skip the tables.
+        """
+        self.daily_rollup(rebuild=True)
+        self.low_stock_tracker(rebuild=True)
+        self.search_index("sales", rebuild=True)
+        self.search_index("repairs", rebuild=True)
+        self.search_index(REPAIRS_ARCHIVE, rebuild=True)
+        self.customer_index(rebuild=True)
+        return list(DERIVED_TABLES)
+
+    def collect_photos(self, grace=PHOTO_GRACE_SECONDS):
+        """Delete the customer photos no repair points at any more, returning how many went
+
+        Replacing a ticket's photo saves a new file and leaves the old one
+        behind. Photos newer than `grace` seconds are kept, as the ticket of a
+        photo is written after the photo is saved.
+        """
+        paths = self.read("repairs", columns=['photo_path'])['photo_path'].dropna()
+        referenced = {os.path.basename(path) for path in paths if path}
+        return len(remove_unreferenced(self.photos_dir, referenced, time.time() - grace))
+
+    def maintenance_jobs(self):
+        hour = int(os.environ.get("GSMLAB_MAINTENANCE_HOUR", MAINTENANCE_HOUR))
+        archive_days = int(os.environ.get("GSMLAB_ARCHIVE_DAYS", ARCHIVE_AFTER_DAYS))
+        return [
+            Job("compact", self.compact_tables, hour=hour),
+            Job("archive", lambda: self.archive_transactions(datetime.now() - timedelta(days=archive_days)), hour=hour),
+            # After compaction and archiving, so the saved rollup matches the files they leave
+            Job("rebuild_indexes", self.rebuild_derived, hour=hour),
+            Job("collect_photos", self.collect_photos, hour=hour),
+        ]
+
+    def scheduler(self):
+        """The maintenance scheduler of this data directory, shared by every session"""
+        with _instances_lock:
+            if self.storage.identity not in _schedulers:
+                _schedulers[self.storage.identity] = Scheduler(self.data_dir, self.maintenance_jobs())
+            return _schedulers[self.storage.identity]
 
     def get_inventory(self):
-        return pd.read_csv(f"{self.data_dir}/inventory.csv")
+        return self.storage.read("inventory")
+
+    def get_item(self, item_name):
+        """Return one inventory item as a Series, or None if it doesn't exist"""
+        return self.storage.get_row("inventory", item_name)
+
+    def in_stock(self, item_name):
+        """Whether a sale can take an item out of stock: False for a known item with none left
+
+        Items that aren't in the inventory aren't counted, so they are always in stock.
+        """
+        item = self.get_item(item_name.strip()) if isinstance(item_name, str) else None
+        if item is None:
+            return True
+        quantity = pd.to_numeric(item['quantity'], errors="coerce")
+        return pd.notna(quantity) and quantity > 0
 
     def update_inventory(self, inventory_data):
-        inventory_data.to_csv(f"{self.data_dir}/inventory.csv", index=False)
\ No newline at end of file
+        self.write(
+            ["inventory"], lambda: self.storage.write("inventory", inventory_data),
+            {"low_stock": lambda tracker: tracker.replace(inventory_data)},
+        )
+
+    def low_stock_tracker(self, rebuild=False):
+        return self.derived("low_stock", lambda: LowStockTracker.build(
+            self.get_inventory(), _low_stock_listeners.setdefault(self.storage.identity, [])
+        ), rebuild)
+
+    def low_stock_count(self):
+        """Number of items at or below their threshold, without scanning the inventory"""
+        return self.low_stock_tracker().count()
+
+    def low_stock_items(self):
+        """Items at or below their threshold, the furthest below it first"""
+        return self.low_stock_tracker().low_stock_items()
+
+    def on_low_stock(self, listener):
+        """Call `listener(event)` whenever a write here moves an item across its threshold
+
+        The event is a dict with item_name, quantity, threshold and 'low',
+        which is True when the item ran low and False when it was restocked.
+        Returns a function that removes the listener again.
+        """
+        listeners = _low_stock_listeners.setdefault(self.storage.identity, [])
+        listeners.append(listener)
+        # Crossings are found by the tracker, so make sure there is one
+        self.low_stock_tracker()
+        return lambda: listeners.remove(listener) if listener in listeners else None
+
+    def _adjust_quantity(self, item_name, delta):
+        """Change one item's quantity and return (its name, the new quantity), or None
+
+        Stock doesn't go below 0: taking out more than is left empties it.
+        Called under the write lock, so the read and the update can't interleave
+        with another writer.
+        """
+        if not isinstance(item_name, str) or not item_name.strip():
+            return None
+        item = self.storage.get_row("inventory", item_name.strip())
+        if item is None:
+            return None
+        quantity = pd.to_numeric(item['quantity'], errors="coerce")
+        quantity = max((0 if pd.isna(quantity) else int(quantity)) + delta, 0)
+        self.storage.update_row("inventory", item['item_name'], {'quantity': quantity})
+        return item['item_name'], quantity
+
+    def adjust_quantity(self, item_name, delta):
+        """Add `delta` (negative to take stock out) to an item's quantity
+
+        Only that item's row is persisted. Returns the new quantity, which is
+        never below 0, or None if there is no such item.
+        """
+        stock = {}
+
+        def adjust():
+            stock['item'] = self._adjust_quantity(item_name, delta)
+
+        self.write(
+            ["inventory"], adjust,
+            {"low_stock": lambda tracker: tracker.set_item(*stock['item']) if stock['item'] else None},
+        )
+        return stock['item'][1] if stock['item'] else None
+
+    def _upsert_item(self, item):
+        if self.storage.get_row("inventory", item['item_name']) is None:
+            self.storage.append("inventory", item)
+        else:
+            self.storage.update_row(
+                "inventory", item['item_name'], {c: v for c, v in item.items() if c != 'item_name'}
+            )
+
+    def upsert_item(self, item):
+        """Add an inventory item, or change the given fields of the item with that name"""
+        self.write(
+            ["inventory"], lambda: self._upsert_item(item),
+            {"low_stock": lambda tracker: tracker.set_item(item['item_name'], item.get('quantity'), item.get('threshold'))},
+        )
+
+    def save_inventory_edits(self, shown_df, edits):
+        """Persist the changes made in an st.data_editor showing some or all of the inventory
+
+        `edits` is the editor's state: 'edited_rows' maps row positions of
+        `shown_df` to their changed cells, 'added_rows' lists new rows and
+        'deleted_rows' the positions removed. Edited cells and new items are
+        saved row by row. Renames and deletions rewrite the table, starting
+        from the whole inventory rather than the rows shown.
+        """
+        names = shown_df['item_name'].tolist()
+        edited = {names[int(position)]: cells for position, cells in edits.get('edited_rows', {}).items()}
+        added = [
+            {column: value for column, value in row.items() if column != '_index'}
+            for row in edits.get('added_rows', []) if row.get('item_name')
+        ]
+        deleted = [names[int(position)] for position in edits.get('deleted_rows', [])]
+
+        rows = [{**cells, 'item_name': name} for name, cells in edited.items()] + added
+        rewritten = {}
+
+        def save_rows():
+            for row in rows:
+                self._upsert_item(row)
+
+        def track_rows(tracker):
+            for row in rows:
+                tracker.set_item(row['item_name'], row.get('quantity'), row.get('threshold'))
+
+        def rewrite():
+            inventory = self.storage.read("inventory")
+            for name, cells in edited.items():
+                # Found before any cell is set: a rename changes what it matches
+                row = inventory['item_name'] == name
+                for column, value in cells.items():
+                    inventory.loc[row, column] = value
+            inventory = inventory[~inventory['item_name'].isin(deleted)]
+            if added:
+                inventory = concat_rows([inventory, pd.DataFrame(added)])
+            self.storage.write("inventory", inventory)
+            rewritten['inventory'] = inventory
+
+        renamed = any('item_name' in cells for cells in edited.values())
+        if deleted or renamed:
+            self.write(["inventory"], rewrite, {"low_stock": lambda tracker: tracker.replace(rewritten['inventory'])})
+        else:
+            self.write(["inventory"], save_rows, {"low_stock": track_rows})
@@ -0,0 +1,95 @@
+import gzip
+import io
+import tempfile
+from importlib.util import find_spec
+
+import pandas as pd
+
+from utils.metrics import metrics
+
+# File name extension and MIME type of each export format
+EXPORT_FORMATS = {
+    "csv": ("csv", "text/csv"),
+    "csv.gz": ("csv.gz", "application/gzip"),
+    "xlsx": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+# Rows a worksheet holds, header included; longer exports go on to further sheets
+XLSX_SHEET_ROWS = 1_048_576
+
+
+def export_formats():
+    """The formats that can be written here: xlsx needs openpyxl (the xlsx extra)"""
+    return [name for name in EXPORT_FORMATS if name != "xlsx" or find_spec("openpyxl") is not None]
+
+
+def write_csv(chunks, f, columns, compress=False):
+    """Write the chunks to a binary file as one CSV, gzipped if asked"""
+    stream = gzip.GzipFile(fileobj=f, mode="wb") if compress else f
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    rows = 0
+    for chunk in chunks:
+        chunk.to_csv(text, header=rows == 0, index=False)
+        rows += len(chunk)
+    if rows == 0:
+        pd.DataFrame(columns=columns).to_csv(text, index=False)
+    text.flush()
+    text.detach()
+    if compress:
+        # Writes the gzip trailer; the file itself stays open
+        stream.close()
+    return rows
+
+
+def write_xlsx(chunks, f, columns, sheet="Export"):
+    """Write the chunks to a binary file as an xlsx workbook
+
+    openpyxl's write-only mode keeps only the row being added in memory.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    worksheet, sheet_rows, rows = None, XLSX_SHEET_ROWS, 0
+    for chunk in chunks:
+        if worksheet is None:
+            columns = list(chunk.columns)
+        # As written to CSV: a float32 price of 142.47 mustn't become 142.4700012207031
+        chunk = chunk.assign(**{
+            column: chunk[column].astype(str).astype(float) for column in chunk.select_dtypes("float32")
+        })
+        # Blanks as empty cells, numpy scalars as plain Python values
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        for row in chunk.itertuples(index=False, name=None):
+            if sheet_rows == XLSX_SHEET_ROWS:
+                worksheet = workbook.create_sheet(sheet if worksheet is None else f"{sheet} {len(workbook.worksheets) + 1}")
+                worksheet.append(columns)
+                sheet_rows = 1
+            worksheet.append(row)
+            sheet_rows += 1
+        rows += len(chunk)
+    if worksheet is None:
+        workbook.create_sheet(sheet).append(list(columns))
+    workbook.save(f)
+    return rows
+
+
+def export_rows(chunks, file_format, columns):
+    """Stream the chunks into a temporary file in `file_format` and return it, rewound
+
+    The file is unnamed and disappears once closed, so nothing is left behind
+    in the temp directory whoever ends up reading it.
+    """
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{file_format}', expected one of {sorted(EXPORT_FORMATS)}")
+    f = tempfile.TemporaryFile()
+    try:
+        if file_format == "xlsx":
+            rows = write_xlsx(chunks, f, columns)
+        else:
+            rows = write_csv(chunks, f, columns, compress=file_format == "csv.gz")
+        metrics.count(bytes_written=f.tell(), rows=rows)
+        f.seek(0)
+    except BaseException:
+        f.close()
+        raise
+    return f
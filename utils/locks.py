@@ -0,0 +1,104 @@
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of this process are kept apart
+    fcntl = None
+
+
+class FileLock:
+    """Exclusive lock on a file, shared by every thread and process that uses it
+
+    Threads of one process queue on a regular lock; the holder then takes an
+    flock on the file so other processes (several Streamlit servers, scripts)
+    wait too. It is reentrant, so a write can run nested inside another.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            try:
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except BaseException:
+                if self._fd is not None:
+                    os.close(self._fd)
+                    self._fd = None
+                self._lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._lock.release()
+
+
+_file_locks = {}
+_file_locks_lock = threading.Lock()
+
+
+def file_lock(path):
+    """The one FileLock of this process for a path"""
+    path = os.path.abspath(path)
+    with _file_locks_lock:
+        if path not in _file_locks:
+            _file_locks[path] = FileLock(path)
+        return _file_locks[path]
+
+
+class LeaderLock:
+    """Exclusive lock on a file that one process takes without waiting and keeps
+
+    Picks which of the processes sharing a data directory does something on
+    behalf of all of them: `acquire` returns True in the process holding the
+    lock, now or from an earlier call, and False in every other one. The
+    holder writes its PID into the file, so `holder` can tell who leads
+    without taking the lock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def acquire(self):
+        if self._fd is not None or fcntl is None:
+            return True  # Windows: each process leads its own threads
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    def holder(self):
+        """PID of the process holding the lock, or None if no running process does"""
+        if self._fd is not None or fcntl is None:
+            return os.getpid()
+        try:
+            with open(self.path) as f:
+                pid = int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return None  # Left by a process that has exited, which released the lock
+        except PermissionError:
+            pass
+        return pid
@@ -0,0 +1,162 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+# Timings kept per span; older ones are dropped as new ones come in
+RING_SIZE = 1000
+
+# What a span counts besides its duration
+COUNTERS = ('bytes_read', 'bytes_written', 'rows')
+
+
+class Span:
+    """One timed section; use through Recorder.span as a context manager"""
+
+    __slots__ = ('recorder', 'name', 'counts', 'start')
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+        self.counts = [0, 0, 0]
+
+    def __enter__(self):
+        self.recorder._stack().append(self.counts)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        duration = time.perf_counter() - self.start
+        self.recorder._stack().pop()
+        self.recorder._record(self.name, duration, self.counts)
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class Recorder:
+    """Process-wide ring buffers of span timings, shared by every session
+
+    A span is a named section of code: DataManager methods, storage parses and
+    the page sections. Each finished span appends (end time, seconds, bytes
+    read, bytes written, rows) to the ring of its name, so recording costs an
+    append and memory stays bounded. Storage code reports bytes and rows with
+    `count`, which adds them to every span open in the calling thread.
+    Percentiles are only worked out when `summary` is asked for.
+    """
+
+    def __init__(self, size=RING_SIZE):
+        self.size = size
+        self.enabled = os.environ.get("GSMLAB_METRICS", "1") != "0"
+        self._rings = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def _record(self, name, duration, counts):
+        ring = self._rings.get(name)
+        if ring is None:
+            with self._lock:
+                ring = self._rings.setdefault(name, deque(maxlen=self.size))
+        ring.append((time.time(), duration, *counts))
+
+    def span(self, name):
+        return Span(self, name) if self.enabled else _NoSpan()
+
+    def timed(self, name):
+        """Decorator recording every call of a function as a span"""
+        def decorate(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with Span(self, name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def instrument(self, prefix):
+        """Class decorator timing each method of the class as "<prefix>.<method>" """
+        def decorate(cls):
+            for name, attribute in list(vars(cls).items()):
+                if callable(attribute) and not name.startswith("__"):
+                    setattr(cls, name, self.timed(f"{prefix}.{name}")(attribute))
+            return cls
+        return decorate
+
+    def count(self, bytes_read=0, bytes_written=0, rows=0):
+        """Add bytes and rows to the spans open in this thread"""
+        if not self.enabled:
+            return
+        for counts in self._stack():
+            counts[0] += bytes_read
+            counts[1] += bytes_written
+            counts[2] += rows
+
+    def events(self):
+        """Every recorded span as a dict, oldest first"""
+        with self._lock:
+            rings = {name: list(ring) for name, ring in self._rings.items()}
+        events = [
+            {'span': name, 'time': end, 'seconds': seconds, **dict(zip(COUNTERS, counts))}
+            for name, ring in rings.items()
+            for end, seconds, *counts in ring
+        ]
+        events.sort(key=lambda event: event['time'])
+        return events
+
+    def summary(self):
+        """Calls, p50/p95/p99 and totals of each span, slowest p95 first"""
+        import pandas as pd
+
+        columns = ['span', 'calls', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'total_s', *COUNTERS]
+        events = pd.DataFrame(self.events())
+        if events.empty:
+            return pd.DataFrame(columns=columns)
+        grouped = events.groupby('span')
+        seconds = grouped['seconds']
+        summary = pd.DataFrame({
+            'calls': seconds.size(),
+            'p50_ms': seconds.quantile(0.5) * 1000,
+            'p95_ms': seconds.quantile(0.95) * 1000,
+            'p99_ms': seconds.quantile(0.99) * 1000,
+            'max_ms': seconds.max() * 1000,
+            'total_s': seconds.sum(),
+            **{counter: grouped[counter].sum() for counter in COUNTERS},
+        })
+        return summary.reset_index().sort_values('p95_ms', ascending=False)[columns]
+
+    def to_csv(self):
+        """The raw spans as CSV"""
+        import pandas as pd
+
+        return pd.DataFrame(self.events(), columns=['span', 'time', 'seconds', *COUNTERS]).to_csv(index=False)
+
+    def to_json(self):
+        """The summary and the raw spans as one JSON document"""
+        return json.dumps({
+            'created': time.time(),
+            'summary': self.summary().to_dict("records"),
+            'events': self.events(),
+        }, indent=2, default=float)
+
+    def clear(self):
+        with self._lock:
+            self._rings.clear()
+
+
+# Timings of this Streamlit process
+metrics = Recorder()
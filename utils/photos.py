@@ -0,0 +1,158 @@
+import base64
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.metrics import metrics
+
+# Longest side of the thumbnails shown on cards and customer pages
+THUMBNAIL_SIZE = (200, 200)
+THUMBNAIL_DIR = "thumbnails"
+
+# Upper bound on the base64 text kept in memory by the photo cache
+PHOTO_CACHE_BYTES = 32 * 1024 * 1024
+
+PHOTO_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def thumbnail_path(photo_path):
+    """Where the thumbnail of a photo lives, next to the photo itself"""
+    directory, filename = os.path.split(photo_path)
+    return os.path.join(directory, THUMBNAIL_DIR, os.path.splitext(filename)[0] + ".jpg")
+
+
+@metrics.timed("photos.thumbnail")
+def make_thumbnail(photo_path):
+    """Write a small JPEG thumbnail of a photo and return its path"""
+    # Imported on first use, so starting the app doesn't wait for Pillow
+    from PIL import Image, ImageOps
+
+    path = thumbnail_path(photo_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with Image.open(photo_path) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(THUMBNAIL_SIZE)
+        # Write under a temporary name so a half-written thumbnail is never served
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        image.convert("RGB").save(tmp_path, "JPEG", quality=80, optimize=True)
+    os.replace(tmp_path, path)
+    return path
+
+
+class PhotoCache:
+    """LRU cache of base64-encoded photos, bounded by the size of the encoded text
+
+    Entries are keyed by path and modification time, so a photo replaced on
+    disk is never served stale.
+    """
+
+    def __init__(self, max_bytes=PHOTO_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        try:
+            key = (os.path.abspath(path), os.stat(path).st_mtime_ns)
+        except FileNotFoundError:
+            return None
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        with metrics.span("photos.encode"), open(path, "rb") as f:
+            data = f.read()
+            encoded = base64.b64encode(data).decode()
+            metrics.count(bytes_read=len(data))
+
+        with self._lock:
+            if key not in self._entries and len(encoded) <= self.max_bytes:
+                self._entries[key] = encoded
+                self.size += len(encoded)
+                while self.size > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.size -= len(evicted)
+        return encoded
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+# Shared by every session in this Streamlit process
+photo_cache = PhotoCache()
+
+_backfills = set()
+_backfills_lock = threading.Lock()
+
+
+def missing_thumbnails(photos_dir):
+    """Photos in a directory that don't have a thumbnail yet"""
+    if not os.path.isdir(photos_dir):
+        return []
+    return [
+        os.path.join(photos_dir, filename)
+        for filename in sorted(os.listdir(photos_dir))
+        if filename.lower().endswith(PHOTO_EXTENSIONS)
+        and not os.path.exists(thumbnail_path(os.path.join(photos_dir, filename)))
+    ]
+
+
+def _make_thumbnail_quietly(photo_path):
+    try:
+        make_thumbnail(photo_path)
+    except OSError:
+        pass  # Unreadable image; pages fall back to the full photo
+
+
+def start_thumbnail_backfill(photos_dir, workers=4):
+    """Create missing thumbnails in a background thread pool, once per directory"""
+    photos_dir = os.path.abspath(photos_dir)
+    with _backfills_lock:
+        if photos_dir in _backfills:
+            return None
+        _backfills.add(photos_dir)
+
+    photos = missing_thumbnails(photos_dir)
+    if not photos:
+        return None
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnails")
+    for photo_path in photos:
+        executor.submit(_make_thumbnail_quietly, photo_path)
+    executor.shutdown(wait=False)
+    return executor
+
+
+def remove_unreferenced(photos_dir, referenced, older_than):
+    """Delete the photos in a directory whose file name isn't in `referenced`, returning their paths
+
+    Only files last changed before the timestamp `older_than` go, so a photo
+    saved for a ticket that isn't written yet is kept. Thumbnails whose photo
+    is gone are deleted along with it.
+    """
+    if not os.path.isdir(photos_dir):
+        return []
+    removed = []
+    kept = set()
+    for filename in sorted(os.listdir(photos_dir)):
+        path = os.path.join(photos_dir, filename)
+        if not filename.lower().endswith(PHOTO_EXTENSIONS):
+            continue
+        if filename in referenced or os.path.getmtime(path) >= older_than:
+            kept.add(os.path.splitext(filename)[0])
+            continue
+        os.remove(path)
+        removed.append(path)
+
+    thumbnails_dir = os.path.join(photos_dir, THUMBNAIL_DIR)
+    if os.path.isdir(thumbnails_dir):
+        for filename in os.listdir(thumbnails_dir):
+            path = os.path.join(thumbnails_dir, filename)
+            if os.path.splitext(filename)[0] not in kept and os.path.getmtime(path) < older_than:
+                os.remove(path)
+    return removed
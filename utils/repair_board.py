@@ -0,0 +1,103 @@
+import html
+import math
+
+import numpy as np
+import pandas as pd
+
+from utils.metrics import metrics
+
+# Define repair categories with colors
+REPAIR_CATEGORIES = {
+    "Screen Repair": {"color": "#FF4B4B", "icon": "📱"},
+    "Battery Replacement": {"color": "#4BB543", "icon": "🔋"},
+    "Water Damage": {"color": "#1E90FF", "icon": "💧"},
+    "Charging Port": {"color": "#FFA500", "icon": "⚡"},
+    "Speaker/Audio": {"color": "#9370DB", "icon": "🔊"},
+    "Camera Issue": {"color": "#20B2AA", "icon": "📸"},
+    "Other": {"color": "#808080", "icon": "🔨"}
+}
+
+# Status configurations
+STATUS_COLORS = {
+    "Pending": "#FFA500",
+    "In Progress": "#1E90FF",
+    "Waiting for Parts": "#FF4B4B",
+    "Ready for Pickup": "#4BB543",
+    "Completed": "#808080"
+}
+
+# Columns of the Kanban board, in order
+BOARD_STATUSES = ["Pending", "In Progress", "Waiting for Parts", "Ready for Pickup"]
+
+PAGE_SIZES = [5, 10, 25, 50]
+
+# Fields shown on a repair card
+CARD_COLUMNS = ['customer_name', 'device', 'phone', 'issue', 'category', 'estimated_cost']
+
+
+def escape(value):
+    """HTML-escape one field value, missing values as empty text"""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ""
+    return html.escape(str(value), quote=False)
+
+
+def paginate(rows, page, page_size):
+    """Return the rows on a page, the page actually shown and the page count"""
+    pages = max(1, math.ceil(len(rows) / page_size))
+    page = min(max(page, 0), pages - 1)
+    return rows[page * page_size:(page + 1) * page_size], page, pages
+
+
+def card_html(repairs):
+    """HTML of the repair card of each row, in order
+
+    Built row by row: a board only ever builds the cards of the pages it
+    shows, which is too few rows for whole-column string operations to pay
+    back their fixed cost.
+    """
+    cards = []
+    for repair in repairs[CARD_COLUMNS].to_dict("records"):
+        category = repair['category'] if repair['category'] in REPAIR_CATEGORIES else "Other"
+        icon, color = REPAIR_CATEGORIES[category]['icon'], REPAIR_CATEGORIES[category]['color']
+        cost = pd.to_numeric(repair['estimated_cost'], errors="coerce")
+        cards.append(
+            "<div class='repair-card'>"
+            "<div style='display: flex; align-items: center;'><div style='flex: 1;'>"
+            f"<h4>{icon} {escape(repair['customer_name'])}</h4>"
+            f"<div class='category-tag' style='background-color: {color}20; color: {color};'>"
+            f"{category}</div></div></div>"
+            f"<p><strong>📱 Device:</strong> {escape(repair['device'])}</p>"
+            f"<p><strong>📞 Phone:</strong> {escape(repair['phone'])}</p>"
+            f"<p><strong>💬 Issue:</strong> {escape(repair['issue'])}</p>"
+            f"<p><strong>💰 Cost:</strong> ${0 if pd.isna(cost) else cost:.2f}</p>"
+            "</div>"
+        )
+    return cards
+
+
+def board_columns(active_repairs, pages, page_size):
+    """Split sorted active repairs into one page of cards per board column
+
+    `pages` maps each status to the page requested for its column. Only the
+    rows on that page have card HTML built, so the cost is bounded by the page
+    size rather than the number of open tickets.
+    """
+    with metrics.span("repairs.cards"):
+        status = active_repairs['status'].to_numpy()
+        columns, shown = {}, []
+        for column_status in BOARD_STATUSES:
+            positions = np.flatnonzero(status == column_status)
+            page_positions, page, page_count = paginate(positions, pages.get(column_status, 0), page_size)
+            columns[column_status] = {'total': len(positions), 'page': page, 'pages': page_count}
+            shown.append(page_positions)
+
+        # Take the rows of all visible pages at once and hand each column its slice
+        page_repairs = active_repairs.iloc[np.concatenate(shown)]
+        cards = card_html(page_repairs)
+        offset = 0
+        for column, page_positions in zip(columns.values(), shown):
+            column['repairs'] = page_repairs.iloc[offset:offset + len(page_positions)]
+            column['cards'] = cards[offset:offset + len(page_positions)]
+            offset += len(page_positions)
+    return columns
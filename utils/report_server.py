@@ -0,0 +1,107 @@
+"""Process that runs the cross-shop report's worker pool: python -m utils.report_server
+
+utils/shops.py starts it on the first all-shops report and sends it the
+shops to report on. The pool lives here rather than in the Streamlit
+server because a spawned worker first runs its parent's __main__: in the
+server that is the page being drawn, here it is this module, which does
+nothing on import.
+
+On start it reads an authentication key (hex) from stdin, listens for
+connections and writes their address (JSON) to stdout. It exits when its
+stdin closes, which is when the process that started it is gone.
+"""
+import json
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, wait
+
+from utils.shops import report_workers, shop_report
+
+# Worker processes, started on first use and replaced if one dies
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def exit_with_server():
+    """Make a worker exit when this process does, however it ends"""
+    server = multiprocessing.parent_process().sentinel
+
+    def watch():
+        wait([server])
+        os._exit(0)
+
+    threading.Thread(target=watch, name="gsmlab-report-server", daemon=True).start()
+
+
+def report_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned rather than forked, as a fork would copy locks this process's threads hold
+            _pool = ProcessPoolExecutor(
+                report_workers(), mp_context=multiprocessing.get_context("spawn"), initializer=exit_with_server,
+            )
+        return _pool
+
+
+def run_reports(shops, backend, start, end):
+    """({shop name: report}, {shop name: error message}) of the shops, given as {name: data directory}"""
+    global _pool
+    pool = report_pool()
+    futures = {name: pool.submit(shop_report, path, backend, start, end) for name, path in shops.items()}
+    reports, errors = {}, {}
+    for name, future in futures.items():
+        try:
+            reports[name] = future.result()
+        except BrokenProcessPool as error:
+            # A worker died; the next report starts a new pool
+            with _pool_lock:
+                if _pool is pool:
+                    _pool = None
+            errors[name] = f"{type(error).__name__}: {error}"
+        except Exception as error:
+            errors[name] = f"{type(error).__name__}: {error}"
+    return reports, errors
+
+
+def serve(connection):
+    """Answer the requests of one connection: (shops, backend, start, end) each"""
+    with connection:
+        while True:
+            try:
+                request = connection.recv()
+            except EOFError:
+                return
+            connection.send(run_reports(*request))
+
+
+def main():
+    authkey = bytes.fromhex(sys.stdin.readline().strip())
+    listener = Listener(authkey=authkey)
+    print(json.dumps(listener.address), flush=True)
+    # Nobody reads the pipe past that line: anything else printed would fill it
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    def stop_with_parent():
+        sys.stdin.read()
+        with _pool_lock:
+            if _pool is not None:
+                _pool.shutdown(cancel_futures=True)
+        os._exit(0)
+
+    threading.Thread(target=stop_with_parent, name="gsmlab-report-parent", daemon=True).start()
+    while True:
+        try:
+            connection = listener.accept()
+        except (AuthenticationError, OSError):
+            continue
+        threading.Thread(target=serve, args=(connection,), name="gsmlab-report-conn", daemon=True).start()
+
+
+if __name__ == "__main__":
+    main()
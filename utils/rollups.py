@@ -0,0 +1,195 @@
+import bisect
+import json
+import os
+import tempfile
+import threading
+
+import pandas as pd
+
+# Numbers kept for every day
+DAY_TOTALS = ['sales_total', 'sales_count', 'repairs_opened', 'repairs_completed']
+# Per-day counts of each payment method (sales) and current status (repairs)
+DAY_COUNTS = ['payment_methods', 'statuses']
+
+SNAPSHOT_VERSION = 1
+
+
+def day_of(value):
+    """The YYYY-MM-DD day of a stored timestamp, or None if it has none"""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    text = str(value)
+    return text[:10] if len(text) >= 10 else None
+
+
+def day_key(value):
+    """The YYYY-MM-DD key of a date picked in the UI"""
+    return pd.Timestamp(value).strftime("%Y-%m-%d")
+
+
+def count_key(value):
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return "Unknown"
+    return str(value)
+
+
+def price_of(value):
+    price = pd.to_numeric(value, errors="coerce")
+    return 0.0 if pd.isna(price) else float(price)
+
+
+class DailyRollup:
+    """Per-day totals of sales and repairs, so reports never scan transactions
+
+    Each day keeps the sales sum and count, the number of sales per payment
+    method, the repairs opened that day with a count per current status, and
+    the repairs completed that day. A date range is answered by bisecting the
+    sorted day list and adding up only the days inside it.
+    """
+
+    def __init__(self):
+        self.days = {}
+        self._sorted = []
+        self._lock = threading.Lock()
+
+    def _day(self, day):
+        totals = self.days.get(day)
+        if totals is None:
+            totals = self.days[day] = {
+                'sales_total': 0.0, 'sales_count': 0, 'repairs_opened': 0, 'repairs_completed': 0,
+                'payment_methods': {}, 'statuses': {},
+            }
+            bisect.insort(self._sorted, day)
+        return totals
+
+    @classmethod
+    def build(cls, sales_df, repairs_df):
+        """Roll whole tables up with one groupby per counter"""
+        rollup = cls()
+        if len(sales_df):
+            sales_days = sales_df['date'].map(day_of)
+            prices = pd.to_numeric(sales_df['price'], errors="coerce").fillna(0.0)
+            for day, total in prices.groupby(sales_days).sum().items():
+                rollup._day(day)['sales_total'] = float(total)
+            for day, count in sales_days.value_counts().items():
+                rollup._day(day)['sales_count'] = int(count)
+            rollup._add_counts('payment_methods', sales_days, sales_df['payment_method'].astype(object).map(count_key))
+
+        if len(repairs_df):
+            repair_days = repairs_df['date'].map(day_of)
+            for day, count in repair_days.value_counts().items():
+                rollup._day(day)['repairs_opened'] = int(count)
+            rollup._add_counts('statuses', repair_days, repairs_df['status'].astype(object).map(count_key))
+            if 'completion_date' in repairs_df:
+                completed = repairs_df['completion_date'].map(day_of)
+                for day, count in completed.value_counts().items():
+                    rollup._day(day)['repairs_completed'] = int(count)
+        return rollup
+
+    def _add_counts(self, name, days, values):
+        for (day, value), count in values.groupby(days).value_counts().items():
+            self._day(day)[name][value] = int(count)
+
+    def _count(self, day, name, value, step):
+        if day is None:
+            return
+        counts = self._day(day)[name]
+        value = count_key(value)
+        counts[value] = counts.get(value, 0) + step
+        if counts[value] <= 0:
+            del counts[value]
+
+    def _bump(self, day, name, step):
+        if day is not None:
+            self._day(day)[name] += step
+
+    def add_sale(self, sale):
+        day = day_of(sale.get('date'))
+        with self._lock:
+            if day is None:
+                return
+            self._bump(day, 'sales_total', price_of(sale.get('price')))
+            self._bump(day, 'sales_count', 1)
+            self._count(day, 'payment_methods', sale.get('payment_method'), 1)
+
+    def add_repair(self, repair):
+        with self._lock:
+            self._add_repair(repair, 1)
+
+    def _add_repair(self, repair, step):
+        day = day_of(repair.get('date'))
+        self._bump(day, 'repairs_opened', step)
+        self._count(day, 'statuses', repair.get('status'), step)
+        self._bump(day_of(repair.get('completion_date')), 'repairs_completed', step)
+
+    def move_repair(self, old_repair, new_repair):
+        """Re-count a repair whose status or completion date changed"""
+        with self._lock:
+            self._add_repair(old_repair, -1)
+            self._add_repair(new_repair, 1)
+
+    def report(self, start, end):
+        """Totals for the days from `start` to `end` inclusive
+
+        Returns a dict with a 'daily' frame (one row per day that had any
+        activity, in date order) and the summed 'payment_methods' and
+        'statuses' counts as Series.
+        """
+        low, high = day_key(start), day_key(end)
+        with self._lock:
+            days = self._sorted[bisect.bisect_left(self._sorted, low):bisect.bisect_right(self._sorted, high)]
+            rows = [{'date': day, **{name: self.days[day][name] for name in DAY_TOTALS}} for day in days]
+            counts = {name: {} for name in DAY_COUNTS}
+            for day in days:
+                for name in DAY_COUNTS:
+                    for value, count in self.days[day][name].items():
+                        counts[name][value] = counts[name].get(value, 0) + count
+
+        daily = pd.DataFrame(rows, columns=['date', *DAY_TOTALS])
+        daily['date'] = pd.to_datetime(daily['date']).dt.date
+        return {
+            'daily': daily,
+            **{
+                name: pd.Series(values, dtype="int64").sort_values(ascending=False)
+                for name, values in counts.items()
+            },
+        }
+
+    def status_counts(self):
+        """Number of repairs in each status over all days"""
+        with self._lock:
+            counts = {}
+            for totals in self.days.values():
+                for status, count in totals['statuses'].items():
+                    counts[status] = counts.get(status, 0) + count
+        return counts
+
+    def save(self, path, stamps):
+        """Store the rollup with the table stamps it was built from"""
+        with self._lock:
+            snapshot = {'version': SNAPSHOT_VERSION, 'stamps': stamps, 'days': self.days}
+            text = json.dumps(snapshot)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".rollup.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path, stamps):
+        """Load a saved rollup, or return None if its tables have changed since"""
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Compare through JSON so tuples and lists are alike
+        if snapshot.get('version') != SNAPSHOT_VERSION or snapshot.get('stamps') != json.loads(json.dumps(stamps)):
+            return None
+        rollup = cls()
+        rollup.days = snapshot['days']
+        rollup._sorted = sorted(rollup.days)
+        return rollup
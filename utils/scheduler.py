@@ -0,0 +1,166 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from utils.locks import LeaderLock
+from utils.metrics import metrics
+
+# When each job last ran, kept in the data directory across restarts
+STATE_FILE = "maintenance.json"
+# Held by the one process of those sharing a data directory that runs its jobs
+LEADER_FILE = ".maintenance.lock"
+
+# How often the scheduler looks for due jobs, and for the lock if another process has it
+CHECK_SECONDS = 60
+
+
+class Job:
+    """A named maintenance task, run daily at `hour` o'clock or every `every` seconds"""
+
+    def __init__(self, name, function, hour=None, every=None):
+        if (hour is None) == (every is None):
+            raise ValueError("A job runs either daily at an hour or every so many seconds")
+        self.name = name
+        self.function = function
+        self.hour = hour
+        self.every = every
+
+    def schedule(self):
+        return f"daily at {self.hour:02d}:00" if self.hour is not None else f"every {self.every:g}s"
+
+    def due(self, last_run, now):
+        """Whether a job last run at the timestamp `last_run` should run at `now` (a datetime)"""
+        if self.every is not None:
+            return last_run + self.every <= now.timestamp()
+        # The latest time it was scheduled for: a server that was off then catches up
+        scheduled = now.replace(hour=self.hour, minute=0, second=0, microsecond=0)
+        if scheduled > now:
+            scheduled -= timedelta(days=1)
+        return last_run < scheduled.timestamp()
+
+
+class Scheduler:
+    """Background thread running the maintenance jobs of one data directory
+
+    Sessions share one per process, and of the processes serving a data
+    directory only the one holding its lock file runs jobs, so each job runs
+    once however many tabs and servers are open. Jobs run one at a time, in
+    the order given, off every page's rerun. When each last ran is saved in
+    the data directory: a restart doesn't run them again, and a server that
+    was off at the scheduled hour runs them once it is back. On a fresh data
+    directory they wait for their first scheduled time.
+    """
+
+    def __init__(self, data_dir, jobs, check_seconds=CHECK_SECONDS):
+        self.jobs = {job.name: job for job in jobs}
+        self.check_seconds = check_seconds
+        self.state_path = os.path.join(data_dir, STATE_FILE)
+        self.leader = LeaderLock(os.path.join(data_dir, LEADER_FILE))
+        self.running = None
+        self._requested = []
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="gsmlab-maintenance", daemon=True)
+                self._thread.start()
+        return self
+
+    def run_soon(self, name):
+        """Run a job at the next check, due or not"""
+        if name not in self.jobs:
+            raise ValueError(f"Unknown maintenance job '{name}', expected one of {sorted(self.jobs)}")
+        with self._lock:
+            if name not in self._requested:
+                self._requested.append(name)
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.check_seconds)
+            self._wake.clear()
+            try:
+                self.run_due()
+            except Exception:
+                traceback.print_exc()
+
+    def load_state(self):
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self, state):
+        directory = os.path.dirname(self.state_path) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".maintenance.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(state, f, indent=2, default=str)
+            os.replace(tmp_path, self.state_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def run_due(self, now=None):
+        """Run the jobs that are due or were asked for, if this process leads; return their names"""
+        if not self.leader.acquire():
+            return []
+        now = now or datetime.now()
+        state = self.load_state()
+        with self._lock:
+            requested, self._requested = self._requested, []
+        new = [name for name in self.jobs if name not in state]
+        for name in new:
+            # Counted from now, as if it had just run
+            state[name] = {'since': now.timestamp()}
+        if new:
+            self._save_state(state)
+
+        ran = []
+        for name, job in self.jobs.items():
+            last_run = state[name].get('last_run', state[name].get('since'))
+            if name in requested or job.due(last_run, now):
+                state[name] = self._run_job(job)
+                # Saved after each job, so a crash in the next doesn't repeat this one
+                self._save_state(state)
+                ran.append(name)
+        return ran
+
+    def _run_job(self, job):
+        self.running = job.name
+        started = time.time()
+        result = error = None
+        try:
+            with metrics.span(f"maintenance.{job.name}"):
+                result = job.function()
+        except Exception as exception:
+            traceback.print_exc()
+            error = f"{type(exception).__name__}: {exception}"
+        finally:
+            self.running = None
+        return {'last_run': started, 'seconds': time.time() - started, 'result': result, 'error': error}
+
+    def status(self):
+        """One dict per job: its schedule, when it last ran, how long it took and what it returned"""
+        state = self.load_state()
+        rows = []
+        for name, job in self.jobs.items():
+            last = state.get(name, {})
+            rows.append({
+                'job': name,
+                'schedule': job.schedule(),
+                'last_run': datetime.fromtimestamp(last['last_run']) if 'last_run' in last else None,
+                'seconds': last.get('seconds'),
+                'result': None if last.get('result') is None else json.dumps(last['result'], default=str),
+                'error': last.get('error'),
+                'running': self.running == name,
+            })
+        return rows
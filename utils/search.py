@@ -0,0 +1,133 @@
+import bisect
+import threading
+
+import pandas as pd
+
+from utils.storage import REPAIRS_ARCHIVE
+
+# Text columns searched by the search box of each table
+SEARCH_FIELDS = {
+    "repairs": ['customer_name', 'device', 'phone', 'issue'],
+    "sales": ['customer_name', 'phone', 'item'],
+}
+SEARCH_FIELDS[REPAIRS_ARCHIVE] = SEARCH_FIELDS["repairs"]
+
+GRAM = 3
+
+
+class SortedKeys:
+    """Maps text keys to sets of items and finds keys by prefix"""
+
+    def __init__(self):
+        self.items = {}
+        self.sorted = []
+
+    def add(self, text, item):
+        if not text:
+            return
+        if text not in self.items:
+            self.items[text] = set()
+            bisect.insort(self.sorted, text)
+        self.items[text].add(item)
+
+    def discard(self, text, item):
+        if text in self.items:
+            self.items[text].discard(item)
+
+    def with_prefix(self, prefix):
+        matches = set()
+        position = bisect.bisect_left(self.sorted, prefix)
+        while position < len(self.sorted) and self.sorted[position].startswith(prefix):
+            matches |= self.items[self.sorted[position]]
+            position += 1
+        return matches
+
+
+def field_text(value):
+    """Lower-case text of one field value, as it is searched"""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).lower()
+
+
+def trigrams(text):
+    return {text[i:i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+
+class TextIndex:
+    """Trigram index for literal, case-insensitive substring search over some columns
+
+    A search term is matched as plain text (no regex), anywhere inside any of
+    the indexed fields. Terms of three or more characters intersect the posting
+    sets of their trigrams and only check the few candidates left; shorter terms
+    match the start of a word through a sorted word list.
+    """
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.texts = {}
+        self._grams = {}
+        self._words = SortedKeys()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, df, fields):
+        index = cls(fields)
+        columns = [c for c in ['id', *fields] if c in df]
+        for record in df[columns].to_dict("records"):
+            index._add(record['id'], record)
+        return index
+
+    def _add(self, row_id, record):
+        texts = [field_text(record.get(field)) for field in self.fields]
+        self.texts[row_id] = texts
+        for text in texts:
+            for gram in trigrams(text):
+                self._grams.setdefault(gram, set()).add(row_id)
+            for word in text.split():
+                self._words.add(word, row_id)
+
+    def _remove(self, row_id):
+        for text in self.texts.pop(row_id, []):
+            for gram in trigrams(text):
+                self._grams.get(gram, set()).discard(row_id)
+            for word in text.split():
+                self._words.discard(word, row_id)
+
+    def add(self, record):
+        with self._lock:
+            self._add(record['id'], record)
+
+    def update(self, record):
+        with self._lock:
+            self._remove(record['id'])
+            self._add(record['id'], record)
+
+    def remove(self, row_id):
+        with self._lock:
+            self._remove(row_id)
+
+    def search(self, term):
+        """IDs of the rows containing `term` in any indexed field"""
+        needle = str(term).lower().strip()
+        with self._lock:
+            if not needle:
+                return set(self.texts)
+            if len(needle) < GRAM:
+                return self._words.with_prefix(needle)
+
+            postings = sorted((self._grams.get(gram, set()) for gram in trigrams(needle)), key=len)
+            candidates = set.intersection(*postings)
+            return {
+                row_id for row_id in candidates
+                if any(needle in text for text in self.texts.get(row_id, []))
+            }
+
+
+def filter_by_search(df, indexes, term):
+    """Keep the rows of a table that match a search box term in any of the indexes"""
+    if not term or not term.strip():
+        return df
+    return df[df['id'].isin(set().union(*(index.search(term) for index in indexes)))]
@@ -0,0 +1,155 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+from multiprocessing.connection import Client
+
+import pandas as pd
+
+from utils.cache import frames
+from utils.data_manager import DataManager
+from utils.metrics import metrics
+from utils.rollups import DAY_COUNTS, DAY_TOTALS, DailyRollup
+from utils.storage import TABLES
+
+# Every branch of the lab is a data directory of its own, with its own tables
+# (or database) and photos: the data directory itself is the main shop and
+# each directory in this subdirectory of it is another one, named after it
+SHOPS_DIR = "shops"
+
+# Name the main shop is listed under ($GSMLAB_SHOP_NAME)
+MAIN_SHOP = "Main"
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The process running the cross-shop report's workers (utils/report_server.py),
+# started on first use and kept: (its Popen, address, authentication key)
+_server = None
+_server_lock = threading.Lock()
+# DataManagers a report worker has opened, kept for their rollups
+_report_managers = {}
+
+
+def shop_dirs(data_dir=None):
+    """{shop name: data directory} of every shop, the main one first
+
+    A shop is added by creating its directory, data/shops/<name>; its tables
+    are created the first time it is opened.
+    """
+    data_dir = data_dir or os.environ.get("GSMLAB_DATA_DIR", "data")
+    shops = {os.environ.get("GSMLAB_SHOP_NAME", MAIN_SHOP): data_dir}
+    root = os.path.join(data_dir, SHOPS_DIR)
+    if os.path.isdir(root):
+        for name in sorted(os.listdir(root)):
+            if not name.startswith((".", "_")) and os.path.isdir(os.path.join(root, name)):
+                shops[name] = os.path.join(root, name)
+    return shops
+
+
+def shop_of(data_manager, shops):
+    """Name of the shop whose data a DataManager works on, or None"""
+    data_dir = os.path.abspath(data_manager.data_dir)
+    return next((name for name, path in shops.items() if os.path.abspath(path) == data_dir), None)
+
+
+def report_workers():
+    """Processes the cross-shop report runs in: one per CPU, or $GSMLAB_REPORT_WORKERS"""
+    return int(os.environ.get("GSMLAB_REPORT_WORKERS", 0)) or os.cpu_count() or 1
+
+
+def report_server():
+    """(address, authentication key) of the report server, started if it isn't running"""
+    global _server
+    with _server_lock:
+        if _server is None or _server[0].poll() is not None:
+            authkey = os.urandom(32)
+            env = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')]))}
+            process = subprocess.Popen(
+                [sys.executable, "-m", "utils.report_server"],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, cwd=ROOT, env=env, text=True,
+            )
+            # The server stops when this pipe closes, with this process
+            process.stdin.write(authkey.hex() + "\n")
+            process.stdin.flush()
+            address = json.loads(process.stdout.readline())
+            _server = (process, tuple(address) if isinstance(address, list) else address, authkey)
+        return _server[1:]
+
+
+def shop_report(data_dir, backend, start, end):
+    """One shop's daily report for a date range, computed in a report worker
+
+    The shop's tables are read as they are, without the migrations the app
+    runs when it opens them, and neither they nor the saved rollup are
+    written. A shop with no tables yet has nothing to report; one with some
+    missing hasn't been opened since the app was upgraded, and fails until
+    it is. The worker keeps the shop's rollup in memory, so a shop that
+    hasn't changed by the next report is answered without reading its
+    tables. Tables read to build a rollup are let go: the worker has no
+    other use for them.
+    """
+    key = (os.path.abspath(data_dir), backend)
+    if key not in _report_managers:
+        _report_managers[key] = DataManager(data_dir, backend, migrate=False)
+    data_manager = _report_managers[key]
+    missing = [table for table in TABLES if not data_manager.storage.exists(table)]
+    if len(missing) == len(TABLES):
+        return DailyRollup().report(start, end)
+    if missing:
+        raise ValueError(f"No {', '.join(missing)} table yet: open the shop in the app once to create it")
+    report = data_manager.get_daily_report(start, end)
+    frames.invalidate()
+    return report
+
+
+def merge_reports(reports):
+    """Add up the daily reports of several shops, given as {shop name: report}
+
+    Returns a report like a single shop's, plus 'shops': the totals of each
+    shop over the range, one row per shop.
+    """
+    dailies = [report['daily'] for report in reports.values() if len(report['daily'])]
+    daily = pd.concat(dailies) if dailies else pd.DataFrame(columns=['date', *DAY_TOTALS])
+    merged = {'daily': daily.groupby('date', as_index=False, sort=True)[DAY_TOTALS].sum()}
+    for name in DAY_COUNTS:
+        counts = [report[name] for report in reports.values() if len(report[name])]
+        total = pd.concat(counts).groupby(level=0).sum() if counts else pd.Series(dtype="int64")
+        merged[name] = total.astype("int64").sort_values(ascending=False)
+    merged['shops'] = pd.DataFrame(
+        [
+            {'shop': shop, **{total: report['daily'][total].sum() for total in DAY_TOTALS}}
+            for shop, report in reports.items()
+        ],
+        columns=['shop', *DAY_TOTALS],
+    )
+    return merged
+
+
+def cross_shop_report(shops, start, end, backend=None):
+    """The daily report of every shop for a date range, computed in parallel and added up
+
+    `shops` maps names to data directories, as shop_dirs returns them. Each
+    shop is reported on by a worker process, so the whole takes about as long
+    as the slowest shop rather than the sum of them, and the server's own
+    process stays free for the pages. Returns the merged report with
+    'errors': the message of each shop that couldn't be read, whose figures
+    are left out.
+    """
+    with metrics.span("shops.report"):
+        request = (dict(shops), backend, start, end)
+        try:
+            reports, errors = ask_report_server(request)
+        except (OSError, EOFError):
+            # The server is gone, killed or crashed: start another one
+            reports, errors = ask_report_server(request)
+    merged = merge_reports(reports)
+    merged['errors'] = errors
+    return merged
+
+
+def ask_report_server(request):
+    address, authkey = report_server()
+    with Client(address, authkey=authkey) as connection:
+        connection.send(request)
+        return connection.recv()
@@ -0,0 +1,105 @@
+import threading
+import traceback
+
+import pandas as pd
+
+
+def stock_number(value):
+    """A quantity or threshold as an int, treating blanks as 0"""
+    number = pd.to_numeric(value, errors="coerce")
+    return 0 if pd.isna(number) else int(number)
+
+
+class LowStockTracker:
+    """The inventory items at or below their low stock threshold
+
+    Every item's quantity and threshold are kept, and the low ones in a dict
+    from name to quantity - threshold, so counting them is O(1) and listing
+    them only touches the low items. It changes only when a write sets an
+    item's quantity or threshold, and each time an item crosses its threshold
+    (either way) the listeners are called with an event dict.
+    """
+
+    def __init__(self, listeners=None):
+        self.items = {}
+        self.low = {}
+        self.listeners = listeners if listeners is not None else []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, df, listeners=None):
+        tracker = cls(listeners)
+        if len(df):
+            rows = zip(df['item_name'], df['quantity'].map(stock_number), df['threshold'].map(stock_number))
+            for name, quantity, threshold in rows:
+                if isinstance(name, str):
+                    tracker._set(name, quantity, threshold)
+        return tracker
+
+    def _set(self, name, quantity, threshold):
+        """Store an item's numbers and return the crossing event, if it crossed"""
+        was_low = name in self.low
+        self.items[name] = (quantity, threshold)
+        is_low = quantity <= threshold
+        if is_low:
+            self.low[name] = quantity - threshold
+        else:
+            self.low.pop(name, None)
+        if is_low != was_low:
+            return {'item_name': name, 'quantity': quantity, 'threshold': threshold, 'low': is_low}
+        return None
+
+    def _remove(self, name):
+        self.items.pop(name, None)
+        self.low.pop(name, None)
+
+    def _notify(self, events):
+        for event in events:
+            for listener in list(self.listeners):
+                try:
+                    listener(event)
+                except Exception:
+                    # A broken listener mustn't fail the write that triggered it
+                    traceback.print_exc()
+
+    def set_item(self, name, quantity=None, threshold=None):
+        """Apply a write that set an item's quantity and/or threshold"""
+        if not isinstance(name, str):
+            return
+        with self._lock:
+            old_quantity, old_threshold = self.items.get(name, (0, 0))
+            event = self._set(
+                name,
+                old_quantity if quantity is None else stock_number(quantity),
+                old_threshold if threshold is None else stock_number(threshold),
+            )
+        self._notify([event] if event else [])
+
+    def replace(self, df):
+        """Apply a write that replaced the whole inventory"""
+        names = set()
+        events = []
+        with self._lock:
+            if len(df):
+                rows = zip(df['item_name'], df['quantity'].map(stock_number), df['threshold'].map(stock_number))
+                for name, quantity, threshold in rows:
+                    if isinstance(name, str):
+                        names.add(name)
+                        event = self._set(name, quantity, threshold)
+                        if event:
+                            events.append(event)
+            for name in set(self.items) - names:
+                self._remove(name)
+        self._notify(events)
+
+    def count(self):
+        return len(self.low)
+
+    def low_stock_items(self):
+        """Low items as dicts, the furthest below their threshold first"""
+        with self._lock:
+            low = sorted(self.low.items(), key=lambda item: (item[1], item[0]))
+            return [
+                {'item_name': name, 'quantity': self.items[name][0], 'threshold': self.items[name][1]}
+                for name, _ in low
+            ]
@@ -0,0 +1,1406 @@
+import pandas as pd
+import os
+import csv
+import gzip
+import io
+import json
+import shutil
+import sqlite3
+import tempfile
+import threading
+import uuid
+from contextlib import closing
+from datetime import date, datetime
+from itertools import chain
+
+from utils.cache import frames
+from utils.metrics import metrics
+
+# Completed repair tickets, moved out of "repairs" so that it only holds the open ones
+REPAIRS_ARCHIVE = "repairs_archive"
+
+# Columns every table starts with when it is created from scratch
+TABLES = {
+    "sales": ['id', 'date', 'customer_name', 'phone', 'item', 'price', 'payment_method'],
+    "repairs": [
+        'id', 'date', 'customer_name', 'phone', 'device', 'category', 'issue', 'status',
+        'estimated_cost', 'completion_date', 'photo_path'
+    ],
+    "inventory": ['item_name', 'quantity', 'price', 'threshold'],
+}
+TABLES[REPAIRS_ARCHIVE] = TABLES["repairs"]
+
+# Column identifying each row, for tables that have one
+KEYS = {
+    "sales": 'id',
+    "repairs": 'id',
+    "inventory": 'item_name',
+    REPAIRS_ARCHIVE: 'id',
+}
+
+# Tables whose key is a generated ID, given to every row that lacks one
+GENERATED_KEYS = ("sales", "repairs", REPAIRS_ARCHIVE)
+
+# Declared type of every known column. The Parquet backend stores and loads
+# tables with these types; the CSV backend keeps the text columns as text
+SCHEMAS = {
+    "sales": {
+        'id': "string", 'date': "datetime64[ns]", 'customer_name': "string", 'phone': "string",
+        'item': "string", 'price': "float32", 'payment_method': "category",
+    },
+    "repairs": {
+        'id': "string", 'date': "datetime64[ns]", 'customer_name': "string", 'phone': "string",
+        'device': "string", 'category': "category", 'issue': "string", 'status': "category",
+        'estimated_cost': "float32", 'completion_date': "datetime64[ns]", 'photo_path': "string",
+    },
+    "inventory": {
+        'item_name': "string", 'quantity': "int64", 'price': "float32", 'threshold': "int64",
+    },
+}
+SCHEMAS[REPAIRS_ARCHIVE] = SCHEMAS["repairs"]
+
+# Columns the SQLite backend indexes for filtered queries
+INDEXES = {
+    "sales": ['date', 'phone', 'customer_name'],
+    "repairs": ['date', 'status', 'phone', 'customer_name'],
+    "inventory": ['item_name'],
+    REPAIRS_ARCHIVE: ['date', 'status', 'phone', 'customer_name'],
+}
+
+# SQLite column types; anything not listed is stored as TEXT
+SQL_TYPES = {
+    'price': "REAL",
+    'estimated_cost': "REAL",
+    'quantity': "INTEGER",
+    'threshold': "INTEGER",
+}
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Bytes kept from the end of a cached CSV to recognise a later append
+TAIL_SIGNATURE = 64
+
+# Bytes read from the end of a CSV at first to find its last rows, doubled until enough
+TAIL_BLOCK = 1 << 16
+
+# Rows parsed at a time when a table is streamed out instead of loaded whole
+CHUNK_ROWS = 50_000
+
+# Size at which a CSV update journal is folded back into its table file
+JOURNAL_COMPACT_BYTES = 1 << 20
+
+# Tables the partitioned backend splits into one file per month of their 'date'
+PARTITIONED = ("sales", "repairs", REPAIRS_ARCHIVE)
+PARTITION_FORMAT = "%Y-%m"
+# Partition holding rows without a usable date
+UNDATED = "undated"
+
+# Size at which the Parquet backend's log of new rows is folded into the table file
+PENDING_FLUSH_BYTES = 1 << 20
+
+
+# Files appended to since they were last synced to disk, flushed once per write batch
+_unsynced = set()
+
+
+def mark_unsynced(path):
+    _unsynced.add(os.path.abspath(path))
+
+
+def sync_written():
+    """fsync every file appended to since the last call, once each"""
+    while _unsynced:
+        path = _unsynced.pop()
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            continue  # Compacted away; its replacement was synced when written
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def new_id():
+    """Return a new unique row ID"""
+    return uuid.uuid4().hex[:16]
+
+
+def plain_value(value):
+    """Convert NaN, numpy scalars and timestamps into plain Python values for storage"""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, datetime):
+        # A date loaded by a typed backend, stored as the text it was recorded as
+        return value.strftime(DATE_FORMAT)
+    return value.item() if hasattr(value, "item") else value
+
+
+def date_bounds(start=None, end=None):
+    """Turn an inclusive date range into [low, high) timestamp strings"""
+    low = high = None
+    if start is not None:
+        low = pd.Timestamp(start).strftime(DATE_FORMAT)
+    if end is not None:
+        is_day = (isinstance(end, date) and not isinstance(end, datetime)) or (
+            isinstance(end, str) and len(end) == 10
+        )
+        step = pd.Timedelta(days=1) if is_day else pd.Timedelta(seconds=1)
+        high = (pd.Timestamp(end) + step).strftime(DATE_FORMAT)
+    return low, high
+
+
+def file_stat(path):
+    """(inode, mtime, size) of a file, or None if it doesn't exist"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def month_of(value):
+    """The partition a row dated `value` belongs to"""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return UNDATED
+    if isinstance(value, str):
+        return value[:7] if len(value) >= 7 and value[4] == "-" else UNDATED
+    return pd.Timestamp(value).strftime(PARTITION_FORMAT)
+
+
+def text_columns(table):
+    """Columns of a table that hold text, so CSV parsing mustn't turn them into numbers"""
+    return [c for c, dtype in SCHEMAS.get(table, {}).items() if dtype in ("string", "category")]
+
+
+def apply_schema(df, table):
+    """Cast the columns of a loaded table to their declared types"""
+    for column, dtype in SCHEMAS.get(table, {}).items():
+        if column not in df:
+            continue
+        if dtype == "category" and isinstance(df[column].dtype, pd.CategoricalDtype):
+            # Files and frames type the categories differently; keep them text either way
+            categories = df[column].cat.categories
+            if str(categories.dtype) != "string":
+                df[column] = df[column].cat.rename_categories(categories.astype("string"))
+            continue
+        if str(df[column].dtype) == dtype:
+            continue
+        values = df[column]
+        if dtype.startswith("datetime64"):
+            df[column] = pd.to_datetime(values, errors="coerce", format="ISO8601").astype(dtype)
+        elif dtype.startswith("int"):
+            df[column] = pd.to_numeric(values, errors="coerce").fillna(0).astype(dtype)
+        elif dtype.startswith("float"):
+            df[column] = pd.to_numeric(values, errors="coerce").astype(dtype)
+        else:
+            if pd.api.types.is_float_dtype(values):
+                # A numeric column read from an old CSV: 1234567890.0 is the text 1234567890
+                values = values.astype("Int64")
+            df[column] = values.astype("string").astype(dtype)
+    return df
+
+
+def concat_rows(pieces):
+    """Stack blocks of rows of one table, or return None if they are all empty
+
+    Empty blocks are left out and a column that is all NA in a block takes
+    the type it has in the others, so the result is typed by the rows that
+    hold values: what pandas did before 2.1, which warns it will stop.
+    """
+    pieces = [piece for piece in pieces if len(piece)]
+    if len(pieces) <= 1:
+        return pieces[0] if pieces else None
+    types = {}
+    for piece in pieces:
+        for column in piece.columns:
+            if column not in types and piece[column].notna().any():
+                types[column] = piece[column].dtype
+    pieces = [
+        piece.astype({
+            column: types[column] for column in piece.columns
+            if column in types and piece[column].dtype != types[column] and piece[column].isna().all()
+        })
+        for piece in pieces
+    ]
+    return pd.concat(pieces, ignore_index=True)
+
+
+def concat_typed(df, rows, table):
+    """Append new rows to a typed table without losing its column types"""
+    rows = apply_schema(rows, table)
+    for column in df.columns:
+        if column in rows and isinstance(df[column].dtype, pd.CategoricalDtype):
+            # Widen both sides to the same categories so the column stays categorical
+            missing = rows[column].astype(object).dropna().unique()
+            df[column] = df[column].cat.add_categories([v for v in missing if v not in df[column].cat.categories])
+            rows[column] = rows[column].astype(object).astype(df[column].dtype)
+    return apply_schema(pd.concat([df, rows], ignore_index=True), table)
+
+
+def project(df, columns=None):
+    """Keep only the requested columns of a table, in the order asked for"""
+    if columns is None:
+        return df
+    return df[[c for c in columns if c in df]]
+
+
+def apply_changes(df, row_index, changes):
+    """Overlay {key: {column: value}} updates onto a loaded table"""
+    columns = {}
+    for key in changes:
+        position = row_index.get(key)
+        if position is None or position >= len(df):
+            continue  # The row has been removed since the update was recorded
+        for column, value in changes[key].items():
+            columns.setdefault(column, {})[df.index[position]] = value
+
+    for column, values in columns.items():
+        current = df[column] if column in df else pd.Series(None, index=df.index, dtype=object)
+        if not pd.api.types.is_object_dtype(current):
+            # Typed columns take their declared type back through apply_schema
+            current = current.astype(object)
+        updated = pd.Series(values, dtype=object).reindex(df.index)
+        # Numbers stay numbers: an updated quantity mustn't turn the column into text
+        df[column] = current.where(~df.index.isin(list(values)), updated).infer_objects()
+    return df
+
+
+def filter_frame(df, start=None, end=None, where=None):
+    """Apply a date range and column equality filters to a loaded table"""
+    metrics.count(rows=len(df))
+    low, high = date_bounds(start, end)
+    if low is not None or high is not None:
+        dates = df['date']
+        if pd.api.types.is_datetime64_any_dtype(dates):
+            low, high = (pd.Timestamp(bound) if bound is not None else None for bound in (low, high))
+        else:
+            dates = dates.astype(str)
+        in_range = pd.Series(True, index=df.index)
+        if low is not None:
+            in_range &= dates >= low
+        if high is not None:
+            in_range &= dates < high
+        df = df[in_range]
+    for column, value in (where or {}).items():
+        if isinstance(value, (list, tuple, set)):
+            df = df[df[column].isin(list(value))]
+        else:
+            df = df[df[column] == value]
+    return df
+
+
+def frame_chunks(df, rows):
+    """Slice a frame that is in memory already into pieces of `rows` rows"""
+    for position in range(0, len(df), rows):
+        yield df.iloc[position:position + rows]
+
+
+def csv_chunks(source, dtype, rows, start=None, end=None, key=None, changes=None):
+    """Parse a CSV file `rows` rows at a time, yielding those in a date range
+
+    `changes` are journal updates {key: {column: value}}, applied to each chunk
+    before it is filtered, so only one chunk is ever held in memory.
+    """
+    with pd.read_csv(source, dtype=dtype, chunksize=rows) as reader:
+        for chunk in reader:
+            if changes and key in chunk:
+                chunk = apply_changes(chunk, dict(zip(chunk[key], range(len(chunk)))), changes)
+            chunk = filter_frame(chunk, start, end)
+            if len(chunk):
+                yield chunk
+
+
+class CsvStorage:
+    """One CSV file per table inside the data directory
+
+    With `partition_of` set, every file in the directory is instead one
+    partition of that table, and takes its key and column types.
+    """
+
+    name = "csv"
+
+    def __init__(self, data_dir, partition_of=None):
+        self.data_dir = data_dir
+        self.partition_of = partition_of
+        self.identity = ("csv", os.path.abspath(data_dir))
+        # Header of each CSV file, read once and reused for every append
+        self._columns = {}
+
+    def kind(self, table):
+        """The table whose key and schema apply to a file of this storage"""
+        return self.partition_of or table
+
+    def path(self, table):
+        return f"{self.data_dir}/{table}.csv"
+
+    def journal_path(self, table):
+        return f"{self.data_dir}/{table}.journal.jsonl"
+
+    def exists(self, table):
+        return os.path.exists(self.path(table))
+
+    def ensure_table(self, table, columns):
+        if not os.path.exists(self.path(table)):
+            pd.DataFrame(columns=columns).to_csv(self.path(table), index=False)
+        # Reading the header is enough to spot a table from before IDs; rows
+        # missing one in a table that has the column are found by backfill_keys
+        if self.kind(table) in GENERATED_KEYS and KEYS[self.kind(table)] not in self.columns(table):
+            self.backfill_keys(table)
+
+    def backfill_keys(self, table):
+        """Give every row without one a stable ID, rewriting the table once"""
+        key = KEYS[self.kind(table)]
+        df = self.read(table)
+        if key in df and not df[key].isna().any():
+            return
+        if key not in df:
+            df.insert(0, key, None)
+        missing = df[key].isna()
+        df.loc[missing, key] = [new_id() for _ in range(missing.sum())]
+        self.write(table, df)
+
+    def columns(self, table):
+        """Return the header of a table, reading it again only if the file was replaced"""
+        with open(self.path(table), newline="") as f:
+            inode = os.fstat(f.fileno()).st_ino
+            cached = self._columns.get(table)
+            if cached is None or cached[0] != inode:
+                # Another process may have rewritten the table with new columns
+                cached = self._columns[table] = (inode, next(csv.reader(f), []))
+        return cached[1]
+
+    def cache_key(self, table):
+        return ("csv", os.path.abspath(self.path(table)))
+
+    def file_version(self, table):
+        """Token that changes whenever the table file is appended to or replaced"""
+        st = os.stat(self.path(table))
+        return (st.st_ino, st.st_mtime_ns, st.st_size, frames.generation(self.cache_key(table)))
+
+    def version(self, table):
+        """Token that changes whenever anything in the table does"""
+        return (self.file_version(table), self.journal_version(table))
+
+    def stamp(self, table):
+        """Like version, but without this process's write counters, so it can be saved to disk"""
+        file_version, journal_version = self.version(table)
+        return (file_version[:3], journal_version[:3] if journal_version is not None else None)
+
+    def journal_version(self, table):
+        try:
+            st = os.stat(self.journal_path(table))
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size, frames.generation(self.cache_key(table) + ("journal",)))
+
+    def _table(self, table):
+        """Return the cached table with its journal applied, plus its key index"""
+        key, version = self.cache_key(table), self.file_version(table)
+        df, meta = frames.lookup(key, version, lambda previous: self._load(table, previous))
+
+        journal_version = self.journal_version(table)
+        if journal_version is not None:
+            # Row updates recorded since the last compaction, applied on top of the file
+            df = frames.get(
+                key + ("journal",), (version, journal_version),
+                lambda previous: (self._apply_journal(table, df, meta['index']), None),
+            )
+        return df, meta['index']
+
+    def read(self, table, start=None, end=None, where=None, columns=None):
+        df = self._table(table)[0]
+        if start is not None or end is not None or where:
+            df = filter_frame(df, start, end, where)
+        return project(df, columns)
+
+    def get_row(self, table, key):
+        """Look one row up by its ID through the in-memory hash index"""
+        df, row_index = self._table(table)
+        position = row_index.get(key)
+        return df.iloc[position] if position is not None and position < len(df) else None
+
+    def get_rows(self, table, keys):
+        """Look several rows up by ID, skipping IDs that no longer exist"""
+        df, row_index = self._table(table)
+        positions = [row_index[key] for key in keys if row_index.get(key, len(df)) < len(df)]
+        return df.iloc[positions]
+
+    def tail(self, table, n, columns=None):
+        """The last `n` rows of a table, in the order they were added
+
+        Served from the cached frame if the table is loaded already; otherwise
+        only the end of the file is parsed, with the journal applied on top.
+        """
+        key = KEYS.get(self.kind(table))
+        df = None
+        if frames.peek(self.cache_key(table), self.file_version(table)) is None:
+            df = self._read_tail(table, n)
+        if df is None:
+            return project(self.read(table).tail(n), columns)
+        if self.journal_version(table) is not None and key in df:
+            df = self._apply_journal(table, df, dict(zip(df[key], range(len(df)))))
+        return project(df, columns)
+
+    def chunks(self, table, start=None, end=None, rows=CHUNK_ROWS):
+        """Yield the rows of a table in a date range, `rows` at a time, in the order they were added
+
+        A table that is cached already is sliced; otherwise the file is parsed
+        a chunk at a time with the journal applied to each, so a table of any
+        size streams out in constant memory.
+        """
+        if frames.peek(self.cache_key(table), self.file_version(table)) is not None:
+            yield from frame_chunks(self.read(table, start, end), rows)
+            return
+        changes = self._journal_changes(table)
+        with open(self.path(table), "rb") as f:
+            # The open file stays whole even if a rewrite replaces it meanwhile
+            yield from csv_chunks(f, self._dtypes(table), rows, start, end, KEYS.get(self.kind(table)), changes)
+
+    def _read_tail(self, table, n):
+        """Parse only the last `n` rows of a table file, or None if it is small enough to read whole"""
+        names = self.columns(table)
+        with open(self.path(table), "rb") as f:
+            size = f.seek(0, os.SEEK_END)
+            block = TAIL_BLOCK
+            while size > block:
+                f.seek(size - block)
+                data = f.read(block)
+                metrics.count(bytes_read=block)
+                # Start after a line break outside quotes: a valid file ends outside
+                # them, so from there on the quotes must pair up
+                position = data.find(b"\n") + 1
+                quotes = data.count(b'"', position)
+                while position and quotes % 2:
+                    end = data.find(b"\n", position) + 1
+                    quotes -= data.count(b'"', position, end or len(data))
+                    position = end
+                if position:
+                    df = pd.read_csv(io.BytesIO(data[position:]), header=None, names=names, dtype=self._dtypes(table))
+                    if len(df) >= n:
+                        return df.tail(n).reset_index(drop=True)
+                block *= 2
+        return None
+
+    def _dtypes(self, table):
+        # Keep IDs, phones and labels as text: a phone of 0123 must not become 123
+        return {column: str for column in text_columns(self.kind(table))} or None
+
+    def _load(self, table, previous):
+        """Parse a table file, reading only the new rows if it was appended to
+
+        Alongside the frame it keeps where the parse stopped and a hash index
+        from row ID to position, which an append extends instead of rebuilding.
+        """
+        key = KEYS.get(self.kind(table))
+        with metrics.span("csv.parse"), open(self.path(table), "rb") as f:
+            inode = os.fstat(f.fileno()).st_ino
+            df = None
+            if previous is not None:
+                old_df, old = previous[1], previous[2]
+                f.seek(max(0, old['size'] - len(old['tail'])))
+                # Files are only ever appended to in place or replaced by a new
+                # inode, so an unchanged inode and tail means the old rows still hold
+                if inode == old['inode'] and f.read(len(old['tail'])) == old['tail']:
+                    df, row_index = old_df, old['index']
+                    if os.fstat(f.fileno()).st_size > f.tell():
+                        parsed_from = f.tell()
+                        new_rows = pd.read_csv(f, header=None, names=list(old_df.columns), dtype=self._dtypes(table))
+                        metrics.count(bytes_read=os.fstat(f.fileno()).st_size - parsed_from, rows=len(new_rows))
+                        df = concat_rows([old_df, new_rows])
+                        if df is None:
+                            df = old_df
+                        if key in df:
+                            # Extended in place: positions past the end of an
+                            # older frame are ignored by get_row
+                            row_index.update(zip(new_rows[key], range(len(old_df), len(df))))
+            if df is None:
+                f.seek(0)
+                df = pd.read_csv(f, dtype=self._dtypes(table))
+                metrics.count(bytes_read=os.fstat(f.fileno()).st_size, rows=len(df))
+                row_index = dict(zip(df[key], range(len(df)))) if key in df else {}
+
+            size = f.tell()
+            f.seek(max(0, size - TAIL_SIGNATURE))
+            tail = f.read(size - f.tell())
+        return df, {'inode': inode, 'size': size, 'tail': tail, 'index': row_index}
+
+    def append(self, table, row):
+        """Append one record to the end of a table without rewriting it"""
+        columns = self.columns(table)
+
+        if not set(row).issubset(columns):
+            # A new column changes the header, so rewrite the file once
+            self.write(table, concat_rows([self.read(table), pd.DataFrame([row])]))
+            return
+
+        values = []
+        for column in columns:
+            value = row.get(column)
+            values.append("" if value is None or pd.isna(value) else value)
+
+        line = io.StringIO()
+        csv.writer(line, lineterminator="\n").writerow(values)
+
+        with open(self.path(table), "ab+") as f:
+            # Make sure a hand-edited file without a final newline stays valid
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) not in (b"\n", b"\r"):
+                    f.write(b"\n")
+            f.write(line.getvalue().encode())
+        metrics.count(bytes_written=len(line.getvalue()))
+        mark_unsynced(self.path(table))
+        frames.bump(self.cache_key(table))
+
+    def _journal_changes(self, table):
+        """The journal's updates as {key: {column: value}}, latest value of each field"""
+        changes = {}
+        try:
+            with open(self.journal_path(table)) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        changes.setdefault(entry['key'], {}).update(entry['changes'])
+        except FileNotFoundError:
+            pass  # Compacted away, or never written to
+        return changes
+
+    def _apply_journal(self, table, df, row_index):
+        return apply_changes(df, row_index, self._journal_changes(table))
+
+    def update_row(self, table, key, changes):
+        """Change some fields of one row by appending them to the table's journal"""
+        entry = {'key': key, 'changes': {c: plain_value(v) for c, v in changes.items()}}
+        line = json.dumps(entry) + "\n"
+        with open(self.journal_path(table), "a") as f:
+            f.write(line)
+            size = f.tell()
+        metrics.count(bytes_written=len(line))
+        mark_unsynced(self.journal_path(table))
+        frames.bump(self.cache_key(table) + ("journal",))
+        if size >= JOURNAL_COMPACT_BYTES:
+            self.compact(table)
+
+    def delete_row(self, table, key):
+        """Remove one row, rewriting the table without it"""
+        df = self.read(table)
+        self.write(table, df[df[KEYS[self.kind(table)]] != key])
+
+    def compact(self, table):
+        """Fold the update journal back into the table file"""
+        if self.journal_version(table) is None:
+            return
+        self.write(table, self.read(table))
+
+    def write(self, table, df):
+        """Replace the whole table"""
+        # Write a new file and swap it in, so readers never see a half-written
+        # table and the cache can tell a rewrite from an append by its inode
+        fd, tmp_path = tempfile.mkstemp(dir=self.data_dir, prefix=f".{table}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", newline="") as f:
+                df.to_csv(f, index=False)
+                # On disk before the rename, so a crash leaves the old or the new table
+                f.flush()
+                os.fsync(f.fileno())
+                metrics.count(bytes_written=f.tell(), rows=len(df))
+            os.replace(tmp_path, self.path(table))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        frames.bump(self.cache_key(table))
+        if os.path.exists(self.journal_path(table)):
+            # Updates recorded against the old file are part of `df` or replaced by it
+            os.remove(self.journal_path(table))
+            frames.bump(self.cache_key(table) + ("journal",))
+
+
+class SqliteStorage:
+    """All tables in one SQLite database with indexes on the filtered columns"""
+
+    name = "sqlite"
+
+    def __init__(self, data_dir, filename="gsmlab.db"):
+        self.data_dir = data_dir
+        self.db_path = os.path.join(data_dir, filename)
+        self.identity = ("sqlite", os.path.abspath(self.db_path))
+        self._local = threading.local()
+
+    def open(self):
+        """A new connection to the database"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def connect(self):
+        """This thread's connection, opened on first use and kept until the thread ends
+
+        A write commits when its `with conn:` block ends, so a kept connection
+        sees other processes' writes like a new one would.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self.open()
+        return conn
+
+    def columns(self, table):
+        return [row[1] for row in self.connect().execute(f'PRAGMA table_info("{table}")')]
+
+    def exists(self, table):
+        # Connecting would create the database file
+        if not os.path.exists(self.db_path):
+            return False
+        return self.connect().execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone() is not None
+
+    def ensure_table(self, table, columns):
+        with self.connect() as conn:
+            self._ensure_versions(conn, table)
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+            ).fetchone()
+            if not exists:
+                definition = ", ".join(f'"{c}" {SQL_TYPES.get(c, "TEXT")}' for c in columns)
+                conn.execute(f'CREATE TABLE "{table}" ({definition})')
+                for column in INDEXES.get(table, []):
+                    if column in columns:
+                        conn.execute(f'CREATE INDEX "idx_{table}_{column}" ON "{table}" ("{column}")')
+
+                # One-shot migration of the CSV file this table used to live in
+                csv = CsvStorage(self.data_dir)
+                if os.path.exists(csv.path(table)):
+                    df = csv.read(table)
+                    self._add_columns(conn, table, df.columns)
+                    df.to_sql(table, conn, if_exists="append", index=False)
+            self._ensure_triggers(conn, table)
+
+            if table in GENERATED_KEYS:
+                key = KEYS[table]
+                self._add_columns(conn, table, [key])
+                conn.execute(f'UPDATE "{table}" SET "{key}" = lower(hex(randomblob(8))) WHERE "{key}" IS NULL')
+                conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS "idx_{table}_{key}" ON "{table}" ("{key}")')
+
+    def _ensure_versions(self, conn, table):
+        conn.execute("CREATE TABLE IF NOT EXISTS _versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO _versions (name, version) VALUES (?, 0)", (table,))
+
+    def _ensure_triggers(self, conn, table):
+        """Count every change to a table, whichever process or connection made it"""
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            conn.execute(
+                f'CREATE TRIGGER IF NOT EXISTS "{table}_{event.lower()}_version" AFTER {event} ON "{table}" '
+                f"BEGIN UPDATE _versions SET version = version + 1 WHERE name = '{table}'; END"
+            )
+
+    def cache_key(self, table):
+        return ("sqlite", os.path.abspath(self.db_path), table)
+
+    def version(self, table):
+        row = self.connect().execute("SELECT version FROM _versions WHERE name = ?", (table,)).fetchone()
+        return (row[0] if row else 0, frames.generation(self.cache_key(table)))
+
+    def stamp(self, table):
+        """Like version, but without this process's write counters, so it can be saved to disk"""
+        return self.version(table)[0]
+
+    def _add_columns(self, conn, table, columns):
+        existing = [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+        for column in columns:
+            if column not in existing:
+                conn.execute(f'ALTER TABLE "{table}" ADD COLUMN "{column}" {SQL_TYPES.get(column, "TEXT")}')
+
+    def read(self, table, start=None, end=None, where=None, columns=None):
+        if start is None and end is None and not where:
+            # Whole-table reads are shared through the process-wide cache
+            df = frames.get(self.cache_key(table), self.version(table), lambda previous: (self._query(table), None))
+            return project(df, columns)
+        return self._query(table, start, end, where, columns)
+
+    def _select(self, table, start=None, end=None, where=None, columns=None):
+        """The SELECT statement and parameters of a filtered read, in insertion order"""
+        clauses, params = [], []
+        low, high = date_bounds(start, end)
+        if low is not None:
+            clauses.append('"date" >= ?')
+            params.append(low)
+        if high is not None:
+            clauses.append('"date" < ?')
+            params.append(high)
+        for column, value in (where or {}).items():
+            if isinstance(value, (list, tuple, set)):
+                value = list(value)
+                clauses.append(f'"{column}" IN ({", ".join("?" * len(value))})')
+                params.extend(value)
+            else:
+                clauses.append(f'"{column}" = ?')
+                params.append(value)
+
+        selected = ", ".join(f'"{c}"' for c in columns if c in self.columns(table)) if columns else "*"
+        query = f'SELECT {selected} FROM "{table}"'
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY rowid"
+        return query, params
+
+    def _query(self, table, start=None, end=None, where=None, columns=None):
+        query, params = self._select(table, start, end, where, columns)
+        with metrics.span("sqlite.query"):
+            df = pd.read_sql_query(query, self.connect(), params=params)
+            metrics.count(rows=len(df))
+        return df
+
+    def tail(self, table, n, columns=None):
+        """The last `n` rows of a table, in the order they were added"""
+        selected = ", ".join(f'"{c}"' for c in columns if c in self.columns(table)) if columns else "*"
+        query = f'SELECT {selected} FROM "{table}" ORDER BY rowid DESC LIMIT ?'
+        df = pd.read_sql_query(query, self.connect(), params=[n])
+        return df.iloc[::-1].reset_index(drop=True)
+
+    def chunks(self, table, start=None, end=None, rows=CHUNK_ROWS):
+        """Yield the rows of a table in a date range, `rows` at a time, in the order they were added"""
+        query, params = self._select(table, start, end)
+        # A connection of its own: the generator may be resumed on another thread
+        with closing(self.open()) as conn:
+            for chunk in pd.read_sql_query(query, conn, params=params, chunksize=rows):
+                metrics.count(rows=len(chunk))
+                if len(chunk):
+                    yield chunk
+
+    def append(self, table, row):
+        row = {k: plain_value(v) for k, v in row.items()}
+        with self.connect() as conn:
+            self._add_columns(conn, table, row)
+            names = ", ".join(f'"{c}"' for c in row)
+            conn.execute(
+                f'INSERT INTO "{table}" ({names}) VALUES ({", ".join("?" * len(row))})',
+                list(row.values()),
+            )
+
+    def get_row(self, table, key):
+        """Look one row up by its ID through the unique index"""
+        # Fetched as a tuple: a one-row frame costs more to build than the lookup
+        cursor = self.connect().execute(f'SELECT * FROM "{table}" WHERE "{KEYS[table]}" = ?', (key,))
+        row = cursor.fetchone()
+        return pd.Series(row, index=[column[0] for column in cursor.description]) if row is not None else None
+
+    def get_rows(self, table, keys):
+        """Look several rows up by ID, skipping IDs that no longer exist"""
+        keys = list(keys)
+        chunks = [self._query(table, where={KEYS[table]: keys[i:i + 500]}) for i in range(0, len(keys), 500)]
+        df = concat_rows(chunks)
+        return df if df is not None else self._query(table, where={KEYS[table]: []})
+
+    def update_row(self, table, key, changes):
+        """Change some fields of one row in place through the key index"""
+        with self.connect() as conn:
+            self._add_columns(conn, table, changes)
+            assignments = ", ".join(f'"{c}" = ?' for c in changes)
+            conn.execute(
+                f'UPDATE "{table}" SET {assignments} WHERE "{KEYS[table]}" = ?',
+                [*(plain_value(v) for v in changes.values()), key],
+            )
+
+    def delete_row(self, table, key):
+        """Remove one row through the key index"""
+        with self.connect() as conn:
+            conn.execute(f'DELETE FROM "{table}" WHERE "{KEYS[table]}" = ?', (key,))
+
+    def compact(self, table):
+        """Nothing to fold back: SQLite applies updates in place"""
+
+    def write(self, table, df):
+        """Replace the whole table"""
+        with self.connect() as conn:
+            self._add_columns(conn, table, df.columns)
+            conn.execute(f'DELETE FROM "{table}"')
+            df.to_sql(table, conn, if_exists="append", index=False)
+
+
+class ParquetStorage:
+    """Typed, columnar tables: one Parquet file per table plus small row logs
+
+    Columns are stored with the types declared in SCHEMAS, so dates load as
+    datetimes, phones as text and labels as categories, and a read can ask for
+    just the columns it needs. New rows are appended to a pending log that is
+    folded into the Parquet file once it reaches PENDING_FLUSH_BYTES, and row
+    updates go to a journal as in the CSV backend.
+    """
+
+    name = "parquet"
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.identity = ("parquet", os.path.abspath(data_dir))
+
+    def path(self, table):
+        return os.path.join(self.data_dir, f"{table}.parquet")
+
+    def pending_path(self, table):
+        return os.path.join(self.data_dir, f"{table}.parquet.pending.jsonl")
+
+    def journal_path(self, table):
+        return os.path.join(self.data_dir, f"{table}.parquet.journal.jsonl")
+
+    def exists(self, table):
+        return os.path.exists(self.path(table))
+
+    def ensure_table(self, table, columns):
+        if os.path.exists(self.path(table)):
+            return
+        # One-shot migration of the CSV file this table used to live in
+        csv = CsvStorage(self.data_dir)
+        if os.path.exists(csv.path(table)):
+            if table in GENERATED_KEYS:
+                csv.backfill_keys(table)
+            df = csv.read(table)
+        else:
+            df = pd.DataFrame(columns=columns)
+        self.write(table, df)
+
+    def columns(self, table):
+        return list(self._table(table)[0].columns)
+
+    def cache_key(self, table):
+        return ("parquet", os.path.abspath(self.path(table)))
+
+    def version(self, table):
+        return (
+            file_stat(self.path(table)), file_stat(self.pending_path(table)), file_stat(self.journal_path(table)),
+            frames.generation(self.cache_key(table)),
+        )
+
+    def stamp(self, table):
+        """Like version, but without this process's write counters, so it can be saved to disk"""
+        return self.version(table)[:3]
+
+    def _read_log(self, path, offset=0):
+        """Parse the JSON lines of a row log from `offset`, returning them and the end offset"""
+        records = []
+        try:
+            with open(path) as f:
+                f.seek(offset)
+                for line in f:
+                    if line.strip():
+                        records.append(json.loads(line))
+                offset = f.tell()
+        except FileNotFoundError:
+            pass
+        return records, offset
+
+    def _journal_changes(self, table, columns=None):
+        """The journal's updates to `columns` as {key: {column: value}}, latest value of each field"""
+        changes = {}
+        for entry in self._read_log(self.journal_path(table))[0]:
+            changes.setdefault(entry['key'], {}).update(
+                (c, v) for c, v in entry['changes'].items() if columns is None or c in columns
+            )
+        return changes
+
+    def _load(self, table, columns=None, previous=None):
+        """Read the Parquet file, the pending rows and the journal into a typed frame
+
+        A full-table load whose file and journal are unchanged since `previous`
+        only parses the rows appended to the pending log since then.
+        """
+        key = KEYS.get(table)
+        base, journal = file_stat(self.path(table)), file_stat(self.journal_path(table))
+        if columns is not None and journal is not None and key is not None:
+            columns = list(dict.fromkeys([*columns, key]))  # Needed to apply the journal
+
+        if previous is not None and columns is None:
+            old_df, old = previous[1], previous[2]
+            if old['base'] == base and old['journal'] == journal:
+                rows, offset = self._read_log(self.pending_path(table), old['offset'])
+                if offset >= old['offset']:
+                    df, row_index = old_df, old['index']
+                    if rows:
+                        df = concat_typed(old_df, pd.DataFrame(rows), table)
+                        if key in df:
+                            row_index.update(zip(df[key].iloc[len(old_df):], range(len(old_df), len(df))))
+                    return df, {'base': base, 'journal': journal, 'offset': offset, 'index': row_index}
+
+        with metrics.span("parquet.load"):
+            df = pd.read_parquet(self.path(table), columns=columns)
+            metrics.count(bytes_read=os.path.getsize(self.path(table)), rows=len(df))
+        rows, offset = self._read_log(self.pending_path(table))
+        if rows:
+            df = concat_typed(df, project(pd.DataFrame(rows), columns), table)
+        row_index = dict(zip(df[key], range(len(df)))) if key in df else {}
+
+        changes = self._journal_changes(table, columns)
+        if changes:
+            df = apply_changes(df, row_index, changes)
+        return apply_schema(df, table), {'base': base, 'journal': journal, 'offset': offset, 'index': row_index}
+
+    def _table(self, table):
+        df, meta = frames.lookup(
+            self.cache_key(table), self.version(table), lambda previous: self._load(table, previous=previous)
+        )
+        return df, meta['index']
+
+    def read(self, table, start=None, end=None, where=None, columns=None):
+        if columns is None:
+            df = self._table(table)[0]
+        else:
+            # Only the requested columns (and those filtered on) are parsed
+            needed = [*columns, *(['date'] if start is not None or end is not None else []), *(where or {})]
+            needed = list(dict.fromkeys(needed))
+            df = frames.get(
+                self.cache_key(table) + tuple(needed), self.version(table),
+                lambda previous: self._load(table, needed),
+            )
+        if start is not None or end is not None or where:
+            df = filter_frame(df, start, end, where)
+        return project(df, columns)
+
+    def tail(self, table, n, columns=None):
+        """The last `n` rows of a table, in the order they were added
+
+        Parquet is columnar, so this loads only the requested columns rather
+        than seeking to the end of the file.
+        """
+        return self.read(table, columns=columns).tail(n).reset_index(drop=True)
+
+    def chunks(self, table, start=None, end=None, rows=CHUNK_ROWS):
+        """Yield the rows of a table in a date range, `rows` at a time, in the order they were added
+
+        A table that is cached already is sliced; otherwise the Parquet file is
+        read a batch at a time and the pending rows follow, with the journal
+        applied to each chunk.
+        """
+        if frames.peek(self.cache_key(table), self.version(table)) is not None:
+            yield from frame_chunks(self.read(table, start, end), rows)
+            return
+        import pyarrow.parquet as pq
+
+        key = KEYS.get(table)
+        changes = self._journal_changes(table)
+        with open(self.path(table), "rb") as f:
+            parquet = pq.ParquetFile(f)
+            pending = pd.DataFrame(self._read_log(self.pending_path(table))[0])
+            # Logged records list their fields in whatever order they were given
+            pending = pending.reindex(columns=list(dict.fromkeys([*parquet.schema_arrow.names, *pending.columns])))
+            batches = (batch.to_pandas() for batch in parquet.iter_batches(batch_size=rows))
+            for chunk in chain(batches, frame_chunks(pending, rows)):
+                metrics.count(rows=len(chunk))
+                if changes and key in chunk:
+                    chunk = apply_changes(chunk, dict(zip(chunk[key], range(len(chunk)))), changes)
+                chunk = filter_frame(apply_schema(chunk, table), start, end)
+                if len(chunk):
+                    yield chunk
+
+    def get_row(self, table, key):
+        """Look one row up by its ID through the in-memory hash index"""
+        df, row_index = self._table(table)
+        position = row_index.get(key)
+        return df.iloc[position] if position is not None and position < len(df) else None
+
+    def get_rows(self, table, keys):
+        """Look several rows up by ID, skipping IDs that no longer exist"""
+        df, row_index = self._table(table)
+        positions = [row_index[key] for key in keys if row_index.get(key, len(df)) < len(df)]
+        return df.iloc[positions]
+
+    def _log(self, path, record):
+        line = json.dumps(record) + "\n"
+        with open(path, "a") as f:
+            f.write(line)
+            size = f.tell()
+        metrics.count(bytes_written=len(line))
+        mark_unsynced(path)
+        return size
+
+    def append(self, table, row):
+        """Add one record to the pending log, folding it into the file when it is full"""
+        size = self._log(self.pending_path(table), {c: plain_value(v) for c, v in row.items()})
+        frames.bump(self.cache_key(table))
+        if size >= PENDING_FLUSH_BYTES:
+            self.compact(table)
+
+    def update_row(self, table, key, changes):
+        """Change some fields of one row by appending them to the table's journal"""
+        entry = {'key': key, 'changes': {c: plain_value(v) for c, v in changes.items()}}
+        size = self._log(self.journal_path(table), entry)
+        frames.bump(self.cache_key(table))
+        if size >= JOURNAL_COMPACT_BYTES:
+            self.compact(table)
+
+    def delete_row(self, table, key):
+        """Remove one row, rewriting the table file without it"""
+        df = self.read(table)
+        self.write(table, df[df[KEYS[table]] != key])
+
+    def compact(self, table):
+        """Fold the pending rows and the update journal into the Parquet file"""
+        if file_stat(self.pending_path(table)) is None and file_stat(self.journal_path(table)) is None:
+            return
+        self.write(table, self.read(table))
+
+    def write(self, table, df):
+        """Replace the whole table"""
+        df = apply_schema(df.copy(), table)
+        fd, tmp_path = tempfile.mkstemp(dir=self.data_dir, prefix=f".{table}.", suffix=".tmp")
+        os.close(fd)
+        try:
+            df.to_parquet(tmp_path, index=False)
+            metrics.count(bytes_written=os.path.getsize(tmp_path), rows=len(df))
+            with open(tmp_path, "rb") as f:
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path(table))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        for path in (self.pending_path(table), self.journal_path(table)):
+            if os.path.exists(path):
+                os.remove(path)
+        frames.bump(self.cache_key(table))
+        # The frame just written is the table now, so the next read needn't parse it again
+        version = self.version(table)
+        if version[1] is None and version[2] is None:
+            key = KEYS.get(table)
+            row_index = dict(zip(df[key], range(len(df)))) if key in df else {}
+            frames.put(self.cache_key(table), version, df, {'base': version[0], 'journal': None, 'offset': 0, 'index': row_index})
+
+
+class PartitionedStorage:
+    """Sales and repairs split into one CSV file per month; other tables as plain CSV
+
+    <data_dir>/<table>/<YYYY-MM>.csv holds the rows dated in that month and
+    <data_dir>/<table>/manifest.json lists the partitions. A date range query
+    only opens the partitions it overlaps, so today's sales cost the same
+    however many years of history the shop has. Each partition is a CsvStorage
+    file with its own cache, append path and update journal. Months that are
+    no longer written to can be archived to gzip files, which are still read
+    but are unpacked again before anything in them changes.
+    """
+
+    name = "partitioned"
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.identity = ("partitioned", os.path.abspath(data_dir))
+        self.plain = CsvStorage(data_dir)
+        self.parts = {table: CsvStorage(os.path.join(data_dir, table), partition_of=table) for table in PARTITIONED}
+        self._manifests = {}
+
+    def manifest_path(self, table):
+        return os.path.join(self.data_dir, table, "manifest.json")
+
+    def archive_path(self, table, month):
+        return os.path.join(self.data_dir, table, f"{month}.csv.gz")
+
+    def manifest(self, table):
+        """{month: {'archived': bool}} for every partition of a table"""
+        stat = file_stat(self.manifest_path(table))
+        cached = self._manifests.get(table)
+        if cached is None or cached[0] != stat:
+            partitions = {}
+            if stat is not None:
+                with open(self.manifest_path(table)) as f:
+                    partitions = json.load(f)['partitions']
+            cached = self._manifests[table] = (stat, partitions)
+        return dict(cached[1])
+
+    def _save_manifest(self, table, partitions):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.data_dir, table), prefix=".manifest.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({'partitions': dict(sorted(partitions.items()))}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.manifest_path(table))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def partitions(self, table, start=None, end=None):
+        """Months of a table that overlap an inclusive date range, oldest first"""
+        months = sorted(self.manifest(table))
+        if start is not None:
+            low = pd.Timestamp(start).strftime(PARTITION_FORMAT)
+            months = [month for month in months if month >= low]
+        if end is not None:
+            high = pd.Timestamp(end).strftime(PARTITION_FORMAT)
+            months = [month for month in months if month <= high]
+        return months
+
+    def exists(self, table):
+        if table not in PARTITIONED:
+            return self.plain.exists(table)
+        return os.path.exists(self.manifest_path(table))
+
+    def ensure_table(self, table, columns):
+        if table not in PARTITIONED:
+            return self.plain.ensure_table(table, columns)
+        if os.path.exists(self.manifest_path(table)):
+            return
+        os.makedirs(os.path.join(self.data_dir, table), exist_ok=True)
+        # One-shot migration of the CSV file this table used to live in
+        df = pd.DataFrame(columns=columns)
+        if os.path.exists(self.plain.path(table)):
+            if table in GENERATED_KEYS:
+                self.plain.backfill_keys(table)
+            df = self.plain.read(table)
+        self.write(table, df)
+
+    def columns(self, table):
+        if table not in PARTITIONED:
+            return self.plain.columns(table)
+        months = [m for m, info in self.manifest(table).items() if not info['archived']]
+        return self.parts[table].columns(max(months)) if months else TABLES[table]
+
+    def cache_key(self, table):
+        return ("partitioned", os.path.abspath(os.path.join(self.data_dir, table)))
+
+    def _partition_version(self, table, month, archived):
+        if archived:
+            return file_stat(self.archive_path(table, month))
+        return self.parts[table].version(month)
+
+    def version(self, table):
+        if table not in PARTITIONED:
+            return self.plain.version(table)
+        return tuple(
+            (month, self._partition_version(table, month, info['archived']))
+            for month, info in sorted(self.manifest(table).items())
+        )
+
+    def stamp(self, table):
+        """Like version, but without this process's write counters, so it can be saved to disk"""
+        if table not in PARTITIONED:
+            return self.plain.stamp(table)
+        return tuple(
+            (month, file_stat(self.archive_path(table, month)) if info['archived'] else self.parts[table].stamp(month))
+            for month, info in sorted(self.manifest(table).items())
+        )
+
+    def _archived(self, table, month):
+        path = self.archive_path(table, month)
+        return frames.get(
+            ("csv", os.path.abspath(path)), file_stat(path),
+            lambda previous: (self._read_archive(table, month), None),
+        )
+
+    def _read_archive(self, table, month):
+        path = self.archive_path(table, month)
+        with metrics.span("csv.parse_archive"):
+            df = pd.read_csv(path, dtype=self.parts[table]._dtypes(month))
+            metrics.count(bytes_read=os.path.getsize(path), rows=len(df))
+        return df
+
+    def _read_partition(self, table, month, archived, start=None, end=None, where=None, columns=None):
+        if not archived:
+            return self.parts[table].read(month, start, end, where, columns)
+        df = self._archived(table, month)
+        if start is not None or end is not None or where:
+            df = filter_frame(df, start, end, where)
+        return project(df, columns)
+
+    def _concat(self, pieces, table, columns=None):
+        df = concat_rows(pieces)
+        if df is not None:
+            return df
+        if pieces:
+            return pieces[0]
+        return project(pd.DataFrame(columns=TABLES[table]), columns)
+
+    def read(self, table, start=None, end=None, where=None, columns=None):
+        if table not in PARTITIONED:
+            return self.plain.read(table, start, end, where, columns)
+        partitions = self.manifest(table)
+        if start is None and end is None and not where:
+            # The whole table is stitched together once per change and shared
+            df = frames.get(
+                self.cache_key(table), self.version(table),
+                lambda previous: (self._concat(
+                    [self._read_partition(table, m, partitions[m]['archived']) for m in sorted(partitions)], table
+                ), None),
+            )
+            return project(df, columns)
+        # Only the partitions overlapping the range are opened
+        return self._concat([
+            self._read_partition(table, month, partitions[month]['archived'], start, end, where, columns)
+            for month in self.partitions(table, start, end)
+        ], table, columns)
+
+    def tail(self, table, n, columns=None):
+        """The last `n` rows of a table, reading back from the newest month until there are enough"""
+        if table not in PARTITIONED:
+            return self.plain.tail(table, n, columns)
+        partitions = self.manifest(table)
+        months = sorted((month for month in partitions if month != UNDATED), reverse=True)
+        if UNDATED in partitions:
+            # Rows without a date can't be placed in time, so they count as the oldest
+            months.append(UNDATED)
+        pieces, found = [], 0
+        for month in months:
+            if partitions[month]['archived']:
+                piece = project(self._archived(table, month).tail(n - found), columns)
+            else:
+                piece = self.parts[table].tail(month, n - found, columns)
+            pieces.insert(0, piece)
+            found += len(piece)
+            if found >= n:
+                break
+        return self._concat(pieces, table, columns).reset_index(drop=True)
+
+    def chunks(self, table, start=None, end=None, rows=CHUNK_ROWS):
+        """Yield the rows of a table in a date range, `rows` at a time, one partition after another"""
+        if table not in PARTITIONED:
+            yield from self.plain.chunks(table, start, end, rows)
+            return
+        partitions = self.manifest(table)
+        for month in self.partitions(table, start, end):
+            if partitions[month]['archived']:
+                dtype = self.parts[table]._dtypes(month)
+                yield from csv_chunks(self.archive_path(table, month), dtype, rows, start, end)
+            else:
+                yield from self.parts[table].chunks(month, start, end, rows)
+
+    def _locate(self, table, key):
+        """The partition holding a row, searching the newest months first"""
+        for month, info in sorted(self.manifest(table).items(), reverse=True):
+            if info['archived']:
+                df = self._archived(table, month)
+                if (df[KEYS[table]] == key).any():
+                    return month, info
+            elif self.parts[table].get_row(month, key) is not None:
+                return month, info
+        return None, None
+
+    def get_row(self, table, key):
+        """Look one row up by its ID, starting from the most recent partition"""
+        if table not in PARTITIONED:
+            return self.plain.get_row(table, key)
+        month, info = self._locate(table, key)
+        if month is None:
+            return None
+        if info['archived']:
+            df = self._archived(table, month)
+            return df[df[KEYS[table]] == key].iloc[0]
+        return self.parts[table].get_row(month, key)
+
+    def get_rows(self, table, keys):
+        """Look several rows up by ID, skipping IDs that no longer exist"""
+        if table not in PARTITIONED:
+            return self.plain.get_rows(table, keys)
+        keys = list(keys)
+        pieces = []
+        for month, info in sorted(self.manifest(table).items()):
+            if info['archived']:
+                df = self._archived(table, month)
+                pieces.append(df[df[KEYS[table]].isin(keys)])
+            else:
+                pieces.append(self.parts[table].get_rows(month, keys))
+        return self._concat(pieces, table)
+
+    def _open_partition(self, table, month):
+        """Make a partition writable, creating it or unpacking its archive"""
+        partitions = self.manifest(table)
+        info = partitions.get(month)
+        if info is None:
+            self.parts[table].ensure_table(month, TABLES[table])
+        elif info['archived']:
+            archive = self.archive_path(table, month)
+            with gzip.open(archive, "rb") as src, open(self.parts[table].path(month), "wb") as dst:
+                shutil.copyfileobj(src, dst)
+        else:
+            return
+        partitions[month] = {'archived': False}
+        self._save_manifest(table, partitions)
+        if info is not None:
+            os.remove(self.archive_path(table, month))
+
+    def append(self, table, row):
+        """Append one record to the partition of its month"""
+        if table not in PARTITIONED:
+            return self.plain.append(table, row)
+        month = month_of(row.get('date'))
+        self._open_partition(table, month)
+        self.parts[table].append(month, row)
+
+    def update_row(self, table, key, changes):
+        """Change some fields of one row through its partition's journal"""
+        if table not in PARTITIONED:
+            return self.plain.update_row(table, key, changes)
+        month, info = self._locate(table, key)
+        if month is None:
+            return
+        self._open_partition(table, month)
+        self.parts[table].update_row(month, key, changes)
+
+    def delete_row(self, table, key):
+        """Remove one row, rewriting only its partition"""
+        if table not in PARTITIONED:
+            return self.plain.delete_row(table, key)
+        month, info = self._locate(table, key)
+        if month is None:
+            return
+        self._open_partition(table, month)
+        self.parts[table].delete_row(month, key)
+
+    def compact(self, table):
+        """Fold every partition's update journal back into its file"""
+        if table not in PARTITIONED:
+            return self.plain.compact(table)
+        for month, info in self.manifest(table).items():
+            if not info['archived']:
+                self.parts[table].compact(month)
+
+    def archive(self, table, before):
+        """Compress the partitions of the months before `before`, returning them"""
+        cutoff = pd.Timestamp(before).strftime(PARTITION_FORMAT)
+        partitions = self.manifest(table)
+        archived = []
+        for month, info in sorted(partitions.items()):
+            if info['archived'] or month >= cutoff or month == UNDATED:
+                continue
+            self.parts[table].compact(month)
+            path = self.parts[table].path(month)
+            tmp_path = self.archive_path(table, month) + ".tmp"
+            with open(path, "rb") as src, gzip.open(tmp_path, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp_path, self.archive_path(table, month))
+            partitions[month] = {'archived': True}
+            self._save_manifest(table, partitions)
+            os.remove(path)
+            archived.append(month)
+        return archived
+
+    def write(self, table, df):
+        """Replace the whole table, splitting it into monthly partitions"""
+        if table not in PARTITIONED:
+            return self.plain.write(table, df)
+        old = self.manifest(table)
+        new = {}
+        if 'date' in df:
+            for month, rows in df.groupby(df['date'].map(month_of), sort=True):
+                self.parts[table].write(month, rows)
+                new[month] = {'archived': False}
+        self._save_manifest(table, new)
+        for month, info in old.items():
+            if info['archived']:
+                os.remove(self.archive_path(table, month))
+            elif month not in new:
+                os.remove(self.parts[table].path(month))
+                journal = self.parts[table].journal_path(month)
+                if os.path.exists(journal):
+                    os.remove(journal)
+
+
+BACKENDS = {
+    CsvStorage.name: CsvStorage,
+    SqliteStorage.name: SqliteStorage,
+    ParquetStorage.name: ParquetStorage,
+    PartitionedStorage.name: PartitionedStorage,
+}
+
+
+def open_storage(data_dir, backend=None):
+    """Create the storage backend named by `backend` or $GSMLAB_BACKEND"""
+    backend = backend or os.environ.get("GSMLAB_BACKEND", CsvStorage.name)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown storage backend '{backend}', expected one of {sorted(BACKENDS)}")
+    return BACKENDS[backend](data_dir)